@@ -0,0 +1,124 @@
+"""
+HLSのフラグメントの並列ダウンロード数(concurrent_fragment_downloads)による、ダウンロードの速度の違いを計測するベンチマーク
+ローカルにHLSの配信サーバーの代わりとなるHTTPサーバーを立て、1リクエストごとに遅延(往復遅延時間の代わり)を入れて配信する。
+各フラグメントはランダムなバイト列のため、yt-dlpのネイティブのHLSダウンローダーで結合のみ行う(FFmpegは使用しない)。
+
+実行例: python benchmarks/bench_fragments.py --segments 60 --segment-kb 256 --latency 0.08 --concurrency 1 4 8
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from yt_dlp import YoutubeDL
+
+
+def create_handler(segments, segment_bytes, latency, bandwidth_kbps):
+    """HLSのプレイリストとフラグメントを返すリクエストハンドラーを作成する"""
+    payload = os.urandom(segment_bytes)
+    playlist = "\n".join(
+        ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4", "#EXT-X-MEDIA-SEQUENCE:0"]
+        + [line for index in range(segments) for line in ("#EXTINF:4.0,", f"segment{index}.ts")]
+        + ["#EXT-X-ENDLIST", ""]
+    ).encode("utf-8")
+    
+    class HLSHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def do_GET(self):
+            if self.path.endswith(".m3u8"):
+                body, content_type = playlist, "application/vnd.apple.mpegurl"
+            elif self.path.endswith(".ts"):
+                body, content_type = payload, "video/mp2t"
+            else:
+                self.send_error(404)
+                return
+            # 往復遅延時間の代わり
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if not bandwidth_kbps:
+                self.wfile.write(body)
+                return
+            # 1接続あたりの帯域を制限する(サーバー側で接続ごとに制限される配信を再現)
+            chunk = 16 * 1024
+            for start in range(0, len(body), chunk):
+                self.wfile.write(body[start:start + chunk])
+                time.sleep(chunk / (bandwidth_kbps * 1024))
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return HLSHandler
+
+
+class HLSServer(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def handle_error(self, request, client_address):
+        # ダウンロード完了後にyt-dlpがkeep-aliveの接続を切断した時のエラーは無視する
+        pass
+
+
+def download(url, output_dir, concurrency, buffersize):
+    """yt-dlpでHLSをダウンロードし、かかった時間(秒)とダウンロードしたサイズ(バイト)を返す"""
+    ydl_opts = {
+        "outtmpl": os.path.join(output_dir, "%(id)s.%(ext)s"),
+        "quiet": True,
+        "noprogress": True,
+        "fixup": "never",
+        "hls_prefer_native": True,
+        "concurrent_fragment_downloads": concurrency,
+        "buffersize": buffersize,
+    }
+    start = time.perf_counter()
+    with YoutubeDL(ydl_opts) as ydl:
+        ydl.download([url])
+    elapsed = time.perf_counter() - start
+    total_bytes = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+    return elapsed, total_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=60, help="フラグメントの数")
+    parser.add_argument("--segment-kb", type=int, default=256, help="フラグメント1つのサイズ(KiB)")
+    parser.add_argument("--latency", type=float, default=0.08, help="1リクエストごとの遅延(秒)")
+    parser.add_argument("--bandwidth-kbps", type=int, default=4096, help="1接続あたりの帯域(KiB/s、0の場合は制限しない)")
+    parser.add_argument("--buffersize", type=int, default=16384, help="yt-dlpのbuffersize(バイト)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="比較するconcurrent_fragment_downloadsの値")
+    args = parser.parse_args()
+    
+    handler = create_handler(args.segments, args.segment_kb * 1024, args.latency, args.bandwidth_kbps)
+    server = HLSServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/stream.m3u8"
+    print(f"フラグメント: {args.segments}個 x {args.segment_kb}KiB, 遅延: {args.latency}秒/リクエスト, 帯域: {args.bandwidth_kbps or '無制限'}KiB/s/接続")
+    
+    baseline = None
+    try:
+        for concurrency in args.concurrency:
+            output_dir = tempfile.mkdtemp()
+            try:
+                elapsed, total_bytes = download(url, output_dir, concurrency, args.buffersize)
+            finally:
+                shutil.rmtree(output_dir, ignore_errors=True)
+            throughput = total_bytes / elapsed / (1024 * 1024)
+            baseline = baseline or throughput
+            print(
+                f"concurrent_fragment_downloads={concurrency:2d}: {elapsed:7.2f}秒, "
+                f"{throughput:7.2f}MiB/s ({throughput / baseline:4.1f}倍)"
+            )
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
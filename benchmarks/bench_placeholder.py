@@ -0,0 +1,61 @@
+"""
+サムネイル画像がないカードのプレースホルダー画像の生成にかかる時間とディスクへの書き込み量を比較するベンチマーク
+- legacy: カードごとに1280x720の灰色画像を生成し、keyの名前でJPEG(quality=95)として保存する(従来の処理)
+- cached: PlaceholderCacheで表示枠のサイズごとに1度だけ生成し、全てのカードで共有する
+
+実行例: python benchmarks/bench_placeholder.py --cards 1000
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from PIL import Image
+from main import PlaceholderCache
+
+
+def count_files(directory):
+    """ディレクトリ内のファイル数と合計サイズ(バイト)を返す"""
+    files = os.listdir(directory)
+    return len(files), sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+
+
+def legacy_placeholders(output_dir, keys, frame_width, frame_height):
+    """従来のcompute_perfect_size(page, 0, 0, key)と同じ処理"""
+    for key in keys:
+        img = Image.new("RGB", (1280, 720), (128, 128, 128))
+        thumbnail_path = os.path.join(output_dir, f"{key}_thumb.jpg")
+        img.save(thumbnail_path, format="JPEG", quality=95)
+
+
+def cached_placeholders(output_dir, keys, frame_width, frame_height):
+    """PlaceholderCacheを使用した処理"""
+    placeholder_cache = PlaceholderCache(output_dir)
+    for key in keys:
+        placeholder_cache.get(frame_width, frame_height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=1000, help="取り込むカードの数")
+    parser.add_argument("--window-width", type=int, default=1280, help="ウィンドウの幅(表示枠の幅はこの1/4)")
+    args = parser.parse_args()
+    frame_width = int(args.window_width / 4)
+    frame_height = int(frame_width * 9 / 16)
+    keys = [uuid.uuid4().hex for _ in range(args.cards)]
+    print(f"カード数: {args.cards}, 表示枠: {frame_width}x{frame_height}")
+    for name, func in (("legacy", legacy_placeholders), ("cached", cached_placeholders)):
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            func(output_dir, keys, frame_width, frame_height)
+            elapsed = time.perf_counter() - start
+            files, total_bytes = count_files(output_dir)
+            print(f"{name:>6}: {elapsed:8.3f}秒, 書き込んだファイル数: {files:5d}, 合計: {total_bytes / 1024:10.1f}KiB")
+
+
+if __name__ == "__main__":
+    main()
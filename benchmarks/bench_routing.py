@@ -0,0 +1,93 @@
+"""
+URLからextractor(抽出器)を選ぶ処理の速度を比較するベンチマーク
+- scan: 全てのextractorのsuitable()を順番に確認する(yt-dlpのextract_info()でie_keyを指定しない場合と同じ処理)
+- router: ExtractorRouterでホストとURLの形ごとに記録したextractorを使用する
+少数のサイトのURLを大量に取り込む場合を想定し、数種類のサイトのURLを混ぜてIDだけを変えたものを使用する。
+routerの結果がscanと一致するかも確認する。
+extractorごとの1件あたりの時間も表示する(Genericになる直接のファイルのURLなどが、全体の平均に隠れて遅くなっていないかを確認する)。
+
+実行例: python benchmarks/bench_routing.py --urls 10000
+"""
+import os
+import sys
+import time
+import random
+import string
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from main import ExtractorRouter
+
+
+def random_id(length, chars=string.ascii_letters + string.digits + "_-"):
+    return "".join(random.choice(chars) for _ in range(length))
+
+
+# 取り込むURLの種類(IDの部分のみ変える)
+URL_FACTORIES = (
+    lambda: f"https://www.youtube.com/watch?v={random_id(11)}",
+    lambda: f"https://youtu.be/{random_id(11)}",
+    lambda: f"https://www.youtube.com/playlist?list=PL{random_id(32)}",
+    lambda: f"https://www.youtube.com/shorts/{random_id(11)}",
+    lambda: f"https://vimeo.com/{random.randint(10 ** 7, 10 ** 9)}",
+    lambda: f"https://www.nicovideo.jp/watch/sm{random.randint(10 ** 6, 10 ** 8)}",
+    lambda: f"https://www.dailymotion.com/video/x{random_id(7, string.ascii_lowercase + string.digits)}",
+    lambda: f"https://x.com/{random_id(10, string.ascii_lowercase)}/status/{random.randint(10 ** 17, 10 ** 18)}",
+    lambda: f"https://cdn.example.com/media/{random_id(16)}.mp4",
+    lambda: f"https://files.example.org/{random.randint(1, 9999)}/{random_id(8)}.m3u8",
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", type=int, default=10000, help="分類するURLの数")
+    parser.add_argument("--seed", type=int, default=0, help="URLを生成する乱数のシード")
+    args = parser.parse_args()
+    random.seed(args.seed)
+    urls = [random.choice(URL_FACTORIES)() for _ in range(args.urls)]
+    router = ExtractorRouter()
+    # extractorの一覧の読み込みと正規表現のコンパイルは両方に共通するため、先に済ませておく
+    for factory in URL_FACTORIES:
+        router._scan(factory())
+    print(f"URL数: {len(urls)}, extractor数: {len(router._get_extractors())}")
+
+    expected = []
+    scan_times = []
+    for url in urls:
+        start = time.perf_counter()
+        expected.append(router._scan(url)[0])
+        scan_times.append(time.perf_counter() - start)
+    scan_elapsed = sum(scan_times)
+    print(f"  scan: {scan_elapsed:8.3f}秒 ({scan_elapsed / len(urls) * 1e6:8.1f}μs/URL)")
+
+    routed = []
+    route_times = []
+    for url in urls:
+        start = time.perf_counter()
+        routed.append(router.route(url))
+        route_times.append(time.perf_counter() - start)
+    route_elapsed = sum(route_times)
+    print(
+        f"router: {route_elapsed:8.3f}秒 ({route_elapsed / len(urls) * 1e6:8.1f}μs/URL),"
+        f" ヒット: {router.hits}, 全件確認: {router.misses}, 速度比: {scan_elapsed / route_elapsed:.1f}倍"
+    )
+    mismatches = [(url, e, r) for url, e, r in zip(urls, expected, routed) if e != r]
+    print(f"scanと異なる結果: {len(mismatches)}件")
+    for url, e, r in mismatches[:10]:
+        print(f"  {url}: scan={e}, router={r}")
+    # extractorごとの件数と1件あたりの時間
+    totals = {}
+    for ie_key, scan_time, route_time in zip(expected, scan_times, route_times):
+        count, scan_total, route_total = totals.get(ie_key, (0, 0.0, 0.0))
+        totals[ie_key] = (count + 1, scan_total + scan_time, route_total + route_time)
+    print("extractorごとの件数と1件あたりの時間:")
+    for ie_key, (count, scan_total, route_total) in sorted(totals.items()):
+        print(
+            f"  {ie_key:>12}: {count:6d}件, scan: {scan_total / count * 1e6:8.1f}μs/URL,"
+            f" router: {route_total / count * 1e6:8.1f}μs/URL"
+        )
+
+
+if __name__ == "__main__":
+    main()
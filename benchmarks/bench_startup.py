@@ -0,0 +1,134 @@
+"""
+アプリの起動時間を計測するベンチマーク
+- 起動時間: プロセスの起動からft.app()が呼ばれる(ウィンドウの表示を開始する)までの時間
+  ft.app()を差し替えて、呼ばれた時点で終了する(Fletのクライアントの起動時間は含まない)
+  eager: 遅延読み込みにしたyt-dlp、requests、Pillowを先にimportした場合(従来の処理)
+  lazy: main.pyをそのまま起動した場合
+- モジュールごとのimport時間: python -X importtimeの結果から、main.pyが直接importしたモジュールを集計する
+  遅延読み込みのモジュールは、ウィンドウの表示後にpreload_heavy_modules()で読み込まれる
+
+実行例: python benchmarks/bench_startup.py --runs 5 --budget-ms 1500
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# 遅延読み込みにしたモジュール(main.LazyImportで代理しているもの)
+DEFERRED_MODULES = ("yt_dlp", "requests", "PIL.Image")
+
+# ft.app()を差し替えて、呼ばれるまでの時間と読み込み済みのモジュールを出力する
+DRIVER = """
+import sys, time, runpy
+start = time.perf_counter()
+for name in {preload!r}:
+    __import__(name)
+import flet
+def app(*args, **kwargs):
+    elapsed = time.perf_counter() - start
+    loaded = [name for name in {deferred!r} if name in sys.modules]
+    sys.__stdout__.write(f"RESULT {{elapsed}} {{','.join(loaded)}}\\n")
+    sys.__stdout__.flush()
+    raise SystemExit(0)
+flet.app = app
+sys.argv = ["main.py"]
+runpy.run_path("main.py", run_name="__main__")
+"""
+
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure_startup(preload):
+    """新しいプロセスで起動し、(プロセス起動からft.app()までの秒数, ft.app()の時点で読み込み済みの遅延モジュール)を返す"""
+    code = DRIVER.format(preload=tuple(preload), deferred=DEFERRED_MODULES)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    for line in result.stdout.splitlines():
+        if line.startswith("RESULT "):
+            _, elapsed, loaded = (line.split(" ") + [""])[:3]
+            return wall, float(elapsed), [name for name in loaded.split(",") if name]
+    raise RuntimeError(f"起動時間を計測できませんでした:\n{result.stderr[-2000:]}")
+
+
+def import_times(statement):
+    """python -X importtimeの結果から、最上位で読み込まれたモジュールごとの累積時間(マイクロ秒)を返す"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            rows.append((len(match.group(3)), match.group(4), int(match.group(2))))
+    return rows
+
+
+def report_import_times(top):
+    """main.pyが直接importしたモジュールと、遅延読み込みのモジュールのimport時間を表示する"""
+    rows = import_times("import main")
+    index = next(index for index, row in enumerate(rows) if row[1] == "main")
+    main_depth, _, total = rows[index]
+    # importtimeは子モジュールを親より先に出力するため、mainの直前の、mainより深い行がmain.pyからimportされたもの
+    # その中でmainより1段深いものが、main.pyから直接importされたモジュール
+    direct = []
+    for depth, name, cumulative in reversed(rows[:index]):
+        if depth <= main_depth:
+            break
+        if depth == main_depth + 2:
+            direct.append((name, cumulative))
+    direct.sort(key=lambda row: row[1], reverse=True)
+    print(f"\nimport main: {total / 1000:8.1f}ms (上位{top}件)")
+    for name, cumulative in direct[:top]:
+        print(f"  {name:<24} {cumulative / 1000:8.1f}ms")
+    print("\n遅延読み込みのモジュール(ウィンドウ表示後に読み込まれる)")
+    for module in DEFERRED_MODULES:
+        rows = import_times(f"import {module}")
+        cumulative = next((cumulative for depth, name, cumulative in rows if name == module), 0)
+        print(f"  {module:<24} {cumulative / 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="計測の回数(中央値を表示する)")
+    parser.add_argument("--top", type=int, default=10, help="表示するモジュールの件数")
+    parser.add_argument("--budget-ms", type=float, default=None, help="lazyの起動時間(中央値)の上限。超えた場合は終了コード1で終了する")
+    args = parser.parse_args()
+    medians = {}
+    for name, preload in (("eager", DEFERRED_MODULES), ("lazy", ())):
+        walls = []
+        elapsed_times = []
+        loaded = []
+        for _ in range(args.runs):
+            wall, elapsed, loaded = measure_startup(preload)
+            walls.append(wall)
+            elapsed_times.append(elapsed)
+        medians[name] = statistics.median(walls)
+        print(
+            f"{name:>5}: プロセス起動からft.app()まで {statistics.median(walls) * 1000:8.1f}ms"
+            f" (スクリプト内 {statistics.median(elapsed_times) * 1000:8.1f}ms),"
+            f" ft.app()の時点で読み込み済み: {', '.join(loaded) or 'なし'}"
+        )
+    report_import_times(args.top)
+    if args.budget_ms is not None:
+        if medians["lazy"] * 1000 > args.budget_ms:
+            print(f"\n起動時間が上限を超えました: {medians['lazy'] * 1000:.1f}ms > {args.budget_ms:.1f}ms")
+            sys.exit(1)
+        print(f"\n起動時間は上限内です: {medians['lazy'] * 1000:.1f}ms <= {args.budget_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+URLを大量に貼り付けた場合の重複確認の速度を比較するベンチマーク
+- list: 取り込み待ちと追加済みのURLをリストで保持し、文字列が一致するかを順番に確認する(従来の処理)
+- index: UrlIndexでURLをメディアの識別子に変換し、dictで確認する
+同じ動画を指す表記違いのURL(youtu.be/X、watch?v=X&t=5、トラッキング用のクエリ付きなど)を混ぜて、
+それぞれの方法で取り込まれる件数も比較する(動画の種類数と一致すれば、表記違いを全て重複とみなせている)。
+indexはURLの種類ごとの1件あたりの時間も表示する(専用のextractorがない直接のファイルのURLが、全体の平均に隠れて遅くなっていないかを確認する)。
+
+実行例: python benchmarks/bench_url_index.py --videos 5000 --variants 2
+"""
+import os
+import sys
+import time
+import random
+import string
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from main import ExtractorRouter, UrlIndex
+
+
+def random_id(length, chars=string.ascii_letters + string.digits + "_-"):
+    return "".join(random.choice(chars) for _ in range(length))
+
+
+# 動画ごとに、同じ動画を指す表記違いのURLを作成する関数(URLの種類名, 関数)
+VARIANT_FACTORIES = (
+    ("youtube", lambda video_id: (
+        f"https://www.youtube.com/watch?v={video_id}",
+        f"https://youtu.be/{video_id}?si={random_id(16)}",
+        f"https://m.youtube.com/watch?v={video_id}&t={random.randint(1, 600)}",
+        f"https://www.youtube.com/watch?feature=share&v={video_id}",
+    )),
+    ("vimeo", lambda video_id: (
+        f"https://vimeo.com/{abs(hash(video_id)) % 10 ** 9}",
+        f"https://vimeo.com/{abs(hash(video_id)) % 10 ** 9}?utm_source=newsletter&utm_medium=email",
+    )),
+    ("direct file", lambda video_id: (
+        f"https://cdn.example.com/media/{video_id}.mp4",
+        f"https://CDN.example.com:443/media/{video_id}.mp4?fbclid={random_id(20)}#t=10",
+    )),
+)
+
+
+def create_urls(videos, variants):
+    """videos件の動画について、1件あたり最大variants+1件のURLを作成してシャッフルする(URLの種類名とURLの組のリスト)"""
+    urls = []
+    for _ in range(videos):
+        name, factory = random.choice(VARIANT_FACTORIES)
+        urls.extend((name, url) for url in factory(random_id(11))[:variants + 1])
+    random.shuffle(urls)
+    return urls
+
+
+def bench_list(urls):
+    """従来のhandle_url_submitと同じ確認(取り込み待ち、追加済み、今回追加分のリスト)"""
+    pre_url_list = []
+    added_urls = []
+    start = time.perf_counter()
+    valid_urls = []
+    for _, url in urls:
+        trimmed_url = url.strip()
+        if trimmed_url and trimmed_url not in pre_url_list and trimmed_url not in added_urls and trimmed_url not in valid_urls:
+            valid_urls.append(trimmed_url)
+    return time.perf_counter() - start, len(valid_urls)
+
+
+def bench_index(urls):
+    router = ExtractorRouter()
+    # extractorの一覧の読み込みと正規表現のコンパイルは最初の1回のみのため、計測から除く
+    for _, factory in VARIANT_FACTORIES:
+        for url in factory(random_id(11)):
+            router._scan(url)
+    index = UrlIndex(router)
+    valid_urls = []
+    # URLの種類名: (件数, 合計時間)
+    totals = {}
+    for name, url in urls:
+        start = time.perf_counter()
+        trimmed_url = url.strip()
+        if trimmed_url and index.add(trimmed_url):
+            valid_urls.append(trimmed_url)
+        count, total = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, total + time.perf_counter() - start)
+    return sum(total for _, total in totals.values()), len(valid_urls), totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=5000, help="動画の種類数")
+    parser.add_argument("--variants", type=int, default=1, help="動画1件あたりの表記違いのURLの数")
+    parser.add_argument("--seed", type=int, default=0, help="URLを生成する乱数のシード")
+    args = parser.parse_args()
+    random.seed(args.seed)
+    urls = create_urls(args.videos, args.variants)
+    print(f"URL数: {len(urls)}, 動画の種類数: {args.videos}")
+    list_elapsed, list_count = bench_list(urls)
+    print(f" list: {list_elapsed:8.3f}秒 ({list_elapsed / len(urls) * 1e6:8.1f}μs/URL), 取り込まれた件数: {list_count}")
+    index_elapsed, index_count, totals = bench_index(urls)
+    print(f"index: {index_elapsed:8.3f}秒 ({index_elapsed / len(urls) * 1e6:8.1f}μs/URL), 取り込まれた件数: {index_count}")
+    for name, (count, total) in sorted(totals.items()):
+        print(f"  {name:>11}: {count:6d}件, {total / count * 1e6:8.1f}μs/URL")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+カードの一覧を大量に取り込んだ場合のコントロール数とpage.update()の時間を比較するベンチマーク
+- legacy: カードごとにコントロールを作成し、全てをft.Columnに追加する(従来の処理)
+- virtual: VirtualCardListでCardModelのみを保持し、表示範囲のカードだけを使い回して表示する
+Flutterのクライアントの代わりに、送られたコマンドを数えるだけの接続を使用する(通信時間は含まない)。
+
+実行例: python benchmarks/bench_virtual_list.py --items 5000
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import itertools
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import flet as ft
+from main import CardModel, CardSlot, VirtualCardList
+
+
+class CountingConnection:
+    """Flutterのクライアントの代わりに、送られたコマンドの数を数える接続"""
+    pubsubhub = mock.MagicMock()
+    page_name = ""
+    page_url = "http://localhost"
+
+    def __init__(self):
+        self.commands = 0
+        self._ids = itertools.count(1)
+
+    def send_commands(self, session_id, commands):
+        results = []
+        for command in commands:
+            self.commands += 1
+            if command.name == "add":
+                results.append(" ".join(f"_{next(self._ids)}" for _ in command.commands or []))
+        return SimpleNamespace(results=results, error="")
+
+    def send_command(self, session_id, command):
+        return SimpleNamespace(result="", error="")
+
+
+def create_page():
+    connection = CountingConnection()
+    page = ft.Page(connection, "bench", asyncio.new_event_loop())
+    page.window.width = 1280
+    page.window.height = 800
+    return page, connection
+
+
+def count_controls(control):
+    """コントロールツリー内のコントロール数"""
+    return 1 + sum(count_controls(child) for child in control._get_children())
+
+
+def create_model(index):
+    return CardModel(
+        f"key{index}",
+        f"https://example.com/watch?v={index}",
+        title=f"動画{index}",
+        uploader="投稿者",
+        upload_date="2025年01月01日",
+        thumbnail_src="placeholder.jpg",
+    )
+
+
+def timed_update(page, connection):
+    """page.update()の時間(秒)と送られたコマンド数"""
+    commands = connection.commands
+    start = time.perf_counter()
+    page.update()
+    return time.perf_counter() - start, connection.commands - commands
+
+
+def bench_legacy(items, frame_size, row_height):
+    page, connection = create_page()
+    column = ft.Column(expand=True, scroll=ft.ScrollMode.ADAPTIVE)
+    page.add(column)
+    start = time.perf_counter()
+    slots = []
+    for index in range(items):
+        # 従来のcreate_cardと同じ構成のカードを1件ずつ作成する
+        slot = CardSlot(lambda e, key: None, lambda e, key, url: None)
+        slot.bind(create_model(index), *frame_size, row_height)
+        slots.append(slot)
+        column.controls.append(slot.control)
+    build = time.perf_counter() - start
+    add_time, add_commands = timed_update(page, connection)
+    slots[items // 2].progress_text.value = "50.0%"
+    progress_time, progress_commands = timed_update(page, connection)
+    return {
+        "build": build,
+        "add": add_time,
+        "add_commands": add_commands,
+        "progress": progress_time,
+        "controls": count_controls(page),
+        "scroll": None,
+    }
+
+
+def bench_virtual(items, frame_size, scroll_steps):
+    page, connection = create_page()
+    card_list = VirtualCardList(page, lambda e, key: None, lambda e, key, url: None, frame_size)
+    page.add(card_list.control)
+    start = time.perf_counter()
+    models = [create_model(index) for index in range(items)]
+    for model in models:
+        card_list.append(model)
+    build = time.perf_counter() - start
+    add_time, add_commands = timed_update(page, connection)
+    models[0].update(progress_text="50.0%")
+    progress_time, progress_commands = timed_update(page, connection)
+    # 一覧の最後までスクロールしながら、その都度page.update()を送る
+    scroll_time = 0.0
+    max_offset = items * card_list.row_height
+    for step in range(1, scroll_steps + 1):
+        event = SimpleNamespace(pixels=max_offset * step / scroll_steps, viewport_dimension=600)
+        start = time.perf_counter()
+        card_list._on_scroll(event)
+        page.update()
+        scroll_time += time.perf_counter() - start
+    return {
+        "build": build,
+        "add": add_time,
+        "add_commands": add_commands,
+        "progress": progress_time,
+        "controls": count_controls(page),
+        "scroll": scroll_time / scroll_steps,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5000, help="取り込むカードの数")
+    parser.add_argument("--scroll-steps", type=int, default=100, help="virtualでスクロールを試す回数")
+    args = parser.parse_args()
+    frame_size = (320, 180)
+    row_height = max(frame_size[1], VirtualCardList.INFO_MIN_HEIGHT) + VirtualCardList.EXTRA_HEIGHT + VirtualCardList.SPACING
+    print(f"カード数: {args.items}")
+    results = (
+        ("legacy", bench_legacy(args.items, frame_size, row_height)),
+        ("virtual", bench_virtual(args.items, frame_size, args.scroll_steps)),
+    )
+    for name, result in results:
+        line = (
+            f"{name:>7}: コントロール数 {result['controls']:7d},"
+            f" 作成 {result['build']:7.3f}秒,"
+            f" 初回のpage.update() {result['add']:7.3f}秒 ({result['add_commands']}コマンド),"
+            f" 進捗1件のpage.update() {result['progress'] * 1000:8.2f}ms"
+        )
+        if result["scroll"] is not None:
+            line += f", スクロール1回 {result['scroll'] * 1000:6.2f}ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
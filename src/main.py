@@ -4,20 +4,37 @@ import flet as ft
 import os
 import sys
 import json
+import copy
+import argparse
 import re
 import shutil
-import winreg
 import socket
+if sys.platform == "win32":
+    import winreg # ダウンロードフォルダーの取得(Windowsのみ)
 from pathlib import Path
 from datetime import datetime
 import threading
+import queue
 import time
 import uuid
+import random
+import sqlite3
+import hashlib
+import io
+import gzip
+import bz2
+import lzma
+import weakref
 import tempfile
+import importlib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import atexit
 import logging
 from logging.handlers import RotatingFileHandler
 import subprocess
+from collections import deque, OrderedDict
+from urllib.parse import urlparse
 # # externalディレクトリのパスを取得
 # candidate = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "external")
 # if os.path.isdir(candidate):
@@ -44,15 +61,90 @@ import subprocess
 # from PIL import Image
 # from appdirs import user_data_dir, user_config_dir
 try:
-    from yt_dlp import YoutubeDL
-    import requests
-    from PIL import Image
     from appdirs import user_data_dir, user_config_dir
-    from concurrent.futures import ThreadPoolExecutor
 except ImportError as e:
     raise(f"必要なライブラリのインポートに失敗しました: {e}")
 
 
+class LazyImport:
+    """
+    初回アクセス時にモジュール(又はその属性)をimportする代理オブジェクト
+    yt-dlp(抽出器の一覧)やrequests(idnaのデータなど)、Pillowは読み込みに時間がかかるため、
+    ウィンドウの表示までは読み込まず、使用時かpreload_heavy_modules()で読み込む。
+    
+    :param module_name: importするモジュール名
+    :param attr_name: モジュールの属性を代理する場合はその名前(クラスや関数など)
+    """
+    
+    # 作成された全ての代理オブジェクト(preload_heavy_modules用)
+    instances = []
+    # importは全ての代理オブジェクトで1つずつ行う
+    # (preload_heavy_modules()と別のスレッドが同じパッケージの別のモジュールを同時にimportすると、
+    # 初期化途中のパッケージを参照してImportErrorになるため)
+    _import_lock = threading.RLock()
+    
+    def __init__(self, module_name, attr_name=None):
+        self._module_name = module_name
+        self._attr_name = attr_name
+        self._target = None
+        LazyImport.instances.append(self)
+    
+    def load(self):
+        """代理しているモジュール(又は属性)を読み込んで返す"""
+        target = self._target
+        if target is None:
+            with LazyImport._import_lock:
+                if self._target is None:
+                    try:
+                        module = importlib.import_module(self._module_name)
+                    except ImportError as ex:
+                        logging.getLogger().error(
+                            f"必要なライブラリのインポートに失敗しました: {ex}",
+                            exc_info=True
+                        )
+                        raise ex
+                    self._target = getattr(module, self._attr_name) if self._attr_name else module
+                target = self._target
+        return target
+    
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+    
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+    
+    def __repr__(self):
+        name = f"{self._module_name}.{self._attr_name}" if self._attr_name else self._module_name
+        return f"<LazyImport {name} ({'loaded' if self._target is not None else 'not loaded'})>"
+
+YoutubeDL = LazyImport("yt_dlp", "YoutubeDL")
+format_bytes = LazyImport("yt_dlp.utils", "format_bytes")
+formatSeconds = LazyImport("yt_dlp.utils", "formatSeconds")
+make_archive_id = LazyImport("yt_dlp.utils", "make_archive_id")
+requests = LazyImport("requests")
+Image = LazyImport("PIL.Image")
+gen_extractor_classes = LazyImport("yt_dlp.extractor", "gen_extractor_classes")
+
+def preload_heavy_modules():
+    """
+    遅延読み込みにしたモジュールをバックグラウンドで読み込む
+    ウィンドウの表示後に呼び出し、最初のURLの取り込みやダウンロードで読み込みを待たないようにする
+    """
+    def preload():
+        start = time.perf_counter()
+        for lazy_import in LazyImport.instances:
+            try:
+                lazy_import.load()
+            except Exception:
+                # 使用時に改めてエラーになるため、ここでは記録のみ
+                pass
+        logging.getLogger().info(f"遅延読み込みのモジュールを読み込みました。({time.perf_counter() - start:.2f}秒)")
+    
+    thread = threading.Thread(target=preload, name="module-preloader", daemon=True)
+    thread.start()
+    return thread
+
+
 """
 Nuitkaを使用したFletデスクトップアプリのパック → flet build を利用する方法に変更
 https://github.com/flet-dev/flet/discussions/1314
@@ -200,6 +292,47 @@ def get_ffmpeg_dir():
     """外部フォルダーとなったffmpegを取得できるようにする"""
     return os.path.join(get_external_path(), "ffmpeg", "bin")
 
+def get_data_path(app_name="YDownloader"):
+    """
+    OSと実行環境に応じた、アプリが永続的に保持するデータ(キャッシュなど)を保存するフォルダーのパスを返します。
+    一時ディレクトリとは異なり、アプリ終了時に削除されません。
+    - 開発環境: スクリプトディレクトリの親ディレクトリ直下の "data" フォルダー
+    - 実行ファイル化後(frozenの場合): OSごとのユーザーデータディレクトリ内の app_name/data
+    """
+    try:
+        logger = logging.getLogger()
+    except Exception as ex:
+        raise ex
+    try:
+        # PyInstaller, cx_Freeze, Nuitkaによる実行ファイル化後に供えた処理
+        if getattr(sys, "frozen", False) or "__compiled__" in globals():
+            data_dir = os.path.join(user_data_dir(app_name, roaming=False), "data")
+        else:
+            # 開発環境：スクリプトディレクトリの親ディレクトリ直下の data フォルダーを使用
+            data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+        os.makedirs(data_dir, exist_ok=True)
+        return data_dir
+    except Exception as ex:
+        logger.error(
+            ex,
+            exc_info=True
+        )
+
+def create_http_session(pool_maxsize=10):
+    """
+    サムネイル画像の取得などに使用する、コネクションプール付きの共有HTTPセッションを作成する
+    同じホストへの接続はKeep-Aliveで使い回される
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_maxsize,
+        pool_maxsize=pool_maxsize,
+        max_retries=1,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 def cleanup_temp_dir(temp_dir):
     """プログラム終了時に一時ディレクトリを削除する関数"""
     logging.info(f"一時ディレクトリを削除中: {temp_dir}")
@@ -283,9 +416,23 @@ def close_dlg(e, err_dlg, page):
     page.update()
 
 def open_dlg(err_dlg, page):
+    # ヘッドレスモード(pageやダイアログがない場合)では何も表示しない
+    if page is None or err_dlg is None:
+        return
     page.open(err_dlg)
     page.update()
 
+def mark_dirty(page):
+    """pageの更新を予約する(UpdateCoalescerで1フレームにつき1回のpage.update()にまとめる)"""
+    # ヘッドレスモードでは何もしない
+    if page is None:
+        return
+    UpdateCoalescer.for_page(page).mark_dirty()
+
+# エラーダイアログはYDownloader.mainで作成される(ヘッドレスモードでは作成されないためNoneのまま)
+content_type_err_dlg = network_err_dlg = playlist_error_dlg = retry_error_dlg = link_err_dlg = err_dlg = None
+err_happen_dlg = delete_err_dlg = save_err_dlg = copy_err_dlg = dl_err_dlg = settings_save_dlg = import_err_dlg = None
+
 class DefaultSettingsLoader:
     """
     設定ローダー
@@ -301,6 +448,18 @@ class DefaultSettingsLoader:
     -download_dir: 保存先ディレクトリ(指定があれば、それに従うが、指定がない場合、各OSのダウンロードフォルダーになる)
     -temp_dir: 一時ファイル保存場所(ユーザー操作なしを想定)。基本的には、スクリプトファイルがあるディレクトリの下
     -page_theme: アプリ全体のテーマ("LIGHT"または"DARK")
+    -max_concurrent_downloads: 全体での同時ダウンロード数の上限(整数)
+    -max_downloads_per_host: 同一ホストに対する同時ダウンロード数の上限(整数)
+    -max_preview_workers: 動画情報を並列に取得するワーカー数(整数)
+    -thumbnail_cache_size_mb: サムネイル画像の永続キャッシュの上限サイズ(MB)
+    -playlist_concurrency: 1つのプレイリストの中身を並列にダウンロードする数(整数)
+    -concurrent_fragment_downloads: HLS/DASHの断片(フラグメント)を並列にダウンロードする数(整数)
+    -http_chunk_size: HTTPのダウンロードを分割するサイズ(バイト、0の場合は分割しない)
+    -buffersize: ダウンロード時のバッファサイズ(バイト、0の場合はyt-dlpのデフォルト)
+    -site_download_overrides: サイトごとに上書きする上記3つの設定(ホスト名をkeyとした辞書、サブドメインにも適用)
+    -max_total_bandwidth_kbps: 全てのダウンロードの合計の帯域の上限(KiB/s、0の場合は制限しない)
+    -max_job_bandwidth_kbps: ダウンロード1件ごとの帯域の上限(KiB/s、0の場合は制限しない)
+    -max_external_processes: 同時に実行するyt-dlpのコマンド(Abema向け)の数の上限(整数)
     """
     
     def __init__(self):
@@ -321,19 +480,33 @@ class DefaultSettingsLoader:
         self.logger.info("atexitを使用して一時ディレクトリ削除をプログラム終了時にreigisterしました")
         
         self.download_folder = get_download_folder()
-        # 許可される設定キー定義(コード編集なしでの変更禁止)
-        self.ALLOWED_KEYS = frozenset({
-            "retry_chance", 
-            "show_progress",
-            "content_type",
-            "movie_quality",
-            "movie_format",
-            "music_quality",
-            "music_format",
-            "download_dir",
-            "temp_dir",
-            "page_theme"
-        })
+        # 許可される設定キーとその初期値の定義(コード編集なしでの変更禁止)
+        # 設定ファイルにないキーは、この値で補って設定ファイルに書き戻す(以前のバージョンの設定ファイル用)
+        self.DEFAULT_CONFIG = {
+            "retry_chance": 3,
+            "show_progress": True,
+            "content_type": "movie",
+            "movie_quality": "bestvideo[height<=2160]+bestaudio/best",
+            "movie_format": "mp4",
+            "music_quality": "bestaudio/best",
+            "music_format": "mp3",
+            "download_dir": False,
+            "temp_dir": False,
+            "page_theme": "LIGHT",
+            "max_concurrent_downloads": 3,
+            "max_downloads_per_host": 2,
+            "max_preview_workers": 4,
+            "thumbnail_cache_size_mb": 100,
+            "playlist_concurrency": 3,
+            "concurrent_fragment_downloads": 4,
+            "http_chunk_size": 0,
+            "buffersize": 16384,
+            "site_download_overrides": {},
+            "max_total_bandwidth_kbps": 0,
+            "max_job_bandwidth_kbps": 0,
+            "max_external_processes": 2,
+        }
+        self.ALLOWED_KEYS = frozenset(self.DEFAULT_CONFIG.keys())
         
         self.logger.debug("ALLOWED_KEYS読み込み完了")
         # logger.error("エラー発生", exc_info=True)  # ← `exc_info=True` で詳細なログを記録
@@ -349,14 +522,26 @@ class DefaultSettingsLoader:
         # JSONファイルを読み込み
         with open(self.CONFIG_PATH, "r", encoding="utf-8") as f:
             self._config_data = json.load(f)
-        # JSON内のキーが許可されるキーと完全一致しているかチェック
-        if set(self._config_data.keys()) != self.ALLOWED_KEYS:
+        # JSON内に許可されていないキーがないかチェック
+        unknown_keys = set(self._config_data.keys()) - self.ALLOWED_KEYS
+        if unknown_keys:
             self.logger.error(
-                f"設定ファイル内のキーが正しくありません。許可されるキー: {self.ALLOWED_KEYS}, 現在のキー: {set(self._config_data.keys())}",
+                f"設定ファイル内のキーが正しくありません。許可されるキー: {self.ALLOWED_KEYS}, 不明なキー: {unknown_keys}",
                 exc_info=True
             )
             # sys.exit(1) # プログラムの終了
             raise KeyError("config.jsonのキーが正しくありません。")
+        # 足りないキーは初期値で補い、設定ファイルに書き戻す
+        missing_keys = [key for key in self.DEFAULT_CONFIG if key not in self._config_data]
+        if missing_keys:
+            self.logger.warning(f"設定ファイルにないキーを初期値で補います: {missing_keys}")
+            for key in missing_keys:
+                self._config_data[key] = copy.deepcopy(self.DEFAULT_CONFIG[key])
+            self._write_config()
+        # サイトごとのダウンロード設定は、yt-dlpに渡す前に整数であることを確認する
+        self._config_data["site_download_overrides"] = self.validate_site_download_overrides(
+            self._config_data["site_download_overrides"]
+        )
         # ALLOWED_KEYSの各キーに対して非公開インスタンス変数を自動生成
         for key in self.ALLOWED_KEYS:
             if key == "download_dir" and not self._config_data[key]:
@@ -367,6 +552,48 @@ class DefaultSettingsLoader:
                 setattr(self, f"_{key}", self._config_data[key])
         self.logger.debug(self._config_data)
     
+    # site_download_overridesでサイトごとに上書きできる設定
+    SITE_OVERRIDE_KEYS = frozenset({"concurrent_fragment_downloads", "http_chunk_size", "buffersize"})
+    
+    def validate_site_download_overrides(self, overrides):
+        """
+        site_download_overridesの値を確認する
+        ホスト名をkeyとした辞書で、各サイトの値はSITE_OVERRIDE_KEYSのkeyと0以上の整数の辞書であること
+        
+        :return: 確認済みの値(Noneの場合は空の辞書)
+        """
+        if overrides is None:
+            return {}
+        if not isinstance(overrides, dict):
+            self.logger.error(
+                f"site_download_overridesは辞書で指定してください。現在の値: {overrides}",
+                exc_info=True
+            )
+            raise ValueError("サイトごとのダウンロード設定は、ホスト名をkeyとした辞書で指定してください。")
+        for site, site_overrides in overrides.items():
+            if not isinstance(site, str) or not site or not isinstance(site_overrides, dict):
+                self.logger.error(
+                    f"site_download_overridesの'{site}'の値が正しくありません。現在の値: {site_overrides}",
+                    exc_info=True
+                )
+                raise ValueError("サイトごとのダウンロード設定は、ホスト名をkeyとした辞書で指定してください。")
+            unknown_keys = set(site_overrides.keys()) - self.SITE_OVERRIDE_KEYS
+            if unknown_keys:
+                self.logger.error(
+                    f"site_download_overridesの'{site}'に不明な設定があります。許可される設定: {self.SITE_OVERRIDE_KEYS}, 不明な設定: {unknown_keys}",
+                    exc_info=True
+                )
+                raise KeyError("サイトごとのダウンロード設定のkeyが正しくありません。")
+            for key, value in site_overrides.items():
+                # boolはintのサブクラスのため除外する
+                if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                    self.logger.error(
+                        f"site_download_overridesの'{site}'の'{key}'は0以上の整数で指定してください。現在の値: {value}",
+                        exc_info=True
+                    )
+                    raise ValueError("サイトごとのダウンロード設定の値は0以上の整数で指定してください。")
+        return overrides
+    
     def update_setting(self, key, value):
         """
         設定値を変更するメソッド(クラス内からのみ使用)
@@ -379,6 +606,8 @@ class DefaultSettingsLoader:
             )
             # sys.exit(1)
             raise KeyError("config.jsonに正しいkeyでアクセスしてください。")
+        if key == "site_download_overrides":
+            value = self.validate_site_download_overrides(value)
         
         try:
             # メモリ上の値を更新
@@ -386,8 +615,7 @@ class DefaultSettingsLoader:
             self._config_data[key] = value
             
             # config.jsonファイルを更新
-            with open(self.CONFIG_PATH, "w", encoding="utf-8") as f:
-                json.dump(self._config_data, f, ensure_ascii=False, indent=2)
+            self._write_config()
         except Exception as ex:
             # 更新に失敗した場合は元の値に戻す
             if hasattr(self, f"_{key}"):
@@ -401,6 +629,11 @@ class DefaultSettingsLoader:
             # sys.exit(1) # プログラムの終了
             raise ex
     
+    def _write_config(self):
+        """メモリ上の設定をconfig.jsonファイルに書き込む"""
+        with open(self.CONFIG_PATH, "w", encoding="utf-8") as f:
+            json.dump(self._config_data, f, ensure_ascii=False, indent=2)
+    
     def __getattr__(self, key):
         """外部からのアクセス用(_を付けた非公開変数を参照)"""
         if key in self.ALLOWED_KEYS:
@@ -424,270 +657,2574 @@ class DefaultSettingsLoader:
             raise ValueError("update_setting()を使用してください。")
         super().__setattr__(key, value) # 通常の動作
 
-class Download:
-    def __init__(self, settings):
-        self.settings = settings
+class ConnectivityMonitor:
+    """
+    端末のネットワーク接続の状態をバックグラウンドで確認し、結果をキャッシュする
+    指定したホストとポートへTCP接続できるかを定期的に確認する(デフォルトでは、GoogleのDNSサーバー(8.8.8.8)の53番ポート)。
+    is_onlineはキャッシュした結果を返すだけなので、ダウンロードの失敗時などに呼び出しても待たされない。
+    
+    :param host: 接続を確認するホスト
+    :param port: 接続を確認するポート
+    :param timeout: 1回の確認のタイムアウト(秒)
+    :param interval: 接続できている間の確認の間隔(秒)
+    :param offline_interval: 接続できていない間の確認の間隔(秒)
+    """
+    
+    def __init__(self, host="8.8.8.8", port=53, timeout=3, interval=30, offline_interval=5):
         self.logger = logging.getLogger()
-        self.logger.debug("Downloadの__init__開始")
-        self.ffmpeg_dir = get_ffmpeg_dir()
-        self.logger.debug(f"{self.ffmpeg_dir}がffmpeg_dirです。")
-        self.save_dir = os.path.join(settings.download_dir, "YDownloader")
-        os.makedirs(self.save_dir, exist_ok=True)
-        self.retries = settings.retry_chance
-        self.show_progress = settings.show_progress
-        self.content_type = settings.content_type
-        os.makedirs(self.save_dir, exist_ok=True)
-        self.temp_dir = settings.temp_dir
-        self.cards = {}
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.interval = interval
+        self.offline_interval = offline_interval
+        # 最初の確認が終わるまでは接続できているものとみなす
+        self._online = True
+        self._checked_at = None
+        # 確認を前倒しするためのイベント
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._probe_loop, name="connectivity-monitor", daemon=True)
+        self._thread.start()
+    
+    def is_online(self):
+        """最後に確認したネットワーク接続の状態を返す"""
+        return self._online
     
-    def _check_network(self, host="8.8.8.8", port=53, timeout=3):
+    def request_probe(self):
         """
-        指定したホストとポートへの接続が可能かどうかチェックして、端末のネットワーク接続が正常かどうか検査する
-        デフォルトでは、GoogleのDNSサーバー(8.8.8.8)の53番ポートを使用。
+        次の確認を前倒しする(結果は待たない)
+        通信が失敗した時に呼び出すことで、キャッシュした状態を早く最新にする
+        複数のスレッドから同時に呼び出されても、確認は1回にまとめられる
         """
+        self._wakeup.set()
+    
+    def _probe(self):
+        """ホストへのTCP接続を試みる(ソケット単位のタイムアウトを使用し、プロセス全体の設定は変更しない)"""
         try:
-            socket.setdefaulttimeout(timeout)
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((host, port))
-            return True
-        except socket.error:
+            with socket.create_connection((self.host, self.port), timeout=self.timeout):
+                return True
+        except OSError:
             return False
     
-    def _check_content_type(self, key=None, page=None):
+    def _probe_loop(self):
         """
-        ダウンロードしたいコンテンツタイプに応じて、ダウンロード関数を適宜実施する関数
+        定期的に接続を確認する
+        ※無限ループ内でスレッドとして実行する
+        """
+        while True:
+            online = self._probe()
+            if online != self._online:
+                self.logger.info(f"ネットワーク接続の状態が変化しました: {'オンライン' if online else 'オフライン'}")
+            self._online = online
+            self._checked_at = time.monotonic()
+            self._wakeup.wait(self.interval if online else self.offline_interval)
+            self._wakeup.clear()
+
+class RetryPolicy:
+    """
+    失敗した処理を再試行する間隔を決める(ジッター付きの指数バックオフ)
+    attempt回目の失敗の後は、0からmin(max_delay, base_delay * 2 ** (attempt - 1))秒の間のランダムな時間だけ待つ。
+    待ち時間をランダムにすることで、同時に失敗した複数のジョブが同じタイミングで再試行しないようにする。
+    
+    :param retries: 最大試行回数
+    :param base_delay: 1回目の失敗の後の待ち時間の上限(秒)
+    :param max_delay: 待ち時間の上限(秒)
+    """
+    
+    def __init__(self, retries, base_delay=1.0, max_delay=30.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+    
+    def get_delay(self, attempt):
+        """attempt回目の失敗の後に待つ時間(秒)を返す"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** max(0, attempt - 1)))
+    
+    def wait(self, attempt):
+        """
+        attempt回目の失敗の後、再試行まで待つ
+        最大試行回数に達している場合は待たずにFalseを返す
+        """
+        if attempt >= self.retries:
+            return False
+        delay = self.get_delay(attempt)
+        logging.getLogger().info(f"{delay:.1f}秒後に再試行します。({attempt}/{self.retries})")
+        time.sleep(delay)
+        return True
+
+class TokenBucket:
+    """
+    トークンバケットによる帯域制限
+    使用した量だけトークンを減らし、不足した分(借り)はレートに応じた時間だけ待つことで返済する。
+    待つのは呼び出したスレッドのみで、ロックは保持しない。
+    
+    :param rate: 1秒あたりに補充するトークン(バイト)の量(0以下の場合は制限しない)
+    """
+    
+    def __init__(self, rate=0):
+        self.lock = threading.Lock()
+        self.rate = rate
+        self.tokens = rate
+        self.updated_at = time.monotonic()
+    
+    def set_rate(self, rate):
+        """レートを変更する(待機中のものには次回の呼び出しから反映される)"""
+        with self.lock:
+            self._refill()
+            self.rate = rate
+            # バースト(最大でも1秒分)を超えないようにする
+            self.tokens = min(self.tokens, rate)
+    
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def consume(self, amount):
+        """amountだけトークンを使用し、不足している場合は待つ(待った秒数を返す)"""
+        with self.lock:
+            if self.rate <= 0:
+                return 0
+            self._refill()
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+class BandwidthManager:
+    """
+    全てのダウンロードで共有する帯域の上限
+    全体の上限は1つのトークンバケットを全てのダウンロードで共有し、ダウンロード1件ごとの上限はダウンロードごとのトークンバケットで制限する。
+    yt-dlpのprogress_hookでダウンロードしたバイト数を消費するため、上限を超えるとダウンロードしているスレッドが待たされる。
+    set_limitsで変更した上限は、ダウンロード中のものにもすぐに反映される。
+    
+    :param total_kbps: 全体の帯域の上限(KiB/s、0の場合は制限しない)
+    :param job_kbps: ダウンロード1件ごとの帯域の上限(KiB/s、0の場合は制限しない)
+    """
+    
+    def __init__(self, total_kbps=0, job_kbps=0):
+        self.logger = logging.getLogger()
+        self.total_bucket = TokenBucket(int(total_kbps) * 1024)
+        self.job_rate = int(job_kbps) * 1024
+        # ダウンロード中のジョブごとのトークンバケット(上限の変更を反映するため)
+        self._job_buckets = weakref.WeakSet()
+        self.lock = threading.Lock()
+    
+    def set_limits(self, total_kbps, job_kbps):
+        """全体とダウンロード1件ごとの帯域の上限を変更する"""
+        self.total_bucket.set_rate(int(total_kbps) * 1024)
+        with self.lock:
+            self.job_rate = int(job_kbps) * 1024
+            job_buckets = list(self._job_buckets)
+        for bucket in job_buckets:
+            bucket.set_rate(self.job_rate)
+        self.logger.info(f"帯域の上限を変更しました。全体: {total_kbps}KiB/s, 1件ごと: {job_kbps}KiB/s (0は制限なし)")
+    
+    def create_hook(self):
+        """ダウンロード1件分のprogress_hookを作成する(ダウンロードごとに作成すること)"""
+        with self.lock:
+            job_bucket = TokenBucket(self.job_rate)
+            self._job_buckets.add(job_bucket)
+        # ファイルごとのダウンロード済みのバイト数(動画と音声を別々にダウンロードする場合があるため)
+        downloaded = {}
+        downloaded_lock = threading.Lock()
         
-        :param key: Card要素検索のためのkey
-        :param page: Fletのpage
+        def bandwidth_hook(d):
+            filename = d.get("tmpfilename", None) or d.get("filename", None)
+            if d.get("status", None) != "downloading":
+                with downloaded_lock:
+                    downloaded.pop(filename, None)
+                return
+            current = d.get("downloaded_bytes", None) or 0
+            with downloaded_lock:
+                amount = current - downloaded.get(filename, 0)
+                downloaded[filename] = max(current, downloaded.get(filename, 0))
+            if amount > 0:
+                job_bucket.consume(amount)
+                self.total_bucket.consume(amount)
+        
+        # トークンバケットへの参照を保持し、フックが使われている間はWeakSetから消えないようにする
+        bandwidth_hook.bucket = job_bucket
+        return bandwidth_hook
+
+class ProcessRunner:
+    """
+    外部プロセス(yt-dlpのコマンド)を実行する
+    標準出力と標準エラー出力はそれぞれ別のスレッドで読み続けるため、パイプのバッファが一杯になって止まることがない。
+    標準出力の進捗行(yt-dlpの--newlineの形式)は解析してon_progressに渡す。
+    同時に実行できるプロセスの数はセマフォで制限し、実行中のプロセスはkeyを指定して中断できる。
+    
+    :param max_processes: 同時に実行できるプロセスの数
+    """
+    
+    # 例: [download]  42.3% of ~ 120.50MiB at    3.20MiB/s ETA 00:25 (frag 3/40)
+    PROGRESS_PATTERN = re.compile(
+        r"^\[download\]\s+(?P<percent>[\d.]+)%\s+of\s+~?\s*(?P<total>\S+)"
+        r"(?:\s+at\s+(?P<speed>\S+))?(?:\s+ETA\s+(?P<eta>\S+))?"
+    )
+    
+    def __init__(self, max_processes=2):
+        self.logger = logging.getLogger()
+        self.semaphore = threading.BoundedSemaphore(max(1, int(max_processes)))
+        self.lock = threading.Lock()
+        # 実行中のプロセス(key: subprocess.Popen)
+        self.processes = {}
+        # 同時に実行できるプロセスの数の空きを待っているkey
+        self.waiting = set()
+        # 中断されたkey(実行中または待機中のkeyのみ記録し、run()の終了時に削除する)
+        self.cancelled = set()
+        # アプリの終了時に、実行中のプロセスが残らないようにする
+        atexit.register(self.cancel_all)
+    
+    def run(self, command, key=None, on_progress=None):
         """
-        if not key or not page:
-            self.logger.error(
-                "keyまたはpageの値が不正です。",
-                exc_info=True
-            )
-            # sys.exit(1) # プログラムの終了
-            raise ValueError("keyまたはpageの値が不正です。")
-        info_path = os.path.join(self.temp_dir, f"{key}.json")
-        with open(info_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        url = data.get("url", None)
-        if not url:
-            self.logger.error(
-                "JSONファイルにおけるurlの値が不正です。",
-                exc_info=True
+        コマンドを実行し、終了するまで待つ
+        
+        :param command: 実行するコマンド(リスト)
+        :param key: 中断する時に指定するkey
+        :param on_progress: 進捗行を解析した辞書(percent, total, speed, eta)を受け取る関数
+        :return: 終了コード(中断された場合はNone)
+        """
+        if key:
+            with self.lock:
+                self.waiting.add(key)
+        with self.semaphore:
+            with self.lock:
+                self.waiting.discard(key)
+                if key in self.cancelled:
+                    self.cancelled.discard(key)
+                    self.logger.info(f"key: {key} は開始前に中断されました。")
+                    return None
+                process = subprocess.Popen(
+                    command,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    encoding="utf-8",
+                    errors="replace",
+                )
+                if key:
+                    self.processes[key] = process
+            readers = [
+                threading.Thread(target=self._drain_stdout, args=(process.stdout, on_progress), daemon=True),
+                threading.Thread(target=self._drain_stderr, args=(process.stderr,), daemon=True),
+            ]
+            for reader in readers:
+                reader.start()
+            returncode = process.wait()
+            for reader in readers:
+                reader.join()
+            with self.lock:
+                if key and self.processes.get(key, None) is process:
+                    del self.processes[key]
+                cancelled = key in self.cancelled
+                self.cancelled.discard(key)
+        if cancelled:
+            self.logger.info(f"key: {key} のプロセスを中断しました。")
+            return None
+        return returncode
+    
+    def _drain_stdout(self, stream, on_progress):
+        """標準出力を読み続け、進捗行はon_progressに渡し、それ以外はログに出力する"""
+        for line in stream:
+            line = line.strip()
+            match = self.PROGRESS_PATTERN.match(line)
+            if match and on_progress:
+                try:
+                    on_progress(match.groupdict())
+                except Exception as ex:
+                    self.logger.warning(f"進捗の反映に失敗しました: {ex}")
+            elif line:
+                self.logger.info(line) # ログに出力
+        stream.close()
+    
+    def _drain_stderr(self, stream):
+        """標準エラー出力を読み続け、ログに出力する"""
+        for line in stream:
+            line = line.strip()
+            if line:
+                self.logger.error(line)
+        stream.close()
+    
+    def cancel(self, key, timeout=5):
+        """keyのプロセスを中断する(開始を待っている場合は開始させない、どちらでもない場合は何もしない)"""
+        with self.lock:
+            process = self.processes.get(key, None)
+            if process is None and key not in self.waiting:
+                # 記録すると、後で同じkeyを再度ダウンロードした時にすぐに中断されてしまうため記録しない
+                return
+            self.cancelled.add(key)
+        if process is None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    
+    def cancel_all(self):
+        """実行中の全てのプロセスを中断する"""
+        with self.lock:
+            keys = list(self.processes.keys())
+        for key in keys:
+            self.cancel(key)
+
+class DownloadScheduler:
+    """
+    ダウンロードジョブのスケジューラー
+    アプリ起動中は常駐するワーカースレッドがキューを処理し、全体の同時実行数とホストごとの同時実行数を制限する。
+    submit()はキューに積むだけなので、呼び出し元(UIのイベントハンドラー)をブロックしない。
+    キュー自体はメモリ上にのみ保持する。永続化はジョブストア(JobStore)が担い、キュー待ち("queued")や
+    ダウンロード中のまま終了したジョブは、次回の起動時にYDownloader.restore_unfinished_jobs()がキューに積み直す。
+    
+    :param max_workers: 全体での同時ダウンロード数の上限
+    :param per_host_limit: 同一ホストに対する同時ダウンロード数の上限
+    """
+    
+    def __init__(self, max_workers=3, per_host_limit=2):
+        self.logger = logging.getLogger()
+        self.logger.debug("DownloadSchedulerの__init__開始")
+        self.max_workers = max(1, int(max_workers))
+        self.per_host_limit = max(1, int(per_host_limit))
+        # ホストごとの待ち行列(ホスト間はラウンドロビンで取り出す)
+        self._host_queues = OrderedDict()
+        # 各ホストで実行中のジョブ数
+        self._host_active = {}
+        # キュー待ち又は実行中のkey(二重投入防止用)
+        self._pending = set()
+        self._active = 0
+        self._idle_callbacks = []
+        self._condition = threading.Condition()
+        for index in range(self.max_workers):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"download-worker-{index}",
+                daemon=True,
             )
-            # sys.exit(1) # プログラムの終了
-            raise ValueError("JSONファイルにおけるurlの値が不正です。")
-        title = data.get("title", "Unknown Title")
-        # uploader = data.get("uploader", "Unknown") # 後で作曲者とかの部分に使用したい
-        content_type = data.get("content_type", None)
-        is_entries = data.get("is_entries", False)
-        if not is_entries:
-            if content_type == "movie":
-                abema_url = "https://abema.tv"
-                if url.startswith(abema_url):
-                    self.logger.info("yt-dlpコマンドを実行します。")
-                    command = [
-                        "yt-dlp",
-                        "--output", os.path.join(self.save_dir, "%(title)s.%(ext)s"),
-                        "--ffmpeg-location", self.ffmpeg_dir,
-                        url
-                    ]
-                    process = subprocess.Popen(
-                        command,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                        encoding="utf-8"
-                    )
-                    for line in process.stdout:
-                        self.logger.info(line.strip()) # ログに出力
-                    stderr_output, _ = process.communicate()
-                    if stderr_output:
-                        self.logger.error(stderr_output.strip())
+            worker.start()
+        self.logger.info(f"DownloadSchedulerを起動しました。max_workers: {self.max_workers}, per_host_limit: {self.per_host_limit}")
+    
+    @staticmethod
+    def _get_host(url):
+        """URLからホスト名を取得する(取得できない場合は空文字)"""
+        try:
+            host = urlparse(url).hostname or ""
+        except ValueError:
+            host = ""
+        # www.などの違いで同じサイトへの上限をすり抜けないようにする
+        return host[4:] if host.startswith("www.") else host
+    
+    def submit(self, key, url, func):
+        """
+        ジョブをキューに追加する(ブロックしない)
+    
+        :param key: ジョブを識別するkey(Cardのkey)
+        :param url: ダウンロード対象のURL(ホストごとの上限に使用)
+        :param func: ワーカースレッドで実行する引数なしの関数
+        :return: キューに追加された場合はTrue、既にキュー待ち又は実行中の場合はFalse
+        """
+        host = self._get_host(url)
+        with self._condition:
+            if key in self._pending:
+                self.logger.info(f"key: {key} は既にキューに登録されています。")
+                return False
+            self._pending.add(key)
+            self._host_queues.setdefault(host, deque()).append((key, func))
+            self._condition.notify()
+        self.logger.debug(f"key: {key} をキューに追加しました。host: {host}")
+        return True
+    
+    def is_pending(self, key):
+        """keyのジョブがキュー待ち又は実行中かどうか"""
+        with self._condition:
+            return key in self._pending
+    
+    def when_idle(self, callback):
+        """
+        キューが空になり、実行中のジョブもなくなった時点でcallbackを一度だけ呼び出す
+        既にアイドル状態の場合はその場で呼び出す
+        """
+        with self._condition:
+            if self._active or self._host_queues:
+                self._idle_callbacks.append(callback)
+                return
+        callback()
+    
+    def _take_job(self):
+        """
+        実行可能なジョブを取り出す(self._conditionを保持した状態で呼び出すこと)
+        同時実行数の上限に達していないホストのうち、最も長く待っているホストから取り出す
+        """
+        for host, jobs in self._host_queues.items():
+            if self._host_active.get(host, 0) < self.per_host_limit:
+                key, func = jobs.popleft()
+                if jobs:
+                    self._host_queues.move_to_end(host)
                 else:
-                    self.logger.info(f"self.download_movieを{url},{title}に対して実行します")
-                    self.download_movie(url=url, filename=title, key=key, page=page)
-            elif content_type == "music":
-                self.logger.info(f"self.download_musicを{url},{title}に対して実行します")
-                self.download_music(url=url, filename=title, key=key, page=page)
-            else:
-                self.logger.error(
-                    "content_typeの値が不正です。",
-                    exc_info=True
-                )
-                open_dlg(content_type_err_dlg, page)
-        else:
-            # print("これは正常にメタデータが記録されたプレイリスト") # デバッグ用
+                    del self._host_queues[host]
+                return host, key, func
+        return None
+    
+    def _worker_loop(self):
+        """ワーカースレッド本体(キューからジョブを取り出して実行し続ける)"""
+        while True:
+            with self._condition:
+                job = self._take_job()
+                while job is None:
+                    self._condition.wait()
+                    job = self._take_job()
+                host, key, func = job
+                self._active += 1
+                self._host_active[host] = self._host_active.get(host, 0) + 1
             try:
-                entries = data.get("entries", None)
-                save_dir = os.path.join(self.save_dir, title)
-                os.makedirs(save_dir, exist_ok=True)
-                if not entries:
-                    self.logger.error(
-                        f"entriesの値が不正です: {entries}",
-                        exc_info=True
-                    )
-                    # sys.exit(1) # プログラムの終了
-                    raise ValueError("entriesの値が不正です。")
-                if content_type == "movie":
-                    abema_url = "https://abema.tv"
-                    if url.startswith(abema_url):
-                        self.logger.info("yt-dlpコマンドを実行します。")
-                        command = [
-                            "yt-dlp",
-                            "--output", os.path.join(save_dir, "%(title)s.%(ext)s"),
-                            "--ffmpeg-location", self.ffmpeg_dir,
-                            url
-                        ]
-                        process = subprocess.Popen(
-                            command,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                            text=True,
-                            encoding="utf-8"
-                        )
-                        for line in process.stdout:
-                            self.logger.info(line.strip()) # ログに出力
-                        stderr_output, _ = process.communicate()
-                        if stderr_output:
-                            self.logger.error(stderr_output.strip())
-                    else:
-                        for index, entry in enumerate(entries):
-                            self.logger.info(f"{index + 1}番目のコンテンツをダウンロードします")
-                            entry_title = entry.get("title", None)
-                            entry_url = entry.get("url", None)
-                            if not entry_title or not entry_url:
-                                self.logger.warning(
-                                    f"{index + 1}番目のentryのtitleまたはurlの値が不正です。",
-                                    exc_info=True
-                                )
-                                continue # スキップ
-                            result = self.download_movie(
-                                url=entry_url,
-                                filename=entry_title,
-                                content_save_dir=save_dir, 
-                                page=page,
-                                is_entries=True
-                            )
-                            if result == "NetWorkError":
-                                self.logger.error(
-                                    "Movie download failed for NetWork Error",
-                                    exc_info=True
-                                )
-                                open_dlg(network_err_dlg, page)
-                                break # ループを中断
-                            elif not result:
-                                self.logger.error(
-                                    "Movie download failed. Stopping the process.",
-                                    exc_info=True
-                                )
-                                open_dlg(playlist_error_dlg, page)
-                                break # ループを中断
-                    self.logger.info(f"Download process complete. Executing post-download code. url: {url}")
-                    self._fire_after_download(key=key, page=page)
-                    self.logger.info(f"Movie download completed in format: {settings.movie_format}")
-                elif content_type == "music":
-                    for index, entry in enumerate(entries):
-                        self.logger.info(f"{index + 1}番目のコンテンツをダウンロードします")
-                        entry_title = entry.get("title", None)
-                        entry_url = entry.get("url", None)
-                        if not entry_title or not entry_url:
-                            self.logger.warning(
-                                f"{index + 1}番目のentryのtitleの値が不正です。",
-                                exc_info=True
-                            )
-                            continue # スキップ
-                        result = self.download_music(
-                            url=entry_url,
-                            filename=entry_title, 
-                            content_save_dir=save_dir, 
-                            page=page,
-                            is_entries=True
-                        )
-                        if result == "NetWorkError":
-                            self.logger.error(
-                                "Music download failed for NetWork Error",
-                                exc_info=True
-                            )
-                            open_dlg(network_err_dlg, page)
-                            break # ループを中断
-                        elif not result:
-                            self.logger.error(
-                                "Music download failed. Stopping the process.",
-                                exc_info=True
-                            )
-                            open_dlg(playlist_error_dlg, page)
-                            break # ループを中断
-                    self.logger.info(f"Download process complete. Executing post-download code. url: {url}")
-                    self._fire_after_download(key=key, page=page)
-                    self.logger.info(f"Music download completed in format: {settings.music_format}")
-                else:
-                    self.logger.error(
-                        "content_typeの値が不正です。",
-                        exc_info=True
-                    )
-                    open_dlg(content_type_err_dlg, page)
+                func()
             except Exception as ex:
                 self.logger.error(
-                    ex,
+                    f"ダウンロードジョブの実行中にエラーが発生しました。key: {key}, Exception: {ex}",
                     exc_info=True
                 )
-                # sys.exit(1) # プログラムの終了
-                raise ex
+            finally:
+                callbacks = []
+                with self._condition:
+                    self._active -= 1
+                    self._host_active[host] -= 1
+                    if not self._host_active[host]:
+                        del self._host_active[host]
+                    self._pending.discard(key)
+                    if not self._active and not self._host_queues:
+                        callbacks, self._idle_callbacks = self._idle_callbacks, []
+                    # ホストの上限で待っていたワーカーも起こす
+                    self._condition.notify_all()
+                for callback in callbacks:
+                    try:
+                        callback()
+                    except Exception as ex:
+                        self.logger.error(ex, exc_info=True)
+
+class YoutubeDLPool:
+    """
+    YoutubeDLインスタンスのプール
+    オプションの組み合わせごとに初期化済みのインスタンスを保持し、ジョブ間で使い回すことで、
+    オプションの解析やextractorの準備、Cookieの読み込み、HTTPハンドラーの準備をURLごとに繰り返さないようにする。
+    YoutubeDLはスレッドセーフではないため、貸し出し中のインスタンスを複数のスレッドで共有することはない。
     
-    def _fire_after_download(self, key=None, page=None):
+    :param max_size: プール内に保持する待機中インスタンス数の上限(超えた場合は最も使われていないものから閉じる)
+    """
+    
+    # ジョブごとに変わるため、プールのkeyには含めずに貸し出し時に設定するオプション
+    PER_JOB_OPTIONS = frozenset({"outtmpl", "progress_hooks", "postprocessor_hooks"})
+    
+    def __init__(self, max_size=8):
+        self.logger = logging.getLogger()
+        self.logger.debug("YoutubeDLPoolの__init__開始")
+        self.max_size = max(1, int(max_size))
+        # key: 待機中のインスタンスのリスト(末尾ほど最近使われたkey)
+        self._idle = OrderedDict()
+        self._idle_count = 0
+        self._lock = threading.Lock()
+        # プログラム終了時に待機中のインスタンスを閉じる(Cookieの保存など)
+        atexit.register(self.close_all)
+    
+    def _make_key(self, ydl_opts):
+        """ジョブごとのオプションを除いたオプションからプールのkeyを作成する"""
+        pooled_opts = {k: v for k, v in ydl_opts.items() if k not in self.PER_JOB_OPTIONS}
+        return json.dumps(pooled_opts, sort_keys=True, ensure_ascii=False, default=repr)
+    
+    def _create(self, ydl_opts):
         """
-        ダウンロード完了後の処理
-        完了したkeyのCardのdisabledにしたボタンやテキストフィールドのdisabledを解除する
+        新しいインスタンスを作成する
+        後処理(PostProcessor)のフックは作成時にしか登録できないため、貸し出し先のフックを呼び出す中継用のフックを登録しておく
         """
-        print("Post-download processing is now executed.")
-        try:
-            if not key or not page:
-                self.logger.error(
-                    "keyまたはpageの値が不正です。",
-                    exc_info=True
-                )
-                # sys.exit(1) # プログラムの終了
-                raise ValueError("keyまたはpageの値が不正です。")
-            target_card = self.cards[key]
-            target_column = target_card.content.content
-            target_info = target_column.controls[0]
-            target_progress_bar = target_column.controls[1].content
-            target_about_info = target_info.controls[1]
-            target_title = target_about_info.controls[0]
-            target_uploader = target_about_info.controls[1].controls[0]
-            target_content_type = target_about_info.controls[1].controls[1].controls[0]
-            download_button = target_info.controls[2].controls[0]
-            delete_button = target_info.controls[2].controls[1]
-            download_button.disabled = False  # ダウンロードボタンを有効化
-            delete_button.disabled = False # デリートボタンを有効化
-            target_title.disabled = False # タイトル入力欄を有効化
-            target_content_type.disabled = False # ダウンロードタイプ選択有効化
-            target_uploader.disabled = False # 投稿者テキストフィールド有効化
-            target_progress_bar.visible = False # プログレスバーが見えなくする
-            page.update()
-        except Exception as ex:
-            self.logger.error(
-                ex,
-                exc_info=True
-            )
-            # sys.exit(1)
-            raise ex
+        job_hooks = {"progress_hooks": [], "postprocessor_hooks": []}
+        def dispatch(name):
+            def hook(d):
+                for ph in job_hooks[name]:
+                    ph(d)
+            return hook
+        pooled_opts = {k: v for k, v in ydl_opts.items() if k not in self.PER_JOB_OPTIONS}
+        pooled_opts["progress_hooks"] = [dispatch("progress_hooks")]
+        pooled_opts["postprocessor_hooks"] = [dispatch("postprocessor_hooks")]
+        ydl = YoutubeDL(pooled_opts)
+        ydl._pool_job_hooks = job_hooks
+        return ydl
     
-    # コメント取得用関数を考えておく
+    def checkout(self, ydl_opts):
+        """
+        オプションに合うインスタンスを貸し出す(待機中のものがなければ新しく作成する)
+        ydl_optsのprogress_hooksとpostprocessor_hooksは、貸し出している間だけ呼び出される
+        使用後は必ずrelease()で返却すること
+        """
+        key = self._make_key(ydl_opts)
+        ydl = None
+        with self._lock:
+            instances = self._idle.get(key, None)
+            if instances:
+                ydl = instances.pop()
+                self._idle_count -= 1
+                if not instances:
+                    del self._idle[key]
+        if ydl is None:
+            self.logger.debug("YoutubeDLのインスタンスを新しく作成します。")
+            ydl = self._create(ydl_opts)
+        else:
+            self.logger.debug("待機中のYoutubeDLのインスタンスを再利用します。")
+        # ジョブごとのオプションを設定する
+        ydl.params["outtmpl"] = ydl_opts.get("outtmpl", None) or {}
+        ydl._parse_outtmpl()
+        ydl._pool_job_hooks["progress_hooks"] = list(ydl_opts.get("progress_hooks", None) or [])
+        ydl._pool_job_hooks["postprocessor_hooks"] = list(ydl_opts.get("postprocessor_hooks", None) or [])
+        ydl._pool_key = key
+        return ydl
     
-    def download_movie_for_abema(self, urls=False, outtmpl=None, content_save_dir=False, ffmpeg_location=None):
+    def release(self, ydl, discard=False):
         """
-        Abemaでの動画ダウンロードにチャレンジする用の関数
+        貸し出したインスタンスを返却する
         
-        :param urls: ダウンロード対象のコンテンツURL(Falseの場合はエラー)(リストで渡されるから避けてsubprocessに渡す)
-        :param outtmpl: 保存する際のファイル名(拡張子は自動付与)
-        :param content_save_dir: 保存する際のディレクトリ(プレイリストだとプレイリスト名のフォルダーを作ってその中に保存する)(デフォルトはself.save_dir)
+        :param ydl: checkout()で貸し出したインスタンス
+        :param discard: Trueの場合はプールに戻さずに閉じる(エラーで状態が不明になった場合など)
         """
-        if not urls or not ffmpeg_location:
-            self.logger.error(
-                "Error: url or ffmpeg_location is not defined",
+        key = getattr(ydl, "_pool_key", None)
+        # 返却後に前のジョブのフックが呼ばれないようにする
+        ydl._pool_job_hooks["progress_hooks"] = []
+        ydl._pool_job_hooks["postprocessor_hooks"] = []
+        evicted = []
+        if discard or key is None:
+            evicted.append(ydl)
+        else:
+            with self._lock:
+                self._idle.setdefault(key, []).append(ydl)
+                self._idle.move_to_end(key)
+                self._idle_count += 1
+                # 上限を超えた分は最も使われていないkeyのものから閉じる
+                while self._idle_count > self.max_size:
+                    oldest_key, instances = next(iter(self._idle.items()))
+                    evicted.append(instances.pop(0))
+                    self._idle_count -= 1
+                    if not instances:
+                        del self._idle[oldest_key]
+        for instance in evicted:
+            self._close(instance)
+    
+    @contextmanager
+    def acquire(self, ydl_opts):
+        """
+        with文でインスタンスを借りるためのコンテキストマネージャー
+        ブロック内で例外が発生した場合は、そのインスタンスをプールに戻さずに閉じる
+        """
+        ydl = self.checkout(ydl_opts)
+        try:
+            yield ydl
+        except BaseException:
+            self.release(ydl, discard=True)
+            raise
+        else:
+            self.release(ydl)
+    
+    def _close(self, ydl):
+        """インスタンスを閉じる(Cookieの保存とHTTPハンドラーの解放)"""
+        try:
+            ydl.close()
+        except Exception as ex:
+            self.logger.warning(
+                f"YoutubeDLのインスタンスを閉じる際にエラーが発生しました: {ex}",
+                exc_info=True
+            )
+    
+    def close_all(self):
+        """待機中の全てのインスタンスを閉じる"""
+        with self._lock:
+            instances = [ydl for ydls in self._idle.values() for ydl in ydls]
+            self._idle.clear()
+            self._idle_count = 0
+        for ydl in instances:
+            self._close(ydl)
+
+class ExtractorRouter:
+    """
+    URLからextractor(抽出器)を選ぶ処理のキャッシュ
+    yt-dlpはextract_info()のたびに約1,800個のextractorのsuitable()を順番に確認するため、
+    ホストとURLの形(パスの固定部分とクエリのkey)ごとに選ばれたextractorを記録し、次からはextract_info()のie_keyとして渡す。
+    URLの形が初めての場合は、ホストとパスの階層数が同じURLで選ばれたextractorを試す(ユーザー名などが固定部分とみなされた場合用)。
+    記録したextractorがsuitable()でないURLの場合は、全てのextractorを確認し直す(どれにも一致しなければGeneric)。
+    Genericは全てのURLに一致してしまうため、URLの形が完全に同じ場合にのみ使用する(パスの階層数が同じだけのURLには使用しない)。
+    直接のファイルのURLや専用のextractorがないサイトのURLも、同じ形であれば2件目からは全て確認し直さない。
+    
+    :param max_size: 記録するURLの形の数の上限(超えた場合は最も使われていないものから捨てる)
+    """
+    
+    GENERIC_KEY = "Generic"
+    # 別のextractorへリダイレクトするだけのextractor: (リダイレクト先のie_key, リダイレクト先のIDを含む_VALID_URLのグループ名)
+    # yt-dlpはyoutu.be/X?list=PLをwatch?v=X&list=PLとしてYoutubeTab(プレイリストのID)で処理する
+    REDIRECT_IDS = {
+        "YoutubeYtBe": ("YoutubeTab", "playlist_id"),
+    }
+    # 固定部分とみなすパスの要素(watch, playlist, shortsなど、英小文字の単語)
+    LITERAL_SEGMENT_PATTERN = re.compile(r"[a-z][a-z_-]{0,31}")
+    
+    def __init__(self, max_size=1024):
+        self.logger = logging.getLogger()
+        self.logger.debug("ExtractorRouterの__init__開始")
+        self.max_size = max(1, int(max_size))
+        # URLの形: (ie_key, extractorのクラス)(末尾ほど最近使われたもの)
+        self._routes = OrderedDict()
+        self._extractors = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def _get_extractors(self):
+        """yt-dlpが確認するのと同じ順番の(ie_key, extractorのクラス)のリスト"""
+        if self._extractors is None:
+            self._extractors = [(ie.ie_key(), ie) for ie in gen_extractor_classes()]
+        return self._extractors
+    
+    @classmethod
+    def make_shape(cls, url):
+        """
+        URLの形を作成する(キャッシュのkey)
+        IDなどの可変部分は*に置き換え、クエリは値を除いたkeyのみを使用する
+        例: https://www.youtube.com/watch?v=XXXX → ("https", "youtube.com", ("watch",), ("v",))
+        """
+        try:
+            parsed = urlparse(url)
+            host = (parsed.hostname or "").lower()
+        except ValueError:
+            return None
+        if host.startswith("www."):
+            host = host[4:]
+        segments = tuple(
+            segment if cls.LITERAL_SEGMENT_PATTERN.fullmatch(segment) else "*"
+            for segment in parsed.path.split("/") if segment
+        )
+        query_keys = tuple(sorted({part.split("=", 1)[0] for part in parsed.query.split("&") if part}))
+        return (parsed.scheme.lower(), host, segments, query_keys)
+    
+    @staticmethod
+    def make_coarse_shape(shape):
+        """パスの要素を全て*に置き換えたURLの形(ホストとパスの階層数のみ)"""
+        if shape is None:
+            return None
+        scheme, host, segments, query_keys = shape
+        return (scheme, host, ("*",) * len(segments), query_keys)
+    
+    def _remember(self, shape, route):
+        """URLの形とextractorを記録する(self._lockを保持した状態で呼び出すこと)"""
+        self._routes[shape] = route
+        self._routes.move_to_end(shape)
+        while len(self._routes) > self.max_size:
+            self._routes.popitem(last=False)
+    
+    def _scan(self, url):
+        """全てのextractorを順番に確認する(yt-dlpのextract_info()と同じ処理)"""
+        for ie_key, ie in self._get_extractors():
+            if ie.suitable(url):
+                return ie_key, ie
+        return self.GENERIC_KEY, None
+    
+    def route(self, url):
+        """
+        URLに対応するextractorのie_keyを返す
+        
+        :param url: 動画のURL
+        :return: extract_info()のie_keyに渡す文字列
+        """
+        return self._resolve(url)[0]
+    
+    def temp_id(self, url):
+        """
+        URLに対応するextractorのie_keyと、URLから取り出した動画ID(取り出せない場合はNone)を返す
+        動画情報を取得せずに、URLのみで同じ動画かどうかを判断するために使用する
+        リダイレクトするだけのextractor(REDIRECT_IDS)の場合は、リダイレクト先のie_keyとIDを返す
+        """
+        ie_key, ie = self._resolve(url)
+        if ie is None:
+            return ie_key, None
+        redirect = self.REDIRECT_IDS.get(ie_key, None)
+        if redirect is not None:
+            # リダイレクト先のextractorとIDを使用する(youtu.be/X?list=PLとwatch?v=X&list=PLを同じものとみなす)
+            target_ie_key, group = redirect
+            match = ie._match_valid_url(url)
+            target_id = match.group(group) if match else None
+            if target_id:
+                return target_ie_key, target_id
+        return ie_key, ie.get_temp_id(url)
+    
+    def _resolve(self, url):
+        """URLに対応する(ie_key, extractorのクラス)を返す(どのextractorにも一致しない場合はクラスをNoneとする)"""
+        shape = self.make_shape(url)
+        coarse_shape = self.make_coarse_shape(shape)
+        with self._lock:
+            route = self._routes.get(shape, None)
+            if route is not None:
+                self._routes.move_to_end(shape)
+            coarse_route = self._routes.get(coarse_shape, None) if route is None else None
+        if route is not None and route[1].suitable(url):
+            self.hits += 1
+            return route
+        elif coarse_route is not None and coarse_route[0] != self.GENERIC_KEY and coarse_route[1].suitable(url):
+            self.hits += 1
+            with self._lock:
+                self._remember(shape, coarse_route)
+            return coarse_route
+        self.misses += 1
+        ie_key, ie = self._scan(url)
+        if shape is not None and ie is not None:
+            with self._lock:
+                self._remember(shape, (ie_key, ie))
+                # Genericはパスの階層数が同じだけのURLには使用しない(別の形のURLが専用のextractorで処理されなくなるため)
+                if ie_key != self.GENERIC_KEY:
+                    self._remember(coarse_shape, (ie_key, ie))
+        self.logger.debug(f"{url}のextractorは{ie_key}です。")
+        return ie_key, ie
+
+class UpdateCoalescer:
+    """
+    page.update()をまとめて送るためのクラス
+    page.update()は呼び出す度に差分をFlutterのクライアントに送るため、カードを大量に追加・削除すると往復が何千回にもなる。
+    mark_dirty()は更新の予約のみを行い、専用のスレッドがFRAME_INTERVAL秒に1回までpage.update()を呼び出す(どのスレッドからでも呼び出せる)。
+    pageごとのインスタンスはfor_page()で取得する(通常はモジュールのmark_dirty(page)を使う)。
+    
+    :param page: Fletのpage
+    :param interval: page.update()を呼び出す最短間隔(秒)
+    """
+    
+    # 1フレームの間隔(秒)
+    FRAME_INTERVAL = 1 / 30
+    
+    _instances = weakref.WeakKeyDictionary()
+    _instances_lock = threading.Lock()
+    
+    @classmethod
+    def for_page(cls, page):
+        """pageに対応するインスタンスを返す(なければ作成する)"""
+        with cls._instances_lock:
+            coalescer = cls._instances.get(page, None)
+            if coalescer is None:
+                coalescer = cls(page)
+                cls._instances[page] = coalescer
+            return coalescer
+    
+    def __init__(self, page, interval=FRAME_INTERVAL):
+        self.logger = logging.getLogger()
+        self.logger.debug("UpdateCoalescerの__init__開始")
+        # pageが破棄されたらスレッドも終了するように、弱参照で保持する
+        self._page_ref = weakref.ref(page)
+        self.interval = interval
+        self.update_count = 0
+        self._dirty = False
+        self._last_update = 0.0
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="ui-update-coalescer", daemon=True)
+        self._thread.start()
+    
+    def mark_dirty(self):
+        """更新を予約する(次のフレームでまとめてpage.update()を呼び出す)"""
+        with self._condition:
+            if not self._dirty:
+                self._dirty = True
+                self._condition.notify()
+    
+    def flush(self):
+        """予約されている更新をすぐに送る"""
+        with self._condition:
+            self._dirty = False
+        self._update()
+    
+    def _update(self):
+        """page.update()を呼び出す(pageが破棄されている場合はFalseを返す)"""
+        page = self._page_ref()
+        if page is None:
+            return False
+        try:
+            page.update()
+        except Exception as ex:
+            self.logger.warning(f"画面の更新に失敗しました: {ex}")
+        self._last_update = time.monotonic()
+        self.update_count += 1
+        return True
+    
+    def _run(self):
+        """予約された更新を、前回の更新からintervalが経過してから送る"""
+        while True:
+            with self._condition:
+                while not self._dirty:
+                    self._condition.wait()
+                delay = self._last_update + self.interval - time.monotonic()
+            if delay > 0:
+                # 待っている間の予約もまとめて送る
+                time.sleep(delay)
+            with self._condition:
+                self._dirty = False
+            if self._update() is False:
+                return
+
+class CardProgress:
+    """
+    yt-dlpのprogress_hooksとpostprocessor_hooksから、カードのプログレスバーと進捗テキストを更新する
+    フックは1秒間に何百回も呼ばれることがあるため、表示の更新はMIN_INTERVAL秒に1回までに間引く
+    (完了や後処理の開始など、状態が変わった時はすぐに反映する)
+    
+    :param model: 対象のカードのCardModel
+    """
+    
+    # UIを更新する最短間隔(秒)
+    MIN_INTERVAL = 0.25
+    
+    def __init__(self, model):
+        self.logger = logging.getLogger()
+        self.model = model
+        self._last_update = 0.0
+        self._last_status = None
+    
+    def _apply(self, value, text, status):
+        """状態が変わった時か、前回の更新からMIN_INTERVAL秒以上経過した時のみUIに反映する"""
+        now = time.monotonic()
+        if status == self._last_status and now - self._last_update < self.MIN_INTERVAL:
+            return
+        self._last_status = status
+        self._last_update = now
+        self.model.update(progress_value=value, progress_text=text)
+    
+    def entries_progress(self, finished, failed, total):
+        """プレイリストの中身のダウンロードの完了件数(失敗したものも含む)を反映する"""
+        text = f"{finished}/{total}件完了"
+        if failed:
+            text += f" (失敗: {failed}件)"
+        self._apply(finished / total if total else None, text, f"entries:{finished}:{failed}")
+    
+    def command_progress(self, fields):
+        """yt-dlpのコマンドの進捗行を解析した結果(ProcessRunnerのon_progress)を反映する"""
+        percent = float(fields["percent"])
+        texts = [f"{percent:.1f}% ({fields['total']})"]
+        if fields.get("speed", None) and fields["speed"] != "Unknown":
+            texts.append(f"{fields['speed']}")
+        if fields.get("eta", None) and fields["eta"] != "Unknown":
+            texts.append(f"残り{fields['eta']}")
+        status = "finished" if percent >= 100 else "downloading"
+        self._apply(min(percent / 100, 1.0), " ".join(texts), status)
+    
+    def progress_hook(self, d):
+        """ダウンロード中の進捗(バイト数、速度、残り時間)を反映する"""
+        status = d.get("status", None)
+        if status == "downloading":
+            downloaded = d.get("downloaded_bytes", None) or 0
+            total = d.get("total_bytes", None) or d.get("total_bytes_estimate", None)
+            speed = d.get("speed", None)
+            eta = d.get("eta", None)
+            texts = []
+            if total:
+                value = min(downloaded / total, 1.0)
+                texts.append(f"{value * 100:.1f}% ({format_bytes(downloaded)}/{format_bytes(total)})")
+            else:
+                # 合計サイズが不明な場合は不確定表示
+                value = None
+                texts.append(format_bytes(downloaded))
+            if speed:
+                texts.append(f"{format_bytes(speed)}/s")
+            if eta is not None:
+                texts.append(f"残り{formatSeconds(eta)}")
+            self._apply(value, " ".join(texts), status)
+        elif status == "finished":
+            self._apply(1.0, "ダウンロード完了", status)
+        elif status == "error":
+            self._apply(None, "ダウンロードに失敗しました", status)
+    
+    def postprocessor_hook(self, d):
+        """後処理(結合や変換など)の段階を反映する"""
+        status = d.get("status", None)
+        postprocessor = d.get("postprocessor", "")
+        if status in ("started", "processing"):
+            # 後処理の進捗は取得できないため不確定表示
+            self._apply(None, f"後処理中: {postprocessor}", f"{status}:{postprocessor}")
+        elif status == "finished":
+            self._apply(1.0, f"後処理完了: {postprocessor}", f"{status}:{postprocessor}")
+
+class Debouncer:
+    """
+    短い間隔で続けて発生するイベントをまとめて、最後のイベントからdelay秒経過した時に1回だけfuncを呼び出す
+    max_waitを指定した場合は、イベントが続いていても最初のイベントからmax_wait秒経過した時点で呼び出す
+    funcはタイマーのスレッドで、最後のtrigger()に渡された引数で呼び出される
+    
+    :param delay: 最後のイベントから呼び出すまでの待ち時間(秒)
+    :param func: 呼び出す関数
+    :param max_wait: イベントが続く場合に、最初のイベントから呼び出すまでの最長の待ち時間(秒)
+    """
+    
+    def __init__(self, delay, func, max_wait=None):
+        self.logger = logging.getLogger()
+        self.delay = delay
+        self.func = func
+        self.max_wait = max_wait
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._timer = None
+        self._generation = 0
+        self._first_event = None
+        self._args = ()
+    
+    def trigger(self, *args):
+        """イベントを記録し、呼び出しを予約し直す"""
+        with self._lock:
+            now = time.monotonic()
+            self._args = args
+            if self._first_event is None:
+                self._first_event = now
+            delay = self.delay
+            if self.max_wait is not None:
+                delay = min(delay, max(0.0, self._first_event + self.max_wait - now))
+            if self._timer is not None:
+                self._timer.cancel()
+            # キャンセルが間に合わずに動き出したタイマーは、世代が違うため何もしない
+            self._generation += 1
+            self._timer = threading.Timer(delay, self._fire, args=(self._generation,))
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def cancel(self):
+        """予約されている呼び出しを取り消す"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._generation += 1
+            self._timer = None
+            self._first_event = None
+    
+    def _fire(self, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            args = self._args
+            self._timer = None
+            self._first_event = None
+            self.calls += 1
+        try:
+            self.func(*args)
+        except Exception as ex:
+            self.logger.error(
+                f"Error in Debouncer: {ex}",
+                exc_info=True
+            )
+
+class CardModel:
+    """
+    カード1枚分の表示内容(軽量なジョブのモデル)
+    画面に表示するコントロールはVirtualCardListが使い回すため、表示内容とユーザーの入力(タイトルなど)はここに保持する
+    値の変更はupdate()で行い、表示中のカードにも反映する(どのスレッドからでも呼び出せる)
+    """
+    
+    __slots__ = (
+        "key", "url", "title", "title_label", "uploader", "upload_date", "entries_text", "thumbnail_src",
+        "thumbnail_path", "thumbnail_size", "content_type", "downloading", "progress_visible", "progress_value", "progress_text", "slot", "owner",
+    )
+    
+    def __init__(self, key, url, title="Unknown", title_label="タイトル", uploader="Unknown", upload_date="Unknown",
+                 entries_text=None, thumbnail_src=None, content_type="movie"):
+        self.key = key
+        self.url = url
+        self.title = title
+        self.title_label = title_label
+        self.uploader = uploader
+        self.upload_date = upload_date
+        # プレイリストの件数表示(プレイリストでない場合はNone)
+        self.entries_text = entries_text
+        self.thumbnail_src = thumbnail_src
+        # 縮小前のサムネイル画像のパス(ない場合はNone)と、thumbnail_srcの表示枠のサイズ(幅, 高さ)
+        self.thumbnail_path = None
+        self.thumbnail_size = None
+        self.content_type = content_type
+        # ダウンロード中は入力欄とボタンを無効にする
+        self.downloading = False
+        self.progress_visible = False
+        self.progress_value = None
+        # 進捗テキスト(Noneの場合は非表示)
+        self.progress_text = None
+        # 表示中の場合は、表示しているCardSlot
+        self.slot = None
+        self.owner = None
+    
+    def update(self, **fields):
+        """表示内容を更新する(一覧に追加済みの場合は、表示中のカードにも反映する)"""
+        if self.owner is None:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            return
+        self.owner.update_model(self, **fields)
+
+class CardSlot:
+    """
+    VirtualCardListが使い回すカード1枚分のコントロール
+    bind()で表示するCardModelを切り替える(コントロールは作り直さず、値のみを書き換える)
+    
+    :param on_download: ダウンロードボタンが押された時に呼び出す関数(e, key)
+    :param on_delete: 削除ボタンが押された時に呼び出す関数(e, key, url)
+    """
+    
+    def __init__(self, on_download, on_delete):
+        self.model = None
+        # 入力内容はその都度モデルに書き戻す(スクロールして別のモデルを表示しても失われないように)
+        self.title = ft.TextField(
+            label="タイトル",
+            adaptive=True,
+            on_change=lambda e: self._store_input("title", e.control.value),
+        )
+        self.uploader = ft.TextField(
+            label="投稿者",
+            adaptive=True,
+            on_change=lambda e: self._store_input("uploader", e.control.value),
+        )
+        self.upload_date = ft.Text()
+        # プレイリストの場合は投稿日時の下にコンテンツ数を表示する
+        self.entries_count = ft.Text(visible=False)
+        # 保存形式を個々に選択できるようにする(MovieとMusic)
+        self.content_type = ft.RadioGroup(
+            content=ft.Row([
+                ft.Radio(value="movie", label="Movie"),
+                ft.Radio(value="music", label="Music"),
+            ]),
+            on_change=lambda e: self._store_input("content_type", e.control.value),
+        )
+        self.download_icon = ft.IconButton(
+            icon=ft.Icons.CLOUD_DOWNLOAD_ROUNDED,
+            on_click=lambda e: self.model and on_download(e, self.model.key),
+            tooltip="ダウンロード",
+        )
+        self.delete_icon = ft.IconButton(
+            icon=ft.Icons.DELETE_FOREVER_ROUNDED,
+            on_click=lambda e: self.model and on_delete(e, self.model.key, self.model.url),
+            tooltip="削除",
+        )
+        self.thumbnail = ft.Image(
+            src=None,
+            fit=ft.ImageFit.CONTAIN,
+            border_radius=ft.border_radius.all(10),
+        )
+        self.progress_bar = ft.ProgressBar(
+            visible=False,
+            value=None,
+        )
+        progress_container = ft.Container(
+            content=self.progress_bar,
+            expand=True, # 親であるCardの幅いっぱいに広がるように
+            clip_behavior=ft.ClipBehavior.ANTI_ALIAS,
+            border_radius=ft.border_radius.all(8),
+        )
+        # ダウンロード済みのサイズ、速度、残り時間、後処理の段階を表示する(CardProgressから更新される)
+        self.progress_text = ft.Text(
+            visible=False,
+            size=12,
+        )
+        about_info = ft.Column(
+            controls=[
+                self.title,
+                ft.Row(
+                    controls=[
+                        self.uploader,
+                        ft.Row(
+                            controls=[
+                                self.content_type,
+                                ft.Column(
+                                    controls=[
+                                        self.upload_date,
+                                        self.entries_count,
+                                    ],
+                                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                                ),
+                            ],
+                            alignment=ft.MainAxisAlignment.END,
+                        ),
+                    ],
+                    alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                ),
+            ],
+            expand=True,
+        )
+        info = ft.Row(
+            controls=[
+                self.thumbnail,
+                about_info,
+                ft.Column(
+                    controls=[
+                        self.download_icon,
+                        self.delete_icon,
+                    ],
+                    alignment=ft.alignment.center,
+                ),
+            ],
+            alignment=ft.alignment.center,
+        )
+        card = ft.Card(
+            content=ft.Container(
+                content=ft.Column(
+                    controls=[
+                        info,
+                        progress_container,
+                        self.progress_text,
+                    ],
+                    spacing=10,
+                ),
+                padding=4,
+            ),
+            margin=0,
+        )
+        # 1行分の高さを固定し、表示範囲外の行数からスクロール量を計算できるようにする
+        self.control = ft.Container(
+            content=card,
+            padding=ft.padding.only(bottom=VirtualCardList.SPACING),
+        )
+    
+    def _store_input(self, name, value):
+        if self.model is not None:
+            setattr(self.model, name, value)
+    
+    def bind(self, model, frame_width, frame_height, row_height):
+        """modelの内容をコントロールに反映する(Noneの場合は表示しているモデルとの紐付けのみ解除する)"""
+        self.model = model
+        if model is None:
+            return
+        disabled = model.downloading
+        self.title.label = model.title_label
+        self.title.value = model.title
+        self.title.disabled = disabled
+        self.uploader.value = model.uploader
+        self.uploader.disabled = disabled
+        self.upload_date.value = model.upload_date
+        self.entries_count.value = model.entries_text
+        self.entries_count.visible = model.entries_text is not None
+        self.content_type.value = model.content_type
+        self.content_type.disabled = disabled
+        self.download_icon.disabled = disabled
+        self.delete_icon.disabled = disabled
+        self.thumbnail.src = model.thumbnail_src
+        self.thumbnail.width = frame_width
+        self.thumbnail.height = frame_height
+        self.progress_bar.visible = model.progress_visible
+        self.progress_bar.value = model.progress_value
+        self.progress_text.value = model.progress_text
+        self.progress_text.visible = model.progress_text is not None
+        self.control.height = row_height
+
+class VirtualCardList:
+    """
+    仮想化したカードの一覧
+    カードごとにはCardModelのみを保持し、画面に表示されている範囲(と前後のBUFFER件)の分だけCardSlotを使い回して表示する。
+    表示範囲外のカードは作らず、上下のスペーサーの高さとしてスクロール量のみを確保する。
+    
+    :param page: Fletのpage
+    :param on_download: ダウンロードボタンが押された時に呼び出す関数(e, key)
+    :param on_delete: 削除ボタンが押された時に呼び出す関数(e, key, url)
+    :param frame_size: サムネイル画像の表示枠のサイズ(幅, 高さ)
+    :param models: CardModelを保持するdict(Downloadと共有する場合に渡す)
+    :param on_stale_thumbnail: 表示するカードのサムネイル画像が表示枠のサイズと異なる場合に呼び出す関数(model, 幅, 高さ)
+    """
+    
+    # 表示範囲の前後に余分に表示する件数
+    BUFFER = 3
+    # カードの間隔
+    SPACING = 10
+    # サムネイル画像の横に並ぶ入力欄(タイトルと投稿者)の高さ
+    INFO_MIN_HEIGHT = 130
+    # プログレスバーと進捗テキスト、余白の高さ
+    EXTRA_HEIGHT = 50
+    # スクロール位置の通知間隔(ミリ秒)
+    SCROLL_INTERVAL = 50
+    
+    def __init__(self, page, on_download, on_delete, frame_size, models=None, on_stale_thumbnail=None):
+        self.logger = logging.getLogger()
+        self.logger.debug("VirtualCardListの__init__開始")
+        self.page = page
+        self.on_download = on_download
+        self.on_delete = on_delete
+        self.on_stale_thumbnail = on_stale_thumbnail
+        self.frame_width, self.frame_height = frame_size
+        self.models = models if models is not None else {}
+        self._keys = []
+        self._slots = []
+        self._lock = threading.RLock()
+        self._scroll_offset = 0.0
+        # スクロール位置が通知されるまでは、ウィンドウの高さを表示範囲とみなす
+        self._viewport = (page.window.height if page and page.window.height else 0) or 800
+        self.top_spacer = ft.Container(height=0)
+        self.bottom_spacer = ft.Container(height=0)
+        self.control = ft.Column(
+            controls=[self.top_spacer, self.bottom_spacer],
+            spacing=0,
+            expand=True,
+            scroll=ft.ScrollMode.ADAPTIVE,
+            on_scroll=self._on_scroll,
+            on_scroll_interval=self.SCROLL_INTERVAL,
+        )
+    
+    @property
+    def row_height(self):
+        """カード1行分の高さ(カードの間隔を含む)"""
+        return max(self.frame_height, self.INFO_MIN_HEIGHT) + self.EXTRA_HEIGHT + self.SPACING
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def __contains__(self, key):
+        return key in self.models
+    
+    def append(self, model):
+        """カードを末尾に追加する"""
+        with self._lock:
+            model.owner = self
+            self.models[model.key] = model
+            self._keys.append(model.key)
+            self._render()
+        mark_dirty(self.page)
+    
+    def remove(self, key):
+        """カードを削除する"""
+        with self._lock:
+            model = self.models.pop(key)
+            self._keys.remove(key)
+            model.owner = None
+            self._render()
+        mark_dirty(self.page)
+        return model
+    
+    def clear(self):
+        """全てのカードを削除する"""
+        with self._lock:
+            for model in self.models.values():
+                model.owner = None
+                model.slot = None
+            self.models.clear()
+            self._keys.clear()
+            self._render()
+        mark_dirty(self.page)
+    
+    def update_model(self, model, **fields):
+        """CardModel.update()から呼び出され、モデルを更新して表示中であればカードにも反映する"""
+        with self._lock:
+            for name, value in fields.items():
+                setattr(model, name, value)
+            slot = model.slot
+            if slot is None:
+                # 表示範囲外のカードは、表示する時にbind()で反映される
+                return
+            slot.bind(model, self.frame_width, self.frame_height, self.row_height)
+        mark_dirty(self.page)
+    
+    def set_frame_size(self, frame_width, frame_height):
+        """
+        サムネイル画像の表示枠のサイズを変更し、表示中のカードに反映する
+        
+        :return: サイズが変わった場合はTrue
+        """
+        with self._lock:
+            if (frame_width, frame_height) == (self.frame_width, self.frame_height):
+                return False
+            self.frame_width = frame_width
+            self.frame_height = frame_height
+            for slot in self._slots:
+                if slot.model is not None:
+                    slot.bind(slot.model, frame_width, frame_height, self.row_height)
+            self._render()
+        mark_dirty(self.page)
+        return True
+    
+    def _on_scroll(self, e):
+        """スクロール位置に応じて表示するカードを入れ替える"""
+        self._scroll_offset = e.pixels or 0.0
+        if e.viewport_dimension:
+            self._viewport = e.viewport_dimension
+        with self._lock:
+            changed = self._render()
+        if changed:
+            mark_dirty(self.page)
+    
+    def visible_range(self):
+        """表示するカードの範囲(開始位置, 終了位置)"""
+        row_height = self.row_height
+        first = max(0, int(self._scroll_offset // row_height) - self.BUFFER)
+        count = int(self._viewport // row_height) + 1 + self.BUFFER * 2
+        return first, min(len(self._keys), first + count)
+    
+    def _render(self):
+        """
+        表示範囲のモデルをスロットに割り当て、スペーサーの高さを調整する(self._lockを保持した状態で呼び出すこと)
+        スロットは表示位置ごとに使い回すため、スクロールしてもコントロールの追加・削除は起きず、値の書き換えのみになる
+        
+        :return: 表示内容が変わった場合はTrue
+        """
+        first, last = self.visible_range()
+        visible_keys = self._keys[first:last]
+        while len(self._slots) < len(visible_keys):
+            self._slots.append(CardSlot(self.on_download, self.on_delete))
+        changed = False
+        row_height = self.row_height
+        for index, slot in enumerate(self._slots):
+            model = self.models[visible_keys[index]] if index < len(visible_keys) else None
+            if slot.model is model:
+                continue
+            changed = True
+            if slot.model is not None and slot.model.slot is slot:
+                slot.model.slot = None
+            if model is not None:
+                if model.slot is not None and model.slot is not slot:
+                    model.slot.model = None
+                model.slot = slot
+            slot.bind(model, self.frame_width, self.frame_height, row_height)
+        if self.on_stale_thumbnail is not None:
+            # 表示枠のサイズの変更後に初めて表示するカードは、サムネイル画像を新しいサイズで縮小し直す
+            frame_size = (self.frame_width, self.frame_height)
+            for slot in self._slots[:len(visible_keys)]:
+                model = slot.model
+                if model is not None and model.thumbnail_size is not None and model.thumbnail_size != frame_size:
+                    self.on_stale_thumbnail(model, *frame_size)
+        top_height = first * row_height
+        bottom_height = (len(self._keys) - last) * row_height
+        if self.top_spacer.height != top_height or self.bottom_spacer.height != bottom_height:
+            changed = True
+            self.top_spacer.height = top_height
+            self.bottom_spacer.height = bottom_height
+        controls = [self.top_spacer, *(slot.control for slot in self._slots[:len(visible_keys)]), self.bottom_spacer]
+        if len(controls) != len(self.control.controls):
+            changed = True
+            # リストごと置き換える(page.update()を送るスレッドが途中の状態を参照しないように)
+            self.control.controls = controls
+        return changed
+
+class ThumbnailCache:
+    """
+    サムネイル画像の永続キャッシュ
+    URLをkeyとしてユーザーデータディレクトリに画像を保存し、アプリを再起動しても再取得しないようにする。
+    Cache-Controlの有効期限内はそのまま使用し、期限切れの場合はETag/Last-Modifiedで再検証する。
+    合計サイズが上限を超えた場合は、最も長く使われていないものから削除する(LRU)。
+    画像のファイルの読み書きはロックの外で行い、インデックスはまとめて(SAVE_DELAY秒後と終了時に)書き込む。
+    
+    :param cache_dir: キャッシュの保存先ディレクトリ
+    :param max_bytes: キャッシュの合計サイズの上限(バイト)
+    :param session_factory: 画像の取得に使用するrequests.Sessionを作成する関数(初回の取得時に呼び出す)
+    :param timeout: 接続とレスポンス読み込みのタイムアウト(秒)
+    """
+    
+    INDEX_FILENAME = "index.json"
+    # インデックスの書き込みを遅らせる時間(秒)(続けて取得した分はまとめて1回で書き込む)
+    SAVE_DELAY = 2.0
+    SAVE_MAX_WAIT = 10.0
+    # 取得中に他のスレッドでキャッシュから削除された場合に、取得し直す回数の上限
+    MAX_ATTEMPTS = 3
+    
+    def __init__(self, cache_dir, max_bytes, session_factory, timeout=(5, 15)):
+        self.logger = logging.getLogger()
+        self.logger.debug("ThumbnailCacheの__init__開始")
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max(0, int(max_bytes))
+        self.session_factory = session_factory
+        self._session = None
+        self.timeout = timeout
+        self.index_path = os.path.join(self.cache_dir, self.INDEX_FILENAME)
+        # インデックスの参照と変更のみに使用する(ファイルの読み書きはロックの外で行う)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # url: {"file", "etag", "last_modified", "expires", "size"}(先頭ほど長く使われていない)
+        self._index = OrderedDict()
+        self._total_bytes = 0
+        self._dirty = False
+        self._load_index()
+        # インデックスは取得のたびではなく、まとめて書き込む(終了時に残りを書き込む)
+        self._save_debouncer = Debouncer(self.SAVE_DELAY, self.save_index, max_wait=self.SAVE_MAX_WAIT)
+        atexit.register(self.close)
+    
+    @property
+    def session(self):
+        """画像の取得に使用するrequests.Session(requestsの読み込みを初回の取得まで遅らせる)"""
+        with self._lock:
+            if self._session is None:
+                self._session = self.session_factory()
+            return self._session
+    
+    def _load_index(self):
+        """インデックスを読み込む(壊れている場合や、ファイルが存在しないエントリーは捨てる)"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as ex:
+            self.logger.warning(f"サムネイルキャッシュのインデックスを読み込めませんでした。キャッシュを作り直します: {ex}")
+            return
+        for url, entry in entries:
+            if os.path.exists(os.path.join(self.cache_dir, entry["file"])):
+                self._index[url] = entry
+                self._total_bytes += entry.get("size", 0)
+        self.logger.info(f"サムネイルキャッシュを読み込みました。件数: {len(self._index)}, 合計: {self._total_bytes}バイト")
+    
+    def save_index(self):
+        """変更があればインデックスを書き込む(self._lockは書き込む内容の取り出しにのみ使用する)"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                entries = [(url, dict(entry)) for url, entry in self._index.items()]
+                self._dirty = False
+            temp_path = self.index_path + ".tmp"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, ensure_ascii=False)
+                os.replace(temp_path, self.index_path)
+            except Exception as ex:
+                with self._lock:
+                    self._dirty = True
+                self.logger.warning(f"サムネイルキャッシュのインデックスを書き込めませんでした: {ex}")
+    
+    def close(self):
+        """予約されている書き込みを取り消し、残りの変更をすぐに書き込む"""
+        self._save_debouncer.cancel()
+        self.save_index()
+    
+    def _mark_dirty(self):
+        """インデックスの書き込みを予約する(self._lockを保持した状態で呼び出すこと)"""
+        self._dirty = True
+        self._save_debouncer.trigger()
+    
+    def _evict(self):
+        """
+        合計サイズが上限を下回るまで、最も長く使われていないものをインデックスから取り除く(self._lockを保持した状態で呼び出すこと)
+        
+        :return: 削除するファイルのパスのリスト(ロックの外で_remove_filesに渡す)
+        """
+        evicted = []
+        while self._total_bytes > self.max_bytes and self._index:
+            url, entry = self._index.popitem(last=False)
+            self._total_bytes -= entry.get("size", 0)
+            evicted.append(os.path.join(self.cache_dir, entry["file"]))
+            self.logger.debug(f"サムネイルキャッシュから削除しました: {url}")
+        return evicted
+    
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    @staticmethod
+    def content_key(url):
+        """URLに対応するキャッシュのkey(キャッシュのファイル名やThumbnailRendererのkeyに使用する)"""
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def _copy(src, dest_path):
+        """
+        キャッシュのファイルをdest_pathにコピーする
+        同じ画像のコピー先は複数のカードで共有するため、書き込み途中のファイルが読み込まれないように一時ファイルから置き換える
+        
+        :return: コピーできた場合はTrue、他のスレッドでキャッシュから削除されていた場合はFalse
+        """
+        temp_path = f"{dest_path}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(src, temp_path)
+        except FileNotFoundError:
+            return False
+        os.replace(temp_path, dest_path)
+        return True
+    
+    @staticmethod
+    def _parse_max_age(cache_control):
+        """Cache-Controlヘッダーからmax-ageの秒数を取得する(no-cacheなどの場合は0)"""
+        if not cache_control:
+            return 0
+        directives = [d.strip().lower() for d in cache_control.split(",")]
+        if "no-cache" in directives or "no-store" in directives:
+            return 0
+        for directive in directives:
+            if directive.startswith("max-age="):
+                try:
+                    return max(0, int(directive.split("=", 1)[1]))
+                except ValueError:
+                    return 0
+        return 0
+    
+    def fetch(self, url, dest_path):
+        """
+        URLの画像をdest_pathに保存する(キャッシュがあればそれを使用する)
+        使用するはずのキャッシュが他のスレッドで削除された場合は、MAX_ATTEMPTS回まで取得し直す
+        
+        :param url: サムネイル画像のURL
+        :param dest_path: 保存先のパス(呼び出し元で自由に加工できるように、キャッシュのコピーを保存する)
+        """
+        for attempt in range(self.MAX_ATTEMPTS):
+            if self._fetch_once(url, dest_path):
+                return dest_path
+            self.logger.debug(f"取得中にサムネイルキャッシュから削除されたため、取得し直します: {url}")
+        raise OSError(f"サムネイル画像をキャッシュに保存できませんでした: {url}")
+    
+    def _fetch_once(self, url, dest_path):
+        """
+        fetch()の1回分の処理(ファイルの読み書きと通信はself._lockの外で行う)
+        
+        :return: 保存できた場合はTrue、使用するキャッシュが他のスレッドで削除されていた場合はFalse
+        """
+        fresh = False
+        with self._lock:
+            entry = self._index.get(url, None)
+            if entry:
+                # ロックの外で参照するため、コピーを使用する
+                entry = dict(entry)
+                fresh = entry.get("expires", 0) > time.time()
+                if fresh:
+                    self._index.move_to_end(url)
+        if entry and fresh:
+            # 有効期限内なので再検証せずに使用する
+            return self._copy(os.path.join(self.cache_dir, entry["file"]), dest_path)
+        headers = {}
+        if entry:
+            if entry.get("etag", None):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified", None):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as ex:
+            if not entry:
+                raise ex
+            # 再検証できない場合(オフラインなど)は、キャッシュをそのまま使用する
+            self.logger.warning(f"サムネイルの再検証に失敗したため、キャッシュを使用します: {ex}")
+            if self._copy(os.path.join(self.cache_dir, entry["file"]), dest_path):
+                return True
+            # キャッシュも削除されていた場合は、取得し直さずにエラーとする
+            raise ex
+        if response.status_code == 304:
+            with self._lock:
+                current = self._index.get(url, None)
+                if current is None:
+                    # 再検証中に他のスレッドで削除された場合は、改めて取得する
+                    return False
+                current["expires"] = time.time() + self._parse_max_age(response.headers.get("Cache-Control", None))
+                self._index.move_to_end(url)
+                self._mark_dirty()
+                filename = current["file"]
+            return self._copy(os.path.join(self.cache_dir, filename), dest_path)
+        response.raise_for_status()
+        # 同じURLを同時に取得した場合や、古いファイルを読み込み中の場合に上書きしないように、取得ごとに別のファイルに保存する
+        filename = f"{self.content_key(url)}.{uuid.uuid4().hex[:8]}.img"
+        file_path = os.path.join(self.cache_dir, filename)
+        temp_path = file_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(response.content)
+        os.replace(temp_path, file_path)
+        # インデックスに追加する前にコピーする(追加後は他のスレッドで削除される可能性がある)
+        self._copy(file_path, dest_path)
+        new_entry = {
+            "file": filename,
+            "etag": response.headers.get("ETag", None),
+            "last_modified": response.headers.get("Last-Modified", None),
+            "expires": time.time() + self._parse_max_age(response.headers.get("Cache-Control", None)),
+            "size": len(response.content),
+        }
+        with self._lock:
+            old_entry = self._index.pop(url, None)
+            if old_entry:
+                self._total_bytes -= old_entry.get("size", 0)
+            self._index[url] = new_entry
+            self._total_bytes += new_entry["size"]
+            removed = self._evict()
+            self._mark_dirty()
+        if old_entry and old_entry["file"] != filename:
+            removed.append(os.path.join(self.cache_dir, old_entry["file"]))
+        self._remove_files(removed)
+        return True
+
+class ThumbnailRenderer:
+    """
+    サムネイル画像を表示枠のサイズに縮小して保存するワーカープール
+    JPEGはドラフトモードで表示枠に近い解像度のまま読み込み、16:9の灰色の背景の中央に縮小して配置する。
+    変換結果は(画像のkey, 幅, 高さ)ごとにキャッシュし、同じ組み合わせは別のカードや再取得でも再変換しない。
+    画像のkeyはThumbnailCache.content_key()(サムネイル画像のURLのsha256)で、キャッシュの件数はmax_entriesまで(最も使われていないものから捨てる)。
+    
+    :param output_dir: 変換後の画像の保存先ディレクトリ
+    :param max_workers: 変換を行うワーカースレッドの数
+    :param quality: 保存時のJPEGの品質
+    :param max_entries: キャッシュする変換結果の数の上限
+    """
+    
+    BACKGROUND_COLOR = (128, 128, 128)
+    
+    def __init__(self, output_dir, max_workers=2, quality=85, max_entries=512):
+        self.logger = logging.getLogger()
+        self.output_dir = output_dir
+        self.quality = quality
+        self.max_entries = max(1, int(max_entries))
+        self.executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="thumbnail")
+        # (画像のkey, 幅, 高さ) → Future(変換後の画像のパス)(末尾ほど最近使われたもの)
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        atexit.register(self.executor.shutdown, wait=False, cancel_futures=True)
+    
+    def submit(self, src, width, height, cache_key=None):
+        """
+        変換を予約し、変換後の画像のパスを返すFutureを返す
+        既に同じ組み合わせの変換が予約または完了している場合は、そのFutureを返す(失敗したものは再変換する)
+        
+        :param cache_key: 画像のkey(ThumbnailCache.content_key())。省略時は元画像のファイル名(拡張子を除く)を使用する
+            (preview_video_infoはcontent_keyをファイル名にして保存する)
+        """
+        if cache_key is None:
+            cache_key = os.path.splitext(os.path.basename(src))[0]
+        result_key = (cache_key, int(width), int(height))
+        with self.lock:
+            future = self.results.get(result_key, None)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self.results.move_to_end(result_key)
+                return future
+            future = self.executor.submit(self._render, src, *result_key)
+            self.results[result_key] = future
+            # 変換後の画像のファイルは一時ディレクトリ内にあり、アプリの終了時に削除される
+            while len(self.results) > self.max_entries:
+                self.results.popitem(last=False)
+            return future
+    
+    def _render(self, src, cache_key, width, height):
+        """元画像を縮小してwidth x heightの背景の中央に配置し、JPEGとして保存する"""
+        output_path = os.path.join(self.output_dir, f"{cache_key}_{width}x{height}.jpg")
+        with Image.open(src) as img:
+            # JPEGの場合はデコード時に縮小する(それ以外の形式では何もしない)
+            img.draft("RGB", (width, height))
+            img = img.convert("RGB")
+            scale = min(width / img.width, height / img.height)
+            resized_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            resized = img.resize(resized_size, Image.LANCZOS)
+        background = Image.new("RGB", (width, height), self.BACKGROUND_COLOR)
+        background.paste(resized, ((width - resized_size[0]) // 2, (height - resized_size[1]) // 2))
+        # 書き込み途中のファイルが表示されないように、一時ファイルに保存してから置き換える
+        temp_path = output_path + ".tmp"
+        background.save(temp_path, format="JPEG", quality=self.quality, optimize=True)
+        os.replace(temp_path, output_path)
+        self.logger.debug(f"サムネイル画像を変換しました: {output_path}")
+        return output_path
+
+class PlaceholderCache:
+    """
+    サムネイル画像がないカードに表示するプレースホルダー画像(灰色の画像)のキャッシュ
+    表示枠のサイズごとに1度だけ生成して保存し、同じサイズのカードは全て同じファイルを共有する。
+    
+    :param output_dir: プレースホルダー画像の保存先ディレクトリ
+    """
+    
+    COLOR = (128, 128, 128)
+    
+    def __init__(self, output_dir):
+        self.logger = logging.getLogger()
+        self.output_dir = output_dir
+        # (幅, 高さ) → プレースホルダー画像のパス
+        self.paths = {}
+        self.lock = threading.Lock()
+    
+    def get(self, width, height):
+        """width x heightのプレースホルダー画像のパスを返す(まだない場合は生成する)"""
+        size = (max(1, int(width)), max(1, int(height)))
+        with self.lock:
+            path = self.paths.get(size, None)
+            if path and os.path.exists(path):
+                return path
+            path = os.path.join(self.output_dir, f"placeholder_{size[0]}x{size[1]}.jpg")
+            temp_path = path + ".tmp"
+            Image.new("RGB", size, self.COLOR).save(temp_path, format="JPEG", quality=85)
+            os.replace(temp_path, path)
+            self.paths[size] = path
+            self.logger.debug(f"プレースホルダー画像を生成しました: {path}")
+            return path
+
+class DownloadArchive:
+    """
+    ダウンロード済みの動画を記録するアーカイブ
+    yt-dlpのdownload_archiveと同じ形式(1行に1件、"<抽出器名(小文字)> <動画ID>")のテキストファイルに追記していく。
+    起動時に全件をsetに読み込むため、ダウンロード済みかどうかの確認は定数時間で行える。
+    
+    :param path: アーカイブファイルのパス
+    """
+    
+    def __init__(self, path):
+        self.logger = logging.getLogger()
+        self.path = path
+        self.lock = threading.Lock()
+        self._ids = set()
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    archive_id = line.strip()
+                    if archive_id:
+                        self._ids.add(archive_id)
+        self.logger.info(f"ダウンロードアーカイブを読み込みました: {self.path}, 件数: {len(self._ids)}")
+    
+    @staticmethod
+    def make_id(extractor_key, video_id):
+        """抽出器名と動画IDからアーカイブのIDを作成する(どちらかが不明な場合はNone)"""
+        if not extractor_key or not video_id:
+            return None
+        return make_archive_id(extractor_key, video_id)
+    
+    def __contains__(self, archive_id):
+        return bool(archive_id) and archive_id in self._ids
+    
+    def add(self, archive_id):
+        """ダウンロードが完了した動画をアーカイブに記録する"""
+        if not archive_id:
+            return
+        with self.lock:
+            if archive_id in self._ids:
+                return
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(f"{archive_id}\n")
+            self._ids.add(archive_id)
+
+class UrlListFile:
+    """
+    URLの一覧のファイルを1行ずつ読み込むクラス
+    ファイル全体は読み込まず、バッファ単位で読み込みながらURLを返すため、大きなファイルでもメモリ使用量は一定。
+    gzip、bzip2、xzで圧縮されたファイルは先頭のバイト列で判別して展開しながら読み込む。
+    空行と#で始まる行(コメント)は読み飛ばす。
+    
+    :param path: ファイルのパス
+    """
+    
+    # 圧縮形式ごとの先頭のバイト列と展開用の関数
+    COMPRESSIONS = (
+        (b"\x1f\x8b", gzip.open),
+        (b"BZh", bz2.open),
+        (b"\xfd7zXZ\x00", lzma.open),
+    )
+    # 読み込みのバッファサイズ(バイト)
+    CHUNK_SIZE = 64 * 1024
+    
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.lines = 0
+        self._raw = open(path, "rb", buffering=self.CHUNK_SIZE)
+        try:
+            magic = self._raw.peek(6)[:6]
+            stream = self._raw
+            for signature, decompressor in self.COMPRESSIONS:
+                if magic.startswith(signature):
+                    stream = decompressor(self._raw)
+                    break
+            self._text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace")
+        except Exception:
+            self._raw.close()
+            raise
+    
+    @property
+    def progress(self):
+        """読み込みの進捗(0～1、圧縮ファイルは圧縮後のサイズで計算する)"""
+        if self.size == 0 or self._raw.closed:
+            return 1.0
+        return min(1.0, self._raw.tell() / self.size)
+    
+    def __iter__(self):
+        for line in self._text:
+            self.lines += 1
+            url = line.strip()
+            if url and not url.startswith("#"):
+                yield url
+    
+    def close(self):
+        self._text.close()
+        self._raw.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class UrlIndex:
+    """
+    取り込み済みのURLの重複確認用の索引
+    URLはそのままではなく、同じ動画を指すURL(youtu.be/XとYouTubeのwatch?v=X&t=5、トラッキング用のクエリ付きなど)が
+    同じになるように、メディアの識別子に変換してから記録する。
+    - extractor(抽出器)がURLから動画IDを取り出せる場合: "<抽出器名(小文字)> <動画ID>"(DownloadArchiveと同じ形式)
+    - それ以外の場合: 正規化したURL(normalize_urlを参照)
+    動画情報の取得後は、実際の動画IDから作成したアーカイブのIDも同じURLの識別子として記録する。
+    識別子はdictで管理するため、1件の確認は取り込み済みの件数によらず一定時間で行える。
+    
+    :param router: URLからextractorを選ぶExtractorRouter
+    """
+    
+    # 取り除くクエリ(トラッキング用、共有用のもの)
+    TRACKING_PARAMS = frozenset((
+        "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+        "_ga", "_gl", "ref_src", "ref_url", "si", "feature", "pp", "spm", "share_source", "is_from_webapp",
+    ))
+    TRACKING_PREFIXES = ("utm_",)
+    # 省略できるホスト名の先頭部分
+    HOST_PREFIXES = ("www.", "m.")
+    DEFAULT_PORTS = {"http": 80, "https": 443}
+    
+    def __init__(self, router):
+        self.logger = logging.getLogger()
+        self.logger.debug("UrlIndexの__init__開始")
+        self.router = router
+        # 識別子: URL
+        self._owners = {}
+        # URL: [識別子](動画情報の取得が完了していないURLはself._pendingにも記録する)
+        self._identities = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def normalize_url(cls, url):
+        """
+        URLを正規化する
+        スキームとホスト名の小文字化、www.とm.の除去、既定のポート番号とフラグメントの除去、
+        トラッキング用のクエリの除去とクエリの並べ替え、末尾の/の除去を行う
+        """
+        try:
+            parsed = urlparse(url.strip())
+            host = (parsed.hostname or "").lower()
+            port = parsed.port
+        except ValueError:
+            return url.strip()
+        scheme = parsed.scheme.lower()
+        for prefix in cls.HOST_PREFIXES:
+            if host.startswith(prefix):
+                host = host[len(prefix):]
+                break
+        if port is not None and port != cls.DEFAULT_PORTS.get(scheme, None):
+            host = f"{host}:{port}"
+        query = sorted(
+            part for part in parsed.query.split("&")
+            if part and not cls._is_tracking_param(part.split("=", 1)[0].lower())
+        )
+        normalized = f"{scheme}://{host}{parsed.path.rstrip('/')}"
+        if query:
+            normalized += "?" + "&".join(query)
+        return normalized
+    
+    @classmethod
+    def _is_tracking_param(cls, name):
+        return name in cls.TRACKING_PARAMS or name.startswith(cls.TRACKING_PREFIXES)
+    
+    def identity(self, url):
+        """URLが指すメディアの識別子を返す(extractorが動画IDを取り出せない場合は正規化したURL)"""
+        ie_key, temp_id = self.router.temp_id(url)
+        archive_id = DownloadArchive.make_id(ie_key, temp_id)
+        if archive_id:
+            return archive_id
+        return self.normalize_url(url)
+    
+    def __contains__(self, url):
+        return self.has_identity(self.identity(url))
+    
+    def has_identity(self, key):
+        """識別子(identity()の戻り値)が記録されているかどうか"""
+        with self._lock:
+            return key in self._owners
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._identities)
+    
+    def add(self, url):
+        """
+        URLを取り込み待ちとして記録する
+        
+        :return: 記録した場合はTrue、同じメディアのURLが既に記録されている場合はFalse
+        """
+        key = self.identity(url)
+        with self._lock:
+            if key in self._owners:
+                return False
+            self._owners[key] = url
+            self._identities[url] = [key]
+            self._pending.add(url)
+            return True
+    
+    def confirm(self, url, archive_id=None):
+        """
+        動画情報を取得したURLを取り込み済みとして記録し、実際の動画IDから作成したアーカイブのIDも識別子として記録する
+        
+        :return: 記録した場合はTrue、アーカイブのIDが別のURLで既に記録されている場合はFalse(このURLの記録は削除する)
+        """
+        with self._lock:
+            owner = self._owners.get(archive_id, url) if archive_id else url
+            if owner != url:
+                self._remove(url)
+                return False
+            self._pending.discard(url)
+            identities = self._identities.get(url, None)
+            if identities is None:
+                # 前回の起動から復元したジョブなど、add()を経由していないURL
+                key = self.identity(url)
+                identities = self._identities[url] = []
+                if self._owners.setdefault(key, url) == url:
+                    identities.append(key)
+            if archive_id and archive_id not in identities:
+                self._owners[archive_id] = url
+                identities.append(archive_id)
+            return True
+    
+    def release_pending(self, url):
+        """取り込み待ちのまま(カードを作成できなかった)URLの記録を削除する"""
+        with self._lock:
+            if url in self._pending:
+                self._remove(url)
+    
+    def discard(self, url):
+        """URLの記録を削除する"""
+        with self._lock:
+            self._remove(url)
+    
+    def _remove(self, url):
+        """URLの記録を削除する(self._lockを保持した状態で呼び出すこと)"""
+        self._pending.discard(url)
+        for key in self._identities.pop(url, ()):
+            if self._owners.get(key, None) == url:
+                del self._owners[key]
+
+class JobStore:
+    """
+    カードごとのジョブ、プレイリストの中身(entry)、ダウンロード状態を保持する組み込みデータベース(SQLite)
+    WALモードで開き、スレッドごとに接続を持つことで、ワーカースレッドから同時に読み書きできるようにする。
+    ユーザーデータディレクトリに保存するため、ダウンロードのオプション、保存先、進捗を記録しておけば、
+    アプリが終了(異常終了を含む)しても次回の起動時に未完了のジョブを再開できる。
+    
+    ジョブの状態(status):
+    -previewed: 動画情報を取得済み(カード表示中)
+    -queued: ダウンロード待ち
+    -downloading: ダウンロード中
+    -completed: ダウンロード完了
+    -failed: ダウンロード失敗
+    -archived: ダウンロード済み(DownloadArchiveに記録済み)のためスキップ
+    
+    :param db_path: データベースファイルのパス
+    """
+    
+    JOB_COLUMNS = (
+        "title", "upload_date", "uploader", "overview", "thumbnail_path", "url", "content_type",
+        "is_playlist", "is_entries", "numbers", "playlist_count", "entries_complete", "status", "archive_id",
+        "options", "outtmpl", "downloaded_bytes", "total_bytes",
+    )
+    ENTRY_COLUMNS = ("title", "url", "uploader", "upload_date", "overview", "status", "archive_id")
+    BOOL_COLUMNS = ("is_playlist", "is_entries", "entries_complete")
+    # JSONとして保存する項目
+    JSON_COLUMNS = ("options",)
+    # 次回の起動時に再開するジョブの状態
+    UNFINISHED_STATUSES = ("queued", "downloading")
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            key TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            title TEXT,
+            upload_date TEXT,
+            uploader TEXT,
+            overview TEXT,
+            thumbnail_path TEXT,
+            content_type TEXT,
+            is_playlist INTEGER NOT NULL DEFAULT 0,
+            is_entries INTEGER NOT NULL DEFAULT 0,
+            numbers INTEGER NOT NULL DEFAULT 0,
+            playlist_count INTEGER,
+            entries_complete INTEGER NOT NULL DEFAULT 1,
+            status TEXT NOT NULL DEFAULT 'previewed',
+            archive_id TEXT,
+            options TEXT,
+            outtmpl TEXT,
+            downloaded_bytes INTEGER,
+            total_bytes INTEGER,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+        CREATE INDEX IF NOT EXISTS idx_jobs_url ON jobs(url);
+        CREATE TABLE IF NOT EXISTS entries (
+            job_key TEXT NOT NULL REFERENCES jobs(key) ON DELETE CASCADE,
+            idx INTEGER NOT NULL,
+            title TEXT,
+            url TEXT NOT NULL,
+            uploader TEXT,
+            upload_date TEXT,
+            overview TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            archive_id TEXT,
+            PRIMARY KEY (job_key, idx)
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_status ON entries(job_key, status);
+    """
+    
+    def __init__(self, db_path):
+        self.logger = logging.getLogger()
+        self.logger.debug("JobStoreの__init__開始")
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+        self.logger.info(f"ジョブストアを開きました: {self.db_path}")
+    
+    def _connect(self):
+        """呼び出し元のスレッド専用の接続を返す(なければ作成する)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+    
+    def _row_to_dict(self, row, columns):
+        data = {column: row[column] for column in columns}
+        for column in self.BOOL_COLUMNS:
+            if column in data:
+                data[column] = bool(data[column])
+        for column in self.JSON_COLUMNS:
+            if data.get(column, None) is not None:
+                data[column] = json.loads(data[column])
+        return data
+    
+    def add_job(self, key, info):
+        """
+        動画情報(preview_video_infoで作成した辞書)をジョブとして登録する
+        info["entries"]があれば、プレイリストの中身として合わせて登録する
+        """
+        now = time.time()
+        values = {column: info.get(column, None) for column in self.JOB_COLUMNS}
+        values["status"] = values["status"] or "previewed"
+        for column in self.BOOL_COLUMNS:
+            default = column == "entries_complete"
+            values[column] = int(bool(info.get(column, default)))
+        values["numbers"] = values["numbers"] or 0
+        for column in self.JSON_COLUMNS:
+            if values[column] is not None:
+                values[column] = json.dumps(values[column], ensure_ascii=False)
+        columns = ", ".join(("key", *values.keys(), "created_at", "updated_at"))
+        placeholders = ", ".join("?" * (len(values) + 3))
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO jobs ({columns}) VALUES ({placeholders})",
+                (key, *values.values(), now, now),
+            )
+            self._insert_entries(conn, key, info.get("entries", None) or [])
+        return key
+    
+    def _insert_entries(self, conn, key, entries):
+        conn.executemany(
+            "INSERT OR REPLACE INTO entries (job_key, idx, title, url, uploader, upload_date, overview, archive_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (key, entry["index"], entry.get("title", None), entry["url"], entry.get("uploader", None),
+                 entry.get("upload_date", None), entry.get("overview", None), entry.get("archive_id", None))
+                for entry in entries
+            ],
+        )
+    
+    def append_entries(self, key, entries, complete=False):
+        """
+        プレイリストの中身を追加し、件数と取得完了フラグを更新する
+        
+        :return: 更新後のジョブ(get_job(key)と同じ形式、entriesは含まない)
+        """
+        with self._connect() as conn:
+            self._insert_entries(conn, key, entries)
+            conn.execute(
+                "UPDATE jobs SET numbers = (SELECT COUNT(*) FROM entries WHERE job_key = ?), entries_complete = ?, updated_at = ? WHERE key = ?",
+                (key, int(bool(complete)), time.time(), key),
+            )
+        return self.get_job(key)
+    
+    def get_job(self, key, with_entries=False):
+        """
+        ジョブを取得する(存在しない場合はNone)
+        戻り値は以前の一時JSONファイルと同じ形式の辞書("id"にkeyが入る)
+        """
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM jobs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        data = self._row_to_dict(row, self.JOB_COLUMNS)
+        data["id"] = key
+        if with_entries:
+            data["entries"] = self.get_entries(key)
+        return data
+    
+    def get_entries(self, key, status=None):
+        """プレイリストの中身を順番通りに取得する(statusを指定した場合はその状態のもののみ)"""
+        conn = self._connect()
+        if status is None:
+            rows = conn.execute("SELECT * FROM entries WHERE job_key = ? ORDER BY idx", (key,)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM entries WHERE job_key = ? AND status = ? ORDER BY idx", (key, status)
+            ).fetchall()
+        entries = []
+        for row in rows:
+            entry = self._row_to_dict(row, self.ENTRY_COLUMNS)
+            entry["index"] = row["idx"]
+            entries.append(entry)
+        return entries
+    
+    def update_job(self, key, **fields):
+        """ジョブの項目(title, uploader, content_type, status, optionsなど)を更新する"""
+        unknown = set(fields) - set(self.JOB_COLUMNS)
+        if unknown:
+            self.logger.error(
+                f"ジョブに存在しない項目です: {unknown}",
+                exc_info=True
+            )
+            raise KeyError("ジョブに存在しない項目です。")
+        for column in self.JSON_COLUMNS:
+            if fields.get(column, None) is not None:
+                fields[column] = json.dumps(fields[column], ensure_ascii=False)
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE key = ?",
+                (*fields.values(), time.time(), key),
+            )
+    
+    def set_status(self, key, status):
+        """ジョブの状態を更新する"""
+        self.update_job(key, status=status)
+    
+    def update_progress(self, key, downloaded_bytes, total_bytes):
+        """ダウンロード済みのバイト数と合計バイト数を記録する"""
+        self.update_job(key, downloaded_bytes=downloaded_bytes, total_bytes=total_bytes)
+    
+    def get_unfinished_jobs(self):
+        """ダウンロード待ちまたはダウンロード中のまま終了したジョブを、登録順に取得する"""
+        conn = self._connect()
+        placeholders = ", ".join("?" * len(self.UNFINISHED_STATUSES))
+        rows = conn.execute(
+            f"SELECT key FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at",
+            self.UNFINISHED_STATUSES,
+        ).fetchall()
+        return [self.get_job(row["key"]) for row in rows]
+    
+    def prune_finished(self):
+        """再開する必要のないジョブ(ダウンロード完了、失敗、カード表示のみなど)を削除する"""
+        placeholders = ", ".join("?" * len(self.UNFINISHED_STATUSES))
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"DELETE FROM jobs WHERE status NOT IN ({placeholders})",
+                self.UNFINISHED_STATUSES,
+            )
+        self.logger.info(f"再開の必要がないジョブを{cursor.rowcount}件削除しました。")
+    
+    def set_entry_status(self, key, index, status):
+        """プレイリストの中身1件の状態を更新する"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE entries SET status = ? WHERE job_key = ? AND idx = ?",
+                (status, key, index),
+            )
+    
+    def delete_job(self, key):
+        """ジョブとプレイリストの中身を削除する"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE key = ?", (key,))
+
+class Download:
+    def __init__(self, settings, job_store):
+        self.settings = settings
+        self.job_store = job_store
+        self.logger = logging.getLogger()
+        self.logger.debug("Downloadの__init__開始")
+        self.ffmpeg_dir = get_ffmpeg_dir()
+        self.logger.debug(f"{self.ffmpeg_dir}がffmpeg_dirです。")
+        self.save_dir = os.path.join(settings.download_dir, "YDownloader")
+        os.makedirs(self.save_dir, exist_ok=True)
+        self.retries = settings.retry_chance
+        # 再試行の間隔(ジッター付きの指数バックオフ)とネットワーク接続の監視は、プレビューでも共有する
+        self.retry_policy = RetryPolicy(retries=self.retries)
+        self.connectivity = ConnectivityMonitor()
+        # ダウンロード済みの動画の記録(ユーザーデータディレクトリに保存し、再起動後も同じ動画を再度ダウンロードしない)
+        self.archive = DownloadArchive(os.path.join(get_data_path(), "download_archive.txt"))
+        # 全てのダウンロードで共有する帯域の上限(設定画面から変更するとダウンロード中のものにも反映される)
+        self.bandwidth = BandwidthManager(
+            total_kbps=settings.max_total_bandwidth_kbps,
+            job_kbps=settings.max_job_bandwidth_kbps,
+        )
+        # yt-dlpのコマンド(Abema向け)の実行(同時実行数の制限と中断)
+        self.process_runner = ProcessRunner(max_processes=settings.max_external_processes)
+        # 前回の起動で中断され、今回の起動で再開するジョブのkey(記録しておいたオプションでダウンロードする)
+        self.resumed_keys = set()
+        self.show_progress = settings.show_progress
+        self.content_type = settings.content_type
+        os.makedirs(self.save_dir, exist_ok=True)
+        self.temp_dir = settings.temp_dir
+        # カードの表示内容(key: CardModel)(YDownloaderと共有する)
+        self.cards = {}
+        # プレイリストの中身の取得完了を通知するイベント(key: threading.Event)
+        self.entry_streams = {}
+        # 初期化済みのYoutubeDLインスタンスをジョブ間で使い回す(プレビューでも共有する)
+        self.ydl_pool = YoutubeDLPool()
+        # URLごとのextractorの選択結果をホストとURLの形ごとに記録し、まとめて取り込む際の確認を省く
+        self.extractor_router = ExtractorRouter()
+    
+    # 設定から読み込み、yt-dlpにそのまま渡すダウンロードのオプション
+    TUNED_OPTION_KEYS = ("concurrent_fragment_downloads", "http_chunk_size", "buffersize")
+    
+    def _get_tuned_options(self, url):
+        """
+        フラグメントの並列数、チャンクサイズ、バッファサイズのyt-dlpのオプションを作成する
+        settings.site_download_overridesにURLのホスト(またはその親ドメイン)があれば、その値で上書きする
+        値が0またはNoneの項目はyt-dlpのデフォルトのままにする
+        """
+        options = {key: getattr(self.settings, key) for key in self.TUNED_OPTION_KEYS}
+        host = DownloadScheduler._get_host(url)
+        for site, overrides in (self.settings.site_download_overrides or {}).items():
+            site = site.lower()
+            if host == site or host.endswith(f".{site}"):
+                options.update({key: value for key, value in overrides.items() if key in self.TUNED_OPTION_KEYS})
+                self.logger.debug(f"{site}向けのダウンロード設定を使用します: {overrides}")
+        return {key: int(value) for key, value in options.items() if value}
+    
+    # ダウンロード済みのバイト数をジョブストアに記録する最短間隔(秒)
+    JOURNAL_INTERVAL = 2.0
+    
+    def _apply_journal(self, ydl_opts, key=None, is_entries=False):
+        """
+        ダウンロードのオプションと保存先をジョブストアに記録する(次回の起動時の再開用)
+        再開するジョブの場合は、前回記録したオプションと保存先を使用する
+        保存先と形式が同じであれば、yt-dlpは残っている.partファイルの続きからダウンロードする
+        
+        :param ydl_opts: フックを追加する前のyt-dlpのオプション
+        :param key: ジョブのkey(Noneの場合は何もしない)
+        :param is_entries: プレイリストの中身の場合はTrue(保存先は中身ごとに異なるため記録しない)
+        """
+        if not key:
+            return ydl_opts
+        job = self.job_store.get_job(key)
+        recorded_options = job.get("options", None) if job else None
+        if key in self.resumed_keys and recorded_options:
+            ydl_opts.update(recorded_options)
+            if not is_entries and job.get("outtmpl", None):
+                ydl_opts["outtmpl"] = job["outtmpl"]
+            self.logger.info(f"key: {key} は前回の続きから再開します。保存先: {ydl_opts['outtmpl']}")
+            return ydl_opts
+        journal = {"options": {k: v for k, v in ydl_opts.items() if k != "outtmpl"}}
+        if not is_entries:
+            journal["outtmpl"] = ydl_opts["outtmpl"]
+        self.job_store.update_job(key, **journal)
+        return ydl_opts
+    
+    def _create_journal_hook(self, key):
+        """ダウンロード済みのバイト数をジョブストアに記録するprogress_hookを作成する(JOURNAL_INTERVAL秒に1回まで)"""
+        last_write = [0.0]
+        
+        def journal_hook(d):
+            now = time.monotonic()
+            if d.get("status", None) == "downloading" and now - last_write[0] < self.JOURNAL_INTERVAL:
+                return
+            last_write[0] = now
+            total = d.get("total_bytes", None) or d.get("total_bytes_estimate", None)
+            self.job_store.update_progress(key, d.get("downloaded_bytes", None), int(total) if total else None)
+        
+        return journal_hook
+    
+    def _check_network(self):
+        """
+        端末のネットワーク接続が正常かどうかを返す
+        ConnectivityMonitorがバックグラウンドで確認した結果を参照するため、待たされない。
+        通信の失敗時に呼び出されるので、次の確認を前倒しして状態を早く最新にする。
+        """
+        self.connectivity.request_probe()
+        return self.connectivity.is_online()
+    
+    def _check_content_type(self, key=None, page=None, force=False):
+        """
+        ダウンロードしたいコンテンツタイプに応じて、ダウンロード関数を適宜実施する関数
+        ダウンロード済み(self.archiveに記録済み)の動画はスキップし、"Archived"を返す(プレイリストは全ての中身がダウンロード済みの場合)
+        pageがNoneの場合(ヘッドレスモード)は、カードやダイアログの表示を行わない
+        
+        :param key: ジョブストアのジョブ(Card要素検索)のためのkey
+        :param page: Fletのpage(ヘッドレスモードではNone)
+        :param force: Trueの場合、ダウンロード済みの動画もダウンロードする
+        :return: 成功した場合はTrue、失敗した場合はFalseまたは"NetWorkError"、スキップした場合は"Archived"
+        """
+        if not key:
+            self.logger.error(
+                "keyの値が不正です。",
+                exc_info=True
+            )
+            # sys.exit(1) # プログラムの終了
+            raise ValueError("keyの値が不正です。")
+        entry_stream = self.entry_streams.get(key, None)
+        if entry_stream and not entry_stream.is_set():
+            # プレイリストの中身の取得が完了するまで待機する
+            self.logger.info(f"key: {key} のプレイリストの中身の取得完了を待機します。")
+            entry_stream.wait()
+        data = self.job_store.get_job(key, with_entries=True)
+        url = data.get("url", None) if data else None
+        if not url:
+            self.logger.error(
+                "ジョブにおけるurlの値が不正です。",
+                exc_info=True
+            )
+            # sys.exit(1) # プログラムの終了
+            raise ValueError("ジョブにおけるurlの値が不正です。")
+        title = data.get("title", "Unknown Title")
+        # uploader = data.get("uploader", "Unknown") # 後で作曲者とかの部分に使用したい
+        content_type = data.get("content_type", None)
+        is_entries = data.get("is_entries", False)
+        archive_id = data.get("archive_id", None)
+        if not is_entries and not force and archive_id in self.archive:
+            self.logger.info(f"{url}はダウンロード済みのため、スキップします。archive_id: {archive_id}")
+            self._fire_after_download(key=key, page=page)
+            return "Archived"
+        if not is_entries:
+            result = False
+            if content_type == "movie":
+                abema_url = "https://abema.tv"
+                if url.startswith(abema_url):
+                    result = self._download_with_command(url, os.path.join(self.save_dir, "%(title)s.%(ext)s"), key=key, page=page)
+                    self._fire_after_download(key=key, page=page)
+                else:
+                    self.logger.info(f"self.download_movieを{url},{title}に対して実行します")
+                    result = self.download_movie(url=url, filename=title, key=key, page=page)
+            elif content_type == "music":
+                self.logger.info(f"self.download_musicを{url},{title}に対して実行します")
+                result = self.download_music(url=url, filename=title, key=key, page=page)
+            else:
+                self.logger.error(
+                    "content_typeの値が不正です。",
+                    exc_info=True
+                )
+                open_dlg(content_type_err_dlg, page)
+            if result is True:
+                self.archive.add(archive_id)
+            return result
+        else:
+            # print("これは正常にメタデータが記録されたプレイリスト") # デバッグ用
+            try:
+                entries = data.get("entries", None)
+                save_dir = os.path.join(self.save_dir, title)
+                os.makedirs(save_dir, exist_ok=True)
+                if not entries:
+                    self.logger.error(
+                        f"entriesの値が不正です: {entries}",
+                        exc_info=True
+                    )
+                    # sys.exit(1) # プログラムの終了
+                    raise ValueError("entriesの値が不正です。")
+                results = {}
+                result = False
+                if content_type == "movie":
+                    abema_url = "https://abema.tv"
+                    if url.startswith(abema_url):
+                        result = self._download_with_command(url, os.path.join(save_dir, "%(title)s.%(ext)s"), key=key, page=page)
+                    else:
+                        results = self._download_entries(key, entries, save_dir, self.download_movie, page, force=force)
+                    self.logger.info(f"Download process complete. Executing post-download code. url: {url}")
+                    self._fire_after_download(key=key, page=page)
+                    self.logger.info(f"Movie download completed in format: {settings.movie_format}")
+                elif content_type == "music":
+                    results = self._download_entries(key, entries, save_dir, self.download_music, page, force=force)
+                    self.logger.info(f"Download process complete. Executing post-download code. url: {url}")
+                    self._fire_after_download(key=key, page=page)
+                    self.logger.info(f"Music download completed in format: {settings.music_format}")
+                else:
+                    self.logger.error(
+                        "content_typeの値が不正です。",
+                        exc_info=True
+                    )
+                    open_dlg(content_type_err_dlg, page)
+                if results:
+                    if all(status == "archived" for status in results.values()):
+                        return "Archived"
+                    if "network_error" in results.values():
+                        return "NetWorkError"
+                    result = all(status in ("completed", "archived") for status in results.values())
+                return result
+            except Exception as ex:
+                self.logger.error(
+                    ex,
+                    exc_info=True
+                )
+                # sys.exit(1) # プログラムの終了
+                raise ex
+    
+    def _download_with_command(self, url, outtmpl, key=None, page=None):
+        """
+        yt-dlpのコマンドでダウンロードする(Abema向け)
+        self.process_runnerで実行し、進捗はカードのプログレスバーに反映する
+        ダウンロード1件ごとの帯域の上限が設定されている場合は、--limit-rateで制限する
+        
+        :return: 成功した場合はTrue
+        """
+        self.logger.info("yt-dlpコマンドを実行します。")
+        command = [
+            "yt-dlp",
+            "--newline", # 進捗を1行ずつ出力させる
+            "--output", outtmpl,
+            "--ffmpeg-location", self.ffmpeg_dir,
+        ]
+        if self.bandwidth.job_rate:
+            command.extend(["--limit-rate", str(self.bandwidth.job_rate)])
+        command.append(url)
+        progress = self._create_progress(key=key, page=page)
+        returncode = self.process_runner.run(
+            command,
+            key=key,
+            on_progress=progress.command_progress if progress else None,
+        )
+        if returncode != 0:
+            self.logger.error(f"yt-dlpコマンドが失敗しました。url: {url}, 終了コード: {returncode}")
+            return False
+        return True
+    
+    def _download_entries(self, key, entries, save_dir, download_func, page, force=False):
+        """
+        プレイリストの中身をワーカープールで並列にダウンロードする(同時実行数はsettings.playlist_concurrency)
+        1件が失敗しても残りのダウンロードは続け、中身ごとの状態(downloading, completed, failed, network_error, skipped, archived)をジョブストアに記録する
+        ダウンロード済み(self.archiveに記録済み)の中身は、forceがTrueでなければスキップする
+        全て終わったら、プレイリストの順番に並べた結果をダイアログで表示する(全てスキップした場合は表示しない)
+        
+        :param download_func: self.download_movieまたはself.download_music
+        :param force: Trueの場合、ダウンロード済みの中身もダウンロードする
+        :return: 中身のindexをkeyとした状態のdict
+        """
+        total = len(entries)
+        workers = max(1, min(int(self.settings.playlist_concurrency), total))
+        progress = self._create_progress(key=key, page=page)
+        results = {}
+        results_lock = threading.Lock()
+        
+        def download_entry(entry):
+            index = entry["index"]
+            entry_title = entry.get("title", None)
+            entry_url = entry.get("url", None)
+            if not entry_title or not entry_url:
+                self.logger.warning(
+                    f"{index + 1}番目のentryのtitleまたはurlの値が不正です。",
+                    exc_info=True
+                )
+                status = "skipped"
+            elif not force and entry.get("archive_id", None) in self.archive:
+                self.logger.info(f"{index + 1}番目のコンテンツはダウンロード済みのため、スキップします")
+                status = "archived"
+            else:
+                self.logger.info(f"{index + 1}番目のコンテンツをダウンロードします")
+                self.job_store.set_entry_status(key, index, "downloading")
+                try:
+                    result = download_func(
+                        url=entry_url,
+                        filename=entry_title,
+                        content_save_dir=save_dir,
+                        key=key,
+                        page=page,
+                        is_entries=True,
+                    )
+                except Exception as ex:
+                    self.logger.error(
+                        f"{index + 1}番目のコンテンツのダウンロード中にエラーが発生しました: {ex}",
+                        exc_info=True
+                    )
+                    result = False
+                if result == "NetWorkError":
+                    status = "network_error"
+                elif result:
+                    status = "completed"
+                    self.archive.add(entry.get("archive_id", None))
+                else:
+                    status = "failed"
+            self.job_store.set_entry_status(key, index, status)
+            with results_lock:
+                results[index] = status
+                finished = len(results)
+                failed = sum(1 for value in results.values() if value not in ("completed", "archived"))
+            if progress:
+                progress.entries_progress(finished, failed, total)
+            return status
+        
+        self.logger.info(f"key: {key} のプレイリストの中身{total}件を{workers}並列でダウンロードします")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"entries-{key[:8]}") as executor:
+            # 例外はdownload_entry内で処理するため、ここでは完了を待つだけ
+            list(executor.map(download_entry, entries))
+        if page and not all(status == "archived" for status in results.values()):
+            self._open_entries_summary_dlg(entries, results, page)
+        return results
+    
+    def _open_entries_summary_dlg(self, entries, results, page):
+        """プレイリストの中身のダウンロード結果(完了件数と、失敗したもののタイトル)をダイアログで表示する"""
+        completed = sum(1 for status in results.values() if status == "completed")
+        archived = sum(1 for status in results.values() if status == "archived")
+        failed_titles = [
+            entry.get("title", None) or f"{entry['index'] + 1}番目"
+            for entry in sorted(entries, key=lambda entry: entry["index"])
+            if results.get(entry["index"], None) not in ("completed", "archived")
+        ]
+        lines = [f"完了: {completed}件 / 全{len(entries)}件"]
+        if archived:
+            lines.append(f"ダウンロード済みのためスキップ: {archived}件")
+        if failed_titles:
+            lines.append(f"失敗: {len(failed_titles)}件")
+            lines.extend(f"・{title}" for title in failed_titles[:20])
+            if len(failed_titles) > 20:
+                lines.append(f"ほか{len(failed_titles) - 20}件")
+        if "network_error" in results.values():
+            lines.append("ネットワーク接続を確認してください。")
+        self.logger.info("\n".join(lines))
+        summary_dlg = ft.AlertDialog(
+            title=ft.Text("プレイリストのダウンロード結果"),
+            modal=True,
+            content=ft.Text("\n".join(lines)),
+            actions=[
+                ft.TextButton(
+                    "閉じる",
+                    on_click=lambda e: close_dlg(e, summary_dlg, page),
+                    tooltip="ダイアログを閉じます"
+                )
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        open_dlg(summary_dlg, page)
+    
+    def _fire_after_download(self, key=None, page=None):
+        """
+        ダウンロード完了後の処理
+        完了したkeyのCardのdisabledにしたボタンやテキストフィールドのdisabledを解除する
+        """
+        print("Post-download processing is now executed.")
+        try:
+            model = self.cards.get(key, None) if key and page else None
+            if model is None:
+                # ヘッドレスモードなど、対象のCardがない場合は何もしない
+                return
+            model.update(
+                downloading=False, # ボタンと入力欄を有効化
+                progress_visible=False, # プログレスバーが見えなくする
+                progress_value=None, # 次回のダウンロードに備えて不確定表示に戻す
+                progress_text=None, # 進捗テキストを見えなくする
+            )
+        except Exception as ex:
+            self.logger.error(
+                ex,
+                exc_info=True
+            )
+            # sys.exit(1)
+            raise ex
+    
+    def _create_progress(self, key=None, page=None):
+        """
+        show_progressが有効な場合に、keyのCardの進捗表示を更新するCardProgressを作成する
+        無効な場合やCardが見つからない場合はNoneを返す(プログレスバーは不確定表示のまま)
+        """
+        if not self.show_progress or not key or not page or key not in self.cards:
+            return None
+        return CardProgress(self.cards[key])
+    
+    # コメント取得用関数を考えておく
+    
+    def download_movie_for_abema(self, urls=False, outtmpl=None, content_save_dir=False, ffmpeg_location=None):
+        """
+        Abemaでの動画ダウンロードにチャレンジする用の関数
+        
+        :param urls: ダウンロード対象のコンテンツURL(Falseの場合はエラー)(リストで渡されるから避けてsubprocessに渡す)
+        :param outtmpl: 保存する際のファイル名(拡張子は自動付与)
+        :param content_save_dir: 保存する際のディレクトリ(プレイリストだとプレイリスト名のフォルダーを作ってその中に保存する)(デフォルトはself.save_dir)
+        """
+        if not urls or not ffmpeg_location:
+            self.logger.error(
+                "Error: url or ffmpeg_location is not defined",
                 exc_info=True
             )
             # sys.exit(1)
@@ -701,7 +3238,7 @@ class Download:
             "ffmpeg_location": self.ffmpeg_dir,
         }
         try:
-            with YoutubeDL(ydl_opts) as ydl:
+            with self.ydl_pool.acquire(ydl_opts) as ydl:
                 ydl.download(urls)
             self.logger.info("Success for downloading for abema")
             return True
@@ -712,7 +3249,7 @@ class Download:
             )
             return False
     
-    def download_movie(self, url=False, filename=None, content_save_dir=False, key=None, page=None, is_entries=False):
+    def download_movie(self, url=False, filename=None, content_save_dir=False, key=None, page=None, is_entries=False, progress=None):
         """
         指定されたURLの動画をダウンロードする。
         settings.content_typeが "movie" の場合、実行される。
@@ -725,21 +3262,15 @@ class Download:
         :param key: Card要素検索のためのkey
         :param page: Fletのpage
         :param is_entries: プレイリスト向け処理用のオプション(デフォルトはFalse)
+        :param progress: 進捗を表示するCardProgress(Noneの場合はkeyのCardから作成する)
         """
-        if not url or not page:
-            self.logger.error(
-                "Error: url or page is not defined",
-                exc_info=True
-            )
-            # sys.exit(1)
-            raise ValueError("urlまたはpageが定義されていません。")
-        if not key and not is_entries:
+        if not url:
             self.logger.error(
-                "Error: key is not defined for not entries case",
+                "Error: url is not defined",
                 exc_info=True
             )
             # sys.exit(1)
-            raise ValueError("プレイリスト向けのkeyが定義されていません。")
+            raise ValueError("urlが定義されていません。")
         if not content_save_dir:
             content_save_dir = self.save_dir
         
@@ -772,52 +3303,22 @@ class Download:
             "postprocessor_args": ["-c:a", "aac"],  # FFmpeg に音声を AAC に変換させる
             "updatetime": False,  # これを追加
             "verbose": True,
+            "continuedl": True, # .partファイルが残っている場合は続きからダウンロードする
         }
-        
-        attempt = 0
-        while attempt < self.retries:
-            try:
-                with YoutubeDL(ydl_opts) as ydl:
-                    ydl.download(urls) # リストとして渡す
-                # ここで、全てのダウンロード処理(およびマージ)が完了しているので、終了処理を一度だけ呼ぶ
-                # プレイリストでない時は別の個所で終了処理を行う(ダウンロード関数は繰り返されるため)
-                if not is_entries:
-                    self.logger.info("Download process complete. Executing post-download code.")
-                    self._fire_after_download(key=key, page=page)
-                    self.logger.info(f"Movie download completed in format: {movie_format}")
-                return True
-            except Exception as ex:
-                if not self._check_network():
-                    if not is_entries:
-                        self.logger.error(
-                            "A network error occurred. Please check your connection and try again.",
-                            exc_info=True
-                        )
-                        open_dlg(network_err_dlg, page)
-                        self._fire_after_download(key=key, page=page)
-                    return "NetWorkError"
-                attempt += 1
-                self.logger.info(f"Attempt {attempt} failed: {ex}")
-                if attempt >= self.retries:
-                    if not is_entries:
-                        self.logger.error(
-                            "Max retry limit reached. Aborting movie download. Try download_movie_for_abema.",
-                            exc_info=True
-                        )
-                        result = self.download_movie_for_abema(urls=urls, outtmpl=outtmpl, content_save_dir=content_save_dir, ffmpeg_location=self.ffmpeg_dir)
-                        if not result:
-                            open_dlg(retry_error_dlg, page)
-                        self._fire_after_download(key=key, page=page)
-                        return False
-                    else:
-                        self.logger.info("Try download_movie_for_abema")
-                        result = self.download_movie_for_abema(urls=urls, outtmpl=outtmpl, content_save_dir=content_save_dir, ffmpeg_location=self.ffmpeg_dir)
-                        if not result:
-                            return False
-                        else:
-                            return True
+        return self._download_with_pool(
+            urls,
+            ydl_opts,
+            key=key,
+            page=page,
+            is_entries=is_entries,
+            progress=progress,
+            label="Movie",
+            output_format=movie_format,
+            # リトライの上限に達した場合は、Abema向けの処理で再度ダウンロードを試みる
+            fallback=lambda: self.download_movie_for_abema(urls=urls, outtmpl=outtmpl, content_save_dir=content_save_dir, ffmpeg_location=self.ffmpeg_dir),
+        )
     
-    def download_music(self, url=False, filename=None, content_save_dir=False, key=None, page=None, is_entries=False):
+    def download_music(self, url=False, filename=None, content_save_dir=False, key=None, page=None, is_entries=False, progress=None):
         """
         指定されたURLの音楽をダウンロードする。
         settings.content_typeが "music" の場合、実行される。
@@ -830,21 +3331,15 @@ class Download:
         :param key: Card要素検索のためのkey
         :param page: Fletのpage
         :param is_entries: プレイリスト向け処理用のオプション(デフォルトはFalse)
+        :param progress: 進捗を表示するCardProgress(Noneの場合はkeyのCardから作成する)
         """
-        if not url or not page:
-            self.logger.error(
-                "Error: url or page is not defined",
-                exc_info=True
-            )
-            # sys.exit(1)
-            raise ValueError("urlまたはpageが定義されていません。")
-        if not key and not is_entries:
+        if not url:
             self.logger.error(
-                "Error: key is not defined for not entries case",
+                "Error: url is not defined",
                 exc_info=True
             )
             # sys.exit(1)
-            raise ValueError("プレイリスト向けのkeyが適切に定義されていません。")
+            raise ValueError("urlが定義されていません。")
         if not content_save_dir:
             content_save_dir = self.save_dir
         
@@ -874,19 +3369,58 @@ class Download:
             }],
             "updatetime": False,  # これを追加
             "verbose": True,
+            "continuedl": True, # .partファイルが残っている場合は続きからダウンロードする
         }
+        return self._download_with_pool(
+            urls,
+            ydl_opts,
+            key=key,
+            page=page,
+            is_entries=is_entries,
+            progress=progress,
+            label="Music",
+            output_format=music_format,
+        )
+    
+    def _download_with_pool(self, urls, ydl_opts, key=None, page=None, is_entries=False, progress=None, label="Movie", output_format=None, fallback=None):
+        """
+        download_movieとdownload_musicで共通のダウンロード処理
+        形式ごとのオプションに、設定に従ったオプションとフック(進捗表示、ジョブストアへの記録、帯域の上限)を追加し、
+        プールから借りたインスタンスでダウンロードする(失敗した場合はself.retry_policyに従って再試行する)
+        
+        :param urls: ダウンロード対象のURLのリスト
+        :param ydl_opts: 形式ごとのyt-dlpのオプション(format、outtmpl、postprocessorsなど)
+        :param label: ログに表示する種類("Movie"または"Music")
+        :param output_format: ログに表示するファイル形式
+        :param fallback: リトライの上限に達した場合に実行する代わりのダウンロード処理(成功した場合はTrueを返す関数)
+        :return: 成功した場合はTrue、失敗した場合はFalseまたは"NetWorkError"
+        """
+        # フラグメントの並列数などは設定(サイトごとの上書きを含む)に従う
+        ydl_opts.update(self._get_tuned_options(urls[0]))
+        # 再起動後に再開できるように、オプションと保存先を記録する(再開するジョブの場合は記録済みのものを使用する)
+        ydl_opts = self._apply_journal(ydl_opts, key=key, is_entries=is_entries)
+        # 進捗表示が有効な場合は、yt-dlpのフックからCardのプログレスバーを更新する
+        if progress is None and not is_entries:
+            progress = self._create_progress(key=key, page=page)
+        if progress:
+            ydl_opts["progress_hooks"] = [progress.progress_hook]
+            ydl_opts["postprocessor_hooks"] = [progress.postprocessor_hook]
+        if key and not is_entries:
+            ydl_opts["progress_hooks"] = ydl_opts.get("progress_hooks", []) + [self._create_journal_hook(key)]
+        # 帯域の上限(全体とダウンロード1件ごと)
+        ydl_opts["progress_hooks"] = ydl_opts.get("progress_hooks", []) + [self.bandwidth.create_hook()]
         
         attempt = 0
         while attempt < self.retries:
             try:
-                with YoutubeDL(ydl_opts) as ydl:
-                    ydl.download(urls)
+                with self.ydl_pool.acquire(ydl_opts) as ydl:
+                    ydl.download(urls) # リストとして渡す
                 # ここで、全てのダウンロード処理(およびマージ)が完了しているので、終了処理を一度だけ呼ぶ
                 # プレイリストでない時は別の個所で終了処理を行う(ダウンロード関数は繰り返されるため)
                 if not is_entries:
                     self.logger.info("Download process complete. Executing post-download code.")
                     self._fire_after_download(key=key, page=page)
-                    self.logger.info(f"Music download completed in format: {music_format}")
+                    self.logger.info(f"{label} download completed in format: {output_format}")
                 return True
             except Exception as ex:
                 if not self._check_network():
@@ -900,42 +3434,372 @@ class Download:
                     return "NetWorkError"
                 attempt += 1
                 self.logger.info(f"Attempt {attempt} failed: {ex}")
-                if attempt >= self.retries:
+                if not self.retry_policy.wait(attempt):
                     if not is_entries:
                         self.logger.error(
-                            "Max retry limit reached. Aborting music download. Try yt-dlp command.",
+                            f"Max retry limit reached. Aborting {label.lower()} download.",
                             exc_info=True
                         )
-                        open_dlg(retry_error_dlg, page)
+                        if fallback is None or not fallback():
+                            open_dlg(retry_error_dlg, page)
                         self._fire_after_download(key=key, page=page)
+                        return False
+                    if fallback is not None:
+                        self.logger.info("Try fallback download")
+                        return bool(fallback())
                     return False
 
+class LogTailReader:
+    """
+    ログファイルを末尾から読み込むクラス
+    ファイル全体は読み込まず、read_tail()とread_older()でseek()を使って末尾からPAGE_SIZEバイトずつ遡って読み込む。
+    read_new()は前回読み込んだ位置から追記された分のみを読み込む(ローテーションされた場合は新しいファイルの先頭から)。
+    複数行にわたるレコード(例外のトレースバックなど)は、時刻で始まる行から次の時刻で始まる行の手前までを1件とする。
+    レコードは(ログレベル, 内容)のタプルで返す(ログレベルが分からない行はNone)。
+    
+    :param path: ログファイルのパス
+    """
+    
+    # 1回に遡って読み込むサイズ(バイト)
+    PAGE_SIZE = 64 * 1024
+    # setup_loggingのフォーマット("%(asctime)s - %(levelname)s - %(message)s")のレコードの先頭
+    RECORD_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - ([A-Z]+) - ")
+    RECORD_BYTES_PATTERN = re.compile(rb"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - [A-Z]+ - ", re.MULTILINE)
+    
+    def __init__(self, path):
+        self.path = path
+        # 読み込み済みの範囲(バイト位置)
+        self._start = None
+        self._end = 0
+        self._inode = None
+    
+    @property
+    def at_start(self):
+        """ファイルの先頭まで読み込んだかどうか"""
+        return self._start == 0
+    
+    @classmethod
+    def parse_records(cls, data):
+        """読み込んだバイト列をレコードのリストに変換する"""
+        records = []
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            match = cls.RECORD_PATTERN.match(line)
+            if match or not records:
+                records.append([match.group(1) if match else None, line])
+            else:
+                records[-1][1] += "\n" + line
+        return [tuple(record) for record in records]
+    
+    def read_tail(self):
+        """末尾の1ページ分のレコードを読み込む(最初に呼び出す)"""
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._inode = stat.st_ino
+            self._start = self._end = stat.st_size
+            return self._read_page(f)
+    
+    def read_older(self):
+        """読み込み済みの範囲の前の1ページ分のレコードを読み込む"""
+        if not self._start:
+            return []
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_ino != self._inode:
+                # ローテーションされた後は、読み込み済みの範囲の前は別のファイルになっている
+                self._start = 0
+                return []
+            return self._read_page(f)
+    
+    def _read_page(self, f):
+        end = self._start
+        start = max(0, end - self.PAGE_SIZE)
+        f.seek(start)
+        data = f.read(end - start)
+        if start > 0:
+            # 途中から読み込んだレコードは次のページで読み込み、レコードの先頭の行から使用する
+            match = next((match for match in self.RECORD_BYTES_PATTERN.finditer(data) if match.start() > 0), None)
+            if match is not None:
+                data = data[match.start():]
+                start += match.start()
+        self._start = start
+        return self.parse_records(data)
+    
+    def read_new(self):
+        """前回読み込んだ位置から追記されたレコードを読み込む(書き込み途中の行は次回に読み込む)"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if stat.st_ino != self._inode or stat.st_size < self._end:
+            # ローテーションされた場合は、新しいファイルの先頭から読み込む
+            self._inode = stat.st_ino
+            self._end = 0
+        if stat.st_size == self._end:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self._end)
+            data = f.read(stat.st_size - self._end)
+        last_newline = data.rfind(b"\n")
+        if last_newline < 0:
+            return []
+        data = data[:last_newline + 1]
+        self._end += len(data)
+        return self.parse_records(data)
+
+class LogViewer:
+    """
+    ログページの表示内容
+    LogTailReaderで読み込んだレコードを1件ずつft.Textにして、ft.ListViewで表示する(ログ全体を1つのft.Textにしない)。
+    - 最初は末尾の1ページ分のみを表示し、「さらに古いログを読み込む」で1ページずつ遡る
+    - 新しいログの表示がオンの間は、FOLLOW_INTERVAL秒ごとに追記された分を読み込み、末尾に追加してスクロールする
+    - ログレベルとキーワード(ジョブのkeyなど)で表示するレコードを絞り込む
+    
+    :param page: Fletのpage
+    :param path: ログファイルのパス
+    """
+    
+    # 追記を確認する間隔(秒)
+    FOLLOW_INTERVAL = 1.0
+    # 保持するレコードの上限(超えた場合は古いものから捨てる)
+    MAX_RECORDS = 5000
+    # ログレベルの選択肢(表示名, 表示する最低のログレベル)
+    LEVEL_OPTIONS = (("すべて", logging.NOTSET), ("INFO以上", logging.INFO), ("WARNING以上", logging.WARNING), ("ERROR以上", logging.ERROR))
+    LEVEL_VALUES = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR, "CRITICAL": logging.CRITICAL}
+    LEVEL_COLORS = {"WARNING": ft.Colors.ORANGE, "ERROR": ft.Colors.RED, "CRITICAL": ft.Colors.RED}
+    
+    def __init__(self, page, path):
+        self.logger = logging.getLogger()
+        self.logger.debug("LogViewerの__init__開始")
+        self.page = page
+        self.reader = LogTailReader(path)
+        self.records = []
+        # 古いレコードを捨てた後は、ファイルの範囲と表示が連続しないため遡らない
+        self.trimmed = False
+        self.min_level = logging.NOTSET
+        self.keyword = ""
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.load_older_button = ft.TextButton(
+            "さらに古いログを読み込む",
+            icon=ft.Icons.EXPAND_LESS_ROUNDED,
+            on_click=lambda e: self.load_older(),
+        )
+        self.level_dropdown = ft.Dropdown(
+            label="ログレベル",
+            options=[ft.dropdown.Option(label) for label, _ in self.LEVEL_OPTIONS],
+            value=self.LEVEL_OPTIONS[0][0],
+            on_change=self._on_level_change,
+            width=180,
+        )
+        self.keyword_field = ft.TextField(
+            label="キーワード(ジョブのkeyなど)",
+            on_submit=self._on_keyword_change,
+            on_blur=self._on_keyword_change,
+            expand=True,
+        )
+        self.follow_switch = ft.Switch(
+            label="新しいログを表示",
+            value=True,
+            on_change=self._on_follow_change,
+        )
+        self.list_view = ft.ListView(expand=True, spacing=2, auto_scroll=True)
+        self.control = ft.Column(
+            controls=[
+                ft.Row(controls=[self.level_dropdown, self.keyword_field, self.follow_switch]),
+                self.list_view,
+            ],
+            expand=True,
+        )
+        try:
+            self.records = self.reader.read_tail()
+        except OSError as ex:
+            self.logger.error(
+                f"ログファイルの読み取りに失敗しました: {ex}",
+                exc_info=True
+            )
+            self.records = [(None, f"ログファイルの読み取りに失敗しました: {ex}")]
+        self._render()
+    
+    def start(self):
+        """追記の確認を開始する"""
+        self._thread = threading.Thread(target=self._follow, name="log-follower", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """追記の確認を終了する(ページを閉じる時に呼び出す)"""
+        self._stop.set()
+    
+    def _matches(self, record):
+        level, text = record
+        if self.min_level > logging.NOTSET:
+            if self.LEVEL_VALUES.get(level, logging.NOTSET) < self.min_level:
+                return False
+        return not self.keyword or self.keyword in text.lower()
+    
+    def _create_text(self, record):
+        level, text = record
+        return ft.Text(value=text, selectable=True, color=self.LEVEL_COLORS.get(level, None))
+    
+    def _render(self):
+        """絞り込みの条件に一致するレコードで表示を作り直す"""
+        with self._lock:
+            controls = [self._create_text(record) for record in self.records if self._matches(record)]
+            if not self.reader.at_start and not self.trimmed:
+                controls.insert(0, self.load_older_button)
+            self.list_view.controls = controls
+    
+    def load_older(self):
+        """1ページ分古いレコードを読み込んで先頭に追加する"""
+        try:
+            records = self.reader.read_older()
+        except OSError as ex:
+            self.logger.error(
+                f"ログファイルの読み取りに失敗しました: {ex}",
+                exc_info=True
+            )
+            return
+        with self._lock:
+            self.records[:0] = records
+        # 古いログを読んでいる間は、末尾へのスクロールで読んでいる位置が変わらないようにする
+        self.follow_switch.value = False
+        self.list_view.auto_scroll = False
+        self._render()
+        mark_dirty(self.page)
+    
+    def _append(self, records):
+        """追記されたレコードを末尾に追加する(絞り込みの条件に一致するもののみ表示に追加する)"""
+        with self._lock:
+            merged = bool(records) and records[0][0] is None and bool(self.records)
+            if merged:
+                # 前回の読み込みの最後のレコードの続き
+                level, text = self.records[-1]
+                self.records[-1] = (level, f"{text}\n{records[0][1]}")
+                records = records[1:]
+            self.records.extend(records)
+            overflow = len(self.records) - self.MAX_RECORDS
+            if overflow > 0:
+                del self.records[:overflow]
+                self.trimmed = True
+            if not merged and overflow <= 0:
+                self.list_view.controls.extend(self._create_text(record) for record in records if self._matches(record))
+                return
+        # 表示済みのレコードが変わった場合は作り直す
+        self._render()
+    
+    def _follow(self):
+        while not self._stop.wait(self.FOLLOW_INTERVAL):
+            if not self.follow_switch.value:
+                continue
+            try:
+                records = self.reader.read_new()
+            except OSError as ex:
+                self.logger.error(
+                    f"ログファイルの読み取りに失敗しました: {ex}",
+                    exc_info=True
+                )
+                continue
+            if records:
+                self._append(records)
+                mark_dirty(self.page)
+    
+    def _on_level_change(self, e):
+        self.min_level = dict(self.LEVEL_OPTIONS).get(self.level_dropdown.value, logging.NOTSET)
+        self._render()
+        mark_dirty(self.page)
+    
+    def _on_keyword_change(self, e):
+        keyword = (self.keyword_field.value or "").strip().lower()
+        if keyword == self.keyword:
+            return
+        self.keyword = keyword
+        self._render()
+        mark_dirty(self.page)
+    
+    def _on_follow_change(self, e):
+        self.list_view.auto_scroll = self.follow_switch.value
+        mark_dirty(self.page)
+
 class YDownloader:
-    def __init__(self, settings, downloader):
+    def __init__(self, settings, downloader, headless=False):
         # 設定やグローバル変数相当の初期化
+        # headlessがTrueの場合(HeadlessRunner)は、動画情報の取得に必要なものだけを作成する
         self.logger = logging.getLogger()
         self.logger.debug("YDownloaderの__init__開始")
         self.ffmpeg_dir = get_ffmpeg_dir()
         self.logger.debug(f"{self.ffmpeg_dir}がffmpeg_dirです。")
         self.retries = settings.retry_chance
         self.temp_dir = settings.temp_dir
-        self.pre_url_list = []
         self.pre_total_urls = 0
         self.pre_current_urls = 0
-        self.cards = {}
-        self.added_urls = []
+        # 取り込み中のファイル(UrlListFile)
+        self.import_file = None
+        # カードの表示内容(key: CardModel)(Downloadと共有し、表示はself.card_listで行う)
+        self.cards = downloader.cards
+        self.card_list = None
+        # ウィンドウサイズの変更はまとめてから反映する
+        self.resize_debouncer = Debouncer(self.RESIZE_DEBOUNCE, self.apply_window_resize, max_wait=self.RESIZE_MAX_WAIT)
+        # 取り込み待ち(動画情報取得中を含む)と取り込み済みのURLの重複確認用の索引
+        self.url_index = UrlIndex(downloader.extractor_router)
         self.condition_pre = threading.Condition()
+        # 動画情報取得用のキューとワーカー数
+        self.preview_queue = queue.Queue()
+        self.preview_workers = max(1, int(settings.max_preview_workers))
+        # 取り込み順を保つための連番と、順番待ちの取得結果
+        self.next_preview_seq = 0
+        self.next_commit_seq = 0
+        self.preview_results = {}
+        self.commit_lock = threading.Lock()
+        # プレイリストの件数表示の更新とカードの作成を排他する(プレイリストの中身の取得と並行するため)
+        self.info_lock = threading.Lock()
+        self.job_store = downloader.job_store
         self.downloader = downloader
+        if headless:
+            # カードを表示しないため、サムネイル画像の処理とGUI用のスケジューラー(ワーカースレッド)は作成しない
+            self.thumbnail_cache = self.thumbnail_renderer = self.placeholder_cache = self.scheduler = None
+            return
+        # サムネイル画像の取得用(コネクションプール付きのセッションと永続キャッシュ)
+        self.thumbnail_cache = ThumbnailCache(
+            cache_dir=os.path.join(get_data_path(), "thumbnails"),
+            max_bytes=int(settings.thumbnail_cache_size_mb) * 1024 * 1024,
+            session_factory=lambda: create_http_session(pool_maxsize=self.preview_workers),
+        )
+        # サムネイル画像の縮小はプレビュー取得とは別のワーカーで行う
+        self.thumbnail_renderer = ThumbnailRenderer(
+            output_dir=self.temp_dir,
+            max_workers=min(4, os.cpu_count() or 1),
+        )
+        # サムネイル画像がないカード用のプレースホルダー画像(表示枠のサイズごとに共有する)
+        self.placeholder_cache = PlaceholderCache(self.temp_dir)
+        # 「すべてをダウンロード」や各カードのダウンロードはスケジューラー経由で実行する
+        self.scheduler = DownloadScheduler(
+            max_workers=settings.max_concurrent_downloads,
+            per_host_limit=settings.max_downloads_per_host,
+        )
+    
+    def _preview_ydl_options(self):
+        """動画情報の取得(プレビュー)に使用するyt-dlpのオプションを作成する"""
+        return {
+            "skip_download": True, # 動画本体はダウンロードしない
+            "quiet": True, # 進捗状況を表示しない
+            "ffmpeg_location": self.ffmpeg_dir,
+            # プレイリストの中身は個々の動画ページを解決せず、URLとタイトルのみ取得する
+            # 個々の動画の詳細な情報はダウンロード時に取得される
+            "extract_flat": "in_playlist",
+            # "verbose": True,  # 詳細なデバッグ情報を表示
+            "verbose": True,
+        }
     
     def preview_video_info(self, url, page):
         """
-        指定URLの動画情報を取得し、一時ディレクトリにJSONとして保存する。
-        GUIでの表示用に動画のサムネイル画像、タイトル、投稿日時を取得して、一時ファイルとして保存する。
+        指定URLの動画情報を取得し、ジョブストアに保存してそのkeyを返す。
+        GUIでの表示用に動画のサムネイル画像、タイトル、投稿日時を取得して、サムネイル画像は一時ファイルとして保存する。
         アプリが正常終了する時に、一時ファイルはそのフォルダーごと削除する。
         アプリが異常終了したときは、すぐに復帰できるように、一時ファイルは削除しない。
+        プレイリストの場合は中身をフラットに(URLとタイトルのみ)取得し、カードを先に表示できるように
+        中身の取得はstream_playlist_entriesでページ単位に行う。
         
         :param url: 動画のURL
-        :param page: Fletのpage
+        :param page: Fletのpage(ヘッドレスモードではNone)
         """
         if not url:
             self.logger.error(
@@ -945,20 +3809,22 @@ class YDownloader:
             # sys.exit(1)
             raise ValueError("urlの値が定義されていません。")
         
-        ydl_opts = {
-            "skip_download": True, # 動画本体はダウンロードしない
-            "quiet": True, # 進捗状況を表示しない
-            "ffmpeg_location": self.ffmpeg_dir,
-            # "verbose": True,  # 詳細なデバッグ情報を表示
-            "verbose": True,
-        }
+        ydl_opts = self._preview_ydl_options()
         attempt = 0
         while attempt < self.retries:
+            ydl = None
+            failed = False
             try:
                 self.logger.debug(f"{url}に対してpreview_video_infoを実行します。")
-                with YoutubeDL(ydl_opts) as ydl:
-                    # 動画情報を取得
-                    info = ydl.extract_info(url, download=False)
+                # プールから初期化済みのインスタンスを借りる
+                ydl = self.downloader.ydl_pool.checkout(ydl_opts)
+                # extractorはキャッシュから選ぶ(再試行の場合は、キャッシュを使わずにyt-dlpに選ばせる)
+                ie_key = self.downloader.extractor_router.route(url) if attempt == 0 else None
+                # 動画情報を取得(プレイリストの中身はまだ解決しない)
+                info = ydl.extract_info(url, download=False, process=False, ie_key=ie_key)
+                if info and info.get("_type", "video") != "playlist":
+                    # 単体の動画(またはリダイレクト)の場合は、通常通り情報を解決する
+                    info = ydl.process_ie_result(info, download=False)
                 # このままだとプレイリストがまとまる
                 # そして、それをダウンロードしようとすると中身をすべてプレイリストの名前で保存しようとするため、上書き保存されてしまう
                 # プレイリストならばプレイリスト名でフォルダーを作成して、そのなかにプレイリストの中身の動画を底にダウンロードするように変更する
@@ -980,53 +3846,40 @@ class YDownloader:
                 uploader = info.get("uploader", "Unknown Uploader")
                 # 動画の概要欄情報の取得
                 overview = info.get("description", None)
-                # サムネイル画像の保存
+                # サムネイル画像の保存(カードを表示しないヘッドレスモードでは取得しない)
                 thumbnail_path = None
                 try:
                     thumbnail_url = info.get("thumbnail", None)
-                    if thumbnail_url:
-                        thumb_filename = f"{unique_id}_thumb.jpg"
-                        thumbnail_path = os.path.join(self.temp_dir, thumb_filename)
-                        response = requests.get(thumbnail_url)
-                        with open(thumbnail_path, "wb") as f:
-                            f.write(response.content)
+                    if not thumbnail_url and info.get("thumbnails"):
+                        # 未解決のプレイリストはthumbnailsのみを持つため、最後(最も大きいもの)を使用する
+                        thumbnail_url = info["thumbnails"][-1].get("url", None)
+                    if thumbnail_url and page:
+                        # 同じサムネイル画像は複数のカードで同じファイル(と縮小結果)を共有する
+                        thumbnail_key = ThumbnailCache.content_key(thumbnail_url)
+                        thumbnail_path = os.path.join(self.temp_dir, f"{thumbnail_key}.jpg")
+                        # 共有セッションとキャッシュを経由して取得する(再起動後もキャッシュから読み込む)
+                        self.thumbnail_cache.fetch(thumbnail_url, thumbnail_path)
+                        # カードの作成を待たずに、表示枠のサイズへの縮小を始めておく
+                        self.thumbnail_renderer.submit(thumbnail_path, *self.get_frame_size(page), cache_key=thumbnail_key)
                 except Exception as ex:
-                    self.logger.error(
-                        f"Error: {ex}",
+                    # サムネイル画像は必須ではないため、取得できない場合(404やタイムアウトなど)はプレースホルダー画像で表示する
+                    self.logger.warning(
+                        f"サムネイル画像を取得できませんでした。プレースホルダー画像で表示します。url: {url}, Exception: {ex}",
                         exc_info=True
                     )
-                    # sys.exit(1) # プログラムの終了
-                    raise ex
+                    thumbnail_path = None
                 # 投稿日時のフォーマット
                 upload_date = info.get("upload_date", "Unknown Date")
                 if upload_date and upload_date != "Unknown Date":
                     upload_date = datetime.strptime(upload_date, "%Y%m%d").strftime("%Y年%m月%d日")
                 # entriesがあればプレイリストと判定できる
                 entries = info.get("entries", None)
-                if entries:
+                if entries is not None:
                     self.logger.debug("これはプレイリストです")
-                    entries_numbers = len(entries)
-                    extracted_entries = []
-                    for index, entry in enumerate(entries):
-                        entry_safe_title = sanitize_filename(entry.get("title", None))
-                        entry_url = entry.get("webpage_url", None)
-                        entry_uploader = entry.get("uploader", "Unknown Uploader")
-                        entry_upload_date = entry.get("uploader", "Unknown Uploader")
-                        entry_overview = entry.get("description", None)
-                        if not entry_safe_title or not entry_url:
-                            self.logger.info(f"entry {index} は無効なデータの為、スキップされました")
-                            continue # スキップ
-                        extracted_entries.append(
-                            {
-                                # idはいらない
-                                "index": index,
-                                "title": entry_safe_title,
-                                "url": entry_url,
-                                "uploader": entry_uploader,
-                                "upload_date": entry_upload_date,
-                                "overview": entry_overview
-                            }
-                        )
+                    # 中身の件数(判明していない場合はNone)
+                    playlist_count = info.get("playlist_count", None)
+                    if isinstance(entries, list):
+                        playlist_count = len(entries)
                     preview_info = {
                         "id": unique_id,
                         "title": safe_title,
@@ -1038,29 +3891,40 @@ class YDownloader:
                         "is_playlist": False,
                         "content_type": settings.content_type,
                         "is_entries": True,
-                        "numbers": entries_numbers,
-                        "entries": extracted_entries,
-                    }
-                else:
-                    # 保存する情報を整理
-                    preview_info = {
-                        "id": unique_id,
-                        "title": safe_title,
-                        "upload_date": upload_date,
-                        "uploader": uploader,
-                        "overview": overview,
-                        "thumbnail_path": thumbnail_path,
-                        "url": url,
-                        "is_playlist": False,
-                        "content_type": settings.content_type,
+                        "numbers": 0,
+                        "playlist_count": playlist_count,
+                        "entries_complete": False,
                     }
-                # JSON形式で保存
-                info_filename = f"{unique_id}.json"
-                info_path = os.path.join(self.temp_dir, info_filename)
-                with open(info_path, "w", encoding="utf-8") as f:
-                    json.dump(preview_info, f, ensure_ascii=False, indent=2)
-                return info_path
+                    self.job_store.add_job(unique_id, preview_info)
+                    # 中身の取得はバックグラウンドで行い、カードは先に表示する
+                    self.downloader.entry_streams[unique_id] = threading.Event()
+                    stream_thread = threading.Thread(
+                        target=self.stream_playlist_entries,
+                        args=(unique_id, ydl, entries, page),
+                        daemon=True,
+                    )
+                    stream_thread.start()
+                    ydl = None # stream_playlist_entriesでプールに返却する
+                    return unique_id
+                # 保存する情報を整理
+                preview_info = {
+                    "id": unique_id,
+                    "title": safe_title,
+                    "upload_date": upload_date,
+                    "uploader": uploader,
+                    "overview": overview,
+                    "thumbnail_path": thumbnail_path,
+                    "url": url,
+                    "is_playlist": False,
+                    "content_type": settings.content_type,
+                    # ダウンロード済みかどうかの確認に使用する
+                    "archive_id": DownloadArchive.make_id(info.get("extractor_key", None), info.get("id", None)),
+                }
+                # ジョブストアに保存
+                self.job_store.add_job(unique_id, preview_info)
+                return unique_id
             except Exception as ex:
+                failed = True
                 if not self.downloader._check_network():
                     self.logger.error(
                         "A network error occurred. Please check your connection and try again.",
@@ -1080,509 +3944,416 @@ class YDownloader:
                         "is_playlist": True,
                         "content_type": settings.content_type,
                     }
-                    info_filename = f"{unique_id}.json"
-                    info_path = os.path.join(self.temp_dir, info_filename)
-                    with open(info_path, "w", encoding="utf-8") as f:
-                        json.dump(playlist_info, f, ensure_ascii=False, indent=2)
-                    return info_path
+                    self.job_store.add_job(unique_id, playlist_info)
+                    return unique_id
                 attempt += 1
                 self.logger.info(f"Attempt {attempt} failed: {ex}")
-                if attempt >= self.retries:
+                if not self.downloader.retry_policy.wait(attempt):
                     self.logger.error(
                         f"動画情報の取得に失敗しました: {ex}",
                         exc_info=True
                     )
                     return None
+            finally:
+                if ydl:
+                    # エラーが発生したインスタンスは状態が不明なため、プールに戻さずに閉じる
+                    self.downloader.ydl_pool.release(ydl, discard=failed)
+    
+    @staticmethod
+    def _iter_entry_pages(entries, page_size=100):
+        """
+        未解決のプレイリストの中身をページ単位(page_size件ずつ)で返すジェネレーター
+        entriesはリスト、ジェネレーター、PagedListのいずれか
+        """
+        # PagedListはgetsliceで範囲を指定して取得する(yt_dlp.utilsを読み込まずに判定する)
+        if hasattr(entries, "getslice"):
+            start = 0
+            while True:
+                entry_page = entries.getslice(start, start + page_size)
+                if entry_page:
+                    yield entry_page
+                if len(entry_page) < page_size:
+                    return
+                start += page_size
+        entry_page = []
+        for entry in entries:
+            entry_page.append(entry)
+            if len(entry_page) >= page_size:
+                yield entry_page
+                entry_page = []
+        if entry_page:
+            yield entry_page
+    
+    @staticmethod
+    def _extract_entry(index, entry):
+        """
+        フラットに取得したプレイリストの中身1件から、ダウンロードに必要な最低限の情報を取り出す
+        titleまたはurlが取得できない場合はNoneを返す
+        """
+        if not entry:
+            return None
+        entry_title = entry.get("title", None) or entry.get("id", None)
+        entry_url = entry.get("webpage_url", None) or entry.get("url", None)
+        if not entry_title or not entry_url:
+            return None
+        return {
+            "index": index,
+            # ダウンロード済みかどうかの確認に使用する(フラットな取得では抽出器名がie_keyに入る)
+            "archive_id": DownloadArchive.make_id(entry.get("ie_key", None), entry.get("id", None)),
+            "title": sanitize_filename(entry_title),
+            "url": entry_url,
+            "uploader": entry.get("uploader", "Unknown Uploader"),
+            "upload_date": entry.get("upload_date", "Unknown Date"),
+            "overview": entry.get("description", None),
+        }
+    
+    def stream_playlist_entries(self, key, ydl, entries, page):
+        """
+        プレイリストの中身をページ単位で取得し、取得できた分からジョブストアとカードの件数表示に反映する
+        ydlはpreview_video_infoでプールから借りたインスタンスで、取得完了後にプールに返却する
+        全て取得し終えたら、Download.entry_streams[key]をセットしてダウンロード処理の待機を解除する
+        ※スレッドとして実行する
+        """
+        index = 0
+        extracted_count = 0
+        failed = False
+        try:
+            for entry_page in self._iter_entry_pages(entries):
+                extracted_entries = []
+                for entry in entry_page:
+                    extracted_entry = self._extract_entry(index, entry)
+                    if extracted_entry:
+                        extracted_entries.append(extracted_entry)
+                    else:
+                        self.logger.info(f"entry {index} は無効なデータの為、スキップされました")
+                    index += 1
+                self._save_streamed_entries(key, extracted_entries, False, page)
+                extracted_count += len(extracted_entries)
+        except Exception as ex:
+            failed = True
+            self.logger.error(
+                f"プレイリストの中身の取得中にエラーが発生しました。取得できた{extracted_count}件のみ記録します: {ex}",
+                exc_info=True
+            )
+        finally:
+            try:
+                self._save_streamed_entries(key, [], True, page)
+            finally:
+                self.downloader.ydl_pool.release(ydl, discard=failed)
+                self.downloader.entry_streams[key].set()
+                self.logger.info(f"プレイリストの中身の取得が完了しました。key: {key}, 件数: {extracted_count}")
+    
+    def resume_playlist_entries(self, key, url, page):
+        """
+        前回の起動で中身の取得が完了しなかったプレイリストについて、中身を取得し直す
+        ジョブストアの中身は(job_key, idx)で上書きされるため、先頭から取得し直しても重複しない
+        (中身の取得が完了するまでダウンロードは始まらないため、記録済みの中身の状態は失われない)
+        取得に失敗した場合は、記録済みの中身のみで取得完了とする
+        ※スレッドとして実行する
+        """
+        ydl = None
+        try:
+            ydl = self.downloader.ydl_pool.checkout(self._preview_ydl_options())
+            info = ydl.extract_info(url, download=False, process=False)
+            entries = info.get("entries", None) if info else None
+            if entries is None:
+                raise ValueError("プレイリストの中身が取得できませんでした。")
+            # ydlはstream_playlist_entriesでプールに返却される
+            handover, ydl = ydl, None
+            self.stream_playlist_entries(key, handover, entries, page)
+        except Exception as ex:
+            self.logger.error(
+                f"プレイリストの中身の再取得に失敗しました。記録済みの中身のみダウンロードします。key: {key}, Exception: {ex}",
+                exc_info=True
+            )
+            if ydl:
+                self.downloader.ydl_pool.release(ydl, discard=True)
+            try:
+                self._save_streamed_entries(key, [], True, page)
+            finally:
+                self.downloader.entry_streams[key].set()
+    
+    def _save_streamed_entries(self, key, extracted_entries, complete, page):
+        """ページ単位で取得したプレイリストの中身をジョブストアに追加し、カードの件数表示を更新する"""
+        with self.info_lock:
+            data = self.job_store.append_entries(key, extracted_entries, complete=complete)
+            model = self.cards.get(key, None)
+            if model is not None:
+                model.update(entries_text=self.format_entries_count(data))
+    
+    @staticmethod
+    def format_entries_count(data):
+        """カードに表示するプレイリストの件数の文字列を作成する"""
+        numbers = data.get("numbers", "Unknown")
+        if data.get("entries_complete", True):
+            return f"{numbers}個"
+        playlist_count = data.get("playlist_count", None)
+        if playlist_count:
+            return f"{numbers}/{playlist_count}個"
+        return f"{numbers}個(読み込み中)"
+    
+    @staticmethod
+    def get_frame_size(page: ft.Page):
+        """ページのウィンドウサイズからサムネイル画像の16:9の表示枠のサイズ(幅, 高さ)を計算する"""
+        frame_width = int(page.window.width / 4)
+        frame_height = int(frame_width * 9 / 16)
+        return frame_width, frame_height
+    
+    def get_placeholder_src(self, page: ft.Page):
+        """ページのウィンドウサイズから計算した表示枠のサイズのプレースホルダー画像(表示枠のサイズごとに共有する灰色画像)のパスを返す"""
+        return self.placeholder_cache.get(*self.get_frame_size(page))
+    
+    def start_preview_workers(self, page: ft.Page):
+        """
+        動画情報取得用のワーカースレッドを起動する
+        ワーカーはself.preview_queueからURLを取り出して並列に動画情報を取得し、取り込み順にカードを追加する
+        """
+        for index in range(self.preview_workers):
+            worker = threading.Thread(
+                target=self.preview_worker,
+                args=(page,),
+                name=f"preview-worker-{index}",
+                daemon=True,
+            )
+            worker.start()
+        self.logger.info(f"動画情報取得用のワーカーを{self.preview_workers}個起動しました。")
+    
+    def preview_worker(self, page: ft.Page):
+        """
+        キューからURLを取り出し、動画情報を取得する
+        ※無限ループ内でスレッドとして実行する
+        """
+        while True:
+            seq, url = self.preview_queue.get()
+            try:
+                job_key = self.preview_video_info(url, page)
+            except Exception as ex:
+                self.logger.error(
+                    f"Error in preview_worker: {ex}",
+                    exc_info=True
+                )
+                job_key = None
+            self._commit_preview_result(seq, url, job_key, page)
+    
+    def _commit_preview_result(self, seq, url, job_key, page: ft.Page):
+        """
+        動画情報の取得結果を受け取り、取り込み順(seq順)にカードを追加する
+        先に取得が終わった結果は、それより前の結果が揃うまで保留する
+        """
+        with self.commit_lock:
+            self.preview_results[seq] = (url, job_key)
+            while self.next_commit_seq in self.preview_results:
+                url, job_key = self.preview_results.pop(self.next_commit_seq)
+                self.next_commit_seq += 1
+                self.add_video_card(url, job_key, page)
+                # カードを作成できなかったURLは、再度取り込めるように索引から削除する
+                self.url_index.release_pending(url)
+                with self.condition_pre:
+                    self.pre_current_urls += 1
+                    self._update_import_progress()
+                    # ファイルからの取り込みが取り込み待ちの件数の上限で待っている場合に再開させる
+                    self.condition_pre.notify_all()
+                # 複数のカードが続けて追加される場合も、1フレームにつき1回の更新にまとめる
+                mark_dirty(page)
+    
+    def _update_import_progress(self):
+        """
+        取り込みの進捗バーを更新する(self.condition_preを保持した状態で呼び出すこと)
+        全ての取り込みが完了した場合は、進捗をリセットして非表示にする
+        """
+        if self.pre_current_urls >= self.pre_total_urls:
+            self.pre_total_urls = 0
+            self.pre_current_urls = 0
+            self.progress.visible = False # 進捗バー見えないように
+            self.progress.controls[1].value = 0 # progress_textのvalue
+            self.progress.controls[0].content.value = 0 # progress_barのvalue
+        else:
+            self.progress.visible = True # 取り込み中なので表示
+            progress_text = f"{self.pre_current_urls}/{self.pre_total_urls}"
+            if self.import_file is not None:
+                # ファイルからの取り込み中は、ファイルの読み込みの進捗も表示する
+                progress_text += f" (ファイル {self.import_file.progress:.0%})"
+            self.progress.controls[1].value = progress_text # progress_textのvalue
+            self.progress.controls[0].content.value = self.pre_current_urls / self.pre_total_urls # progress_barのvalue
+    
+    def create_thumbnail_src(self, model, thumbnail_img_src, page: ft.Page):
+        """
+        カードに表示するサムネイル画像のパスを返す
+        サムネイルがない場合は、get_placeholder_srcでプレースホルダー画像を使用する
+        表示枠のサイズへの縮小はself.thumbnail_rendererで行い、完了していない場合はプレースホルダー画像を表示して、完了後に差し替える
+        """
+        rendered = None
+        frame_width, frame_height = self.get_frame_size(page)
+        model.thumbnail_path = thumbnail_img_src
+        model.thumbnail_size = (frame_width, frame_height)
+        if thumbnail_img_src:
+            rendered = self.thumbnail_renderer.submit(thumbnail_img_src, frame_width, frame_height)
+            if rendered.done() and rendered.exception() is None:
+                return rendered.result()
+        placeholder_src = self.get_placeholder_src(page)
+        if rendered:
+            rendered.add_done_callback(lambda future: self._apply_rendered_thumbnail(future, model, (frame_width, frame_height)))
+        return placeholder_src
+    
+    def refresh_thumbnail(self, model, frame_width, frame_height):
+        """
+        表示枠のサイズが変わったカードのサムネイル画像を、新しいサイズで縮小し直す(VirtualCardListから呼び出す)
+        縮小が完了するまでは、今の画像のまま表示する
+        """
+        size = (frame_width, frame_height)
+        model.thumbnail_size = size
+        if not model.thumbnail_path:
+            model.update(thumbnail_src=self.placeholder_cache.get(frame_width, frame_height))
+            return
+        rendered = self.thumbnail_renderer.submit(model.thumbnail_path, frame_width, frame_height)
+        rendered.add_done_callback(lambda future: self._apply_rendered_thumbnail(future, model, size))
+    
+    def _apply_rendered_thumbnail(self, future, model, size):
+        """
+        縮小が完了したサムネイル画像をカードの画像に差し替える(失敗した場合はプレースホルダー画像のまま)
+        縮小中に表示枠のサイズが変わった場合(sizeが古い場合)は差し替えない
+        """
+        if future.exception() is not None:
+            self.logger.error(
+                f"サムネイル画像の変換に失敗しました: {future.exception()}",
+                exc_info=future.exception()
+            )
+            return
+        if model.thumbnail_size != size:
+            return
+        model.update(thumbnail_src=future.result())
+    
+    def create_card_model(self, key, url, data, page: ft.Page):
+        """
+        動画情報からカードの表示内容(CardModel)を生成する
+        - is_entries: メタデータが正常に入手できたプレイリスト(コンテンツ数も表示する)
+        - is_playlist: プレイリストのリンクが入力されて、メタデータが正常に入手できなかった場合
+        - それ以外: 単体の動画
+        """
+        is_entries = data.get("is_entries", False)
+        is_playlist = data.get("is_playlist", False)
+        model = CardModel(key, url, content_type=data.get("content_type", None) or settings.content_type)
+        if is_playlist:
+            # メタデータが入手できていないため、Unknownとプレースホルダー画像で表示する
+            model.title_label = "プレイリスト名"
+            model.thumbnail_src = self.create_thumbnail_src(model, None, page)
+        else:
+            model.title = data.get("title", "Unknown Title")
+            model.upload_date = data.get("upload_date", "Unknown")
+            model.uploader = data.get("uploader", "Unknown")
+            model.thumbnail_src = self.create_thumbnail_src(model, data.get("thumbnail_path", None), page)
+        if is_entries:
+            # プレイリストの場合は投稿日時の下にコンテンツ数を表示する
+            # 中身の取得中は件数が増えていくため、stream_playlist_entriesから更新される
+            model.entries_text = self.format_entries_count(data)
+        return model
+    
+    # 動画読み込み後のカード追加用関数
+    def add_video_card(self, url, job_key, page: ft.Page):
+        """
+        preview_video_infoの結果からカードを生成し、ページに追加する。
+        
+        :param url: 動画のURL
+        :param job_key: preview_video_infoの戻り値(ジョブストアのkey、"NetWorkError"またはNone)
+        :param page: Fletのpage
+        """
+        try:
+            self.logger.debug(job_key)
+            if job_key == "NetWorkError":
+                open_dlg(network_err_dlg, page)
+                return
+            elif not job_key:
+                open_dlg(link_err_dlg, page)
+                return
+            self.logger.debug(f"Generated job key: {job_key}")
+            # プレイリストの中身の取得と並行して読み込むため、読み込みからカード作成まではinfo_lockを保持する
+            with self.info_lock:
+                data = self.job_store.get_job(job_key)
+                self._add_video_card_from_data(url, data, page)
+        except Exception as ex:
+            self.logger.error(
+                f"Error adding video card: {ex}",
+                exc_info=True
+            )
+            open_dlg(err_dlg, page)
+    
+    def _add_video_card_from_data(self, url, data, page: ft.Page):
+        """動画情報(data)からカードを作成してページに追加する"""
+        self.logger.debug(f"data: {data}")
+        is_playlist = data.get("is_playlist", "ERROR")
+        if is_playlist == "ERROR":
+            self.logger.error(
+                "is_playlistの値が不正です。",
+                exc_info=True
+            )
+            # sys.exit(1) # プログラムの終了
+            raise ValueError("is_playlistの値が不正です。")
+        # 各Cardに追加されるkey
+        key = data.get("id", "Unknown ID")
+        if key == "Unknown ID":
+            self.logger.error(
+                "IDが不明です。",
+                exc_info=True
+            )
+            # sys.exit(1) # プログラムの終了
+            raise ValueError("IDが不明です。")
+        # URLが異なっても、取得した動画が既に追加済みの場合はカードを作成しない
+        if not self.url_index.confirm(url, data.get("archive_id", None)):
+            self.logger.info(f"{url}は既に追加済みの動画のため、カードを作成しません。archive_id: {data.get('archive_id', None)}")
+            self.job_store.delete_job(key)
+            return
+        if data.get("is_entries", False):
+            print("これは正常にメタデータを入手できたプレイリスト") # デバッグ用
+        # self.cardsはDownloadと共有しているため、DownloadクラスからもCardの表示内容を操作できる
+        self.card_list.append(self.create_card_model(key, url, data, page))
     
-    def compute_perfect_size(self, page: ft.Page, thumb_width, thumb_height, key):
+    def restore_unfinished_jobs(self, page: ft.Page):
         """
-        ページのウィンドウサイズから16:9枠内に収まるフレームサイズを計算し、
-        サムネイル画像サイズ(又は、画像がない場合はプレースホルダー(灰色画像を生成して保存))を返す。
+        前回の起動でダウンロード待ちまたはダウンロード中のまま終了したジョブのカードを復元し、ダウンロードを再開する
+        それ以外のジョブはジョブストアから削除する
+        一時ディレクトリは削除されているため、サムネイル画像はプレースホルダー画像で表示する
         """
-        if not key:
+        try:
+            self.job_store.prune_finished()
+            jobs = self.job_store.get_unfinished_jobs()
+            if not jobs:
+                return
+            self.logger.info(f"前回の起動で完了しなかったジョブを{len(jobs)}件再開します。")
+            for data in jobs:
+                thumbnail_path = data.get("thumbnail_path", None)
+                if thumbnail_path and not os.path.exists(thumbnail_path):
+                    data["thumbnail_path"] = None
+                self.downloader.resumed_keys.add(data["id"])
+                self._add_video_card_from_data(data["url"], data, page)
+                if data.get("is_entries", False) and not data.get("entries_complete", True):
+                    # 中身の取得中に終了したプレイリストは、ダウンロードの前に中身を取得し直す(取得完了まで待機させる)
+                    self.downloader.entry_streams[data["id"]] = threading.Event()
+                    threading.Thread(
+                        target=self.resume_playlist_entries,
+                        args=(data["id"], data["url"], page),
+                        daemon=True,
+                    ).start()
+            mark_dirty(page)
+            for data in jobs:
+                self.download_video_by_key(None, data["id"], page, confirm_archived=False)
+        except Exception as ex:
             self.logger.error(
-                "keyの値が不明です。",
+                f"中断したジョブの再開に失敗しました: {ex}",
                 exc_info=True
             )
-            # sys.exit(1) # プログラムの終了
-            raise KeyError("keyの値が不明です。")
-        frame_width = int(page.window.width / 4)
-        frame_height = int(frame_width * 9 / 16)
-        if thumb_width == 0 or thumb_height == 0:
-            # サムネイル画像がない場合は、プレースホルダー画像を生成する
-            img = Image.new("RGB", (1280, 720), (128, 128, 128))
-            thumbnail_path = os.path.join(self.temp_dir, f"{key}_thumb.jpg")
-            img.save(thumbnail_path, format="JPEG", quality=95) # JPG形式で保存
-            return {
-                "src": thumbnail_path, 
-                "width": frame_width,
-                "height": frame_height
-            }
-        else:
-            if int(thumb_height) > int(thumb_width * 9 / 16):
-                background_width = int(thumb_height * 16 / 9)
-                background_height = int(thumb_height)
-            else:
-                background_width = int(thumb_width)
-                background_height = int(thumb_width * 9 / 16)
-            offset_x = int((background_width - thumb_width) / 2)
-            offset_y = int((background_height - thumb_height) / 2)
-            return {
-                "width": background_width,
-                "height": background_height,
-                "offset_x": offset_x,
-                "offset_y": offset_y,
-                "frame_width": frame_width,
-                "frame_height": frame_height
-            }
+            open_dlg(err_happen_dlg, page)
     
-    # 動画読み込み後のカード追加用関数
-    def add_video_card(self, page: ft.Page):
+    def enqueue_preview_urls(self, urls, page):
         """
-        URLリストからURLを取り出し、動画情報を取得してカードを生成し、ページに追加する。
-        ※無限ループ内でスレッドとして実行する
+        URLを取り込み順の番号付きでプレビュー用のキューに追加する
         """
-        while True:
-            with self.condition_pre:
-                while not self.pre_url_list:
-                    self.pre_total_urls = 0
-                    self.pre_current_urls = 0
-                    self.progress.visible = False # 進捗バー見えないように
-                    self.progress.controls[1].value = 0 # progress_textのvalue
-                    self.progress.controls[0].content.value = 0 # progress_barのvalue
-                    page.update()
-                    self.condition_pre.wait()
-                print(self.pre_url_list) # デバッグ用
-                url = self.pre_url_list.pop(0) # pop(0)で先頭のURLを取得してリストから削除
-                self.progress.visible = True # 取り込み開始なので表示
-                self.progress.controls[1].value = f"{self.pre_current_urls + 1}/{self.pre_total_urls}" # progress_textのvalue
-                self.progress.controls[0].content.value = (self.pre_current_urls / self.pre_total_urls) if self.pre_total_urls > 0 else 0 # progress_barのvalue
-                page.update()
-            try:
-                self.pre_current_urls += 1
-                json_path = self.preview_video_info(url, page)
-                self.logger.debug(json_path)
-                if json_path == "NetWorkError":
-                    open_dlg(network_err_dlg, page)
-                elif not json_path:
-                    open_dlg(link_err_dlg, page)
-                else:
-                    self.logger.debug(f"Generated JSON path: {json_path}")
-                    with open(json_path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                    self.logger.debug(f"data: {data}")
-                    is_playlist = data.get("is_playlist", "ERROR")
-                    if is_playlist == "ERROR":
-                        self.logger.error(
-                            "is_playlistの値が不正です。",
-                            exc_info=True
-                        )
-                        # sys.exit(1) # プログラムの終了
-                        raise ValueError("is_playlistの値が不正です。")
-                    # 各Cardに追加されるkey
-                    key = data.get("id", "Unknown ID")
-                    if key == "Unknown ID":
-                        self.logger.error(
-                            "IDが不明です。",
-                            exc_info=True
-                        )
-                        # sys.exit(1) # プログラムの終了
-                        raise ValueError("IDが不明です。")
-                    is_entries = data.get("is_entries", False)
-                    if is_entries:
-                        print("これは正常にメタデータを入手できたプレイリスト") # デバッグ用
-                        entry_video_title = ft.TextField(
-                            label="タイトル",
-                            value=data.get("title", "Unknown Title"),
-                            adaptive=True,
-                        )
-                        entry_video_date = ft.Text(
-                            value=data.get("upload_date", "Unknown"),
-                        )
-                        entry_video_uploader = ft.TextField(
-                            label="投稿者",
-                            value=data.get("uploader", "Unknown"),
-                            adaptive=True,
-                        )
-                        entry_thumbnail_img_src = data.get("thumbnail_path", None)
-                        if not entry_thumbnail_img_src:
-                            # サムネイルがない場合は、compute_perfect_sizeでプレースホルダー画像を生成
-                            entry_placeholder = self.compute_perfect_size(page, 0, 0, key)
-                            entry_video_thumbnail_img = ft.Image(
-                                src=entry_placeholder["src"],
-                                width=entry_placeholder["width"],
-                                height=entry_placeholder["height"],
-                                fit=ft.ImageFit.CONTAIN,
-                                border_radius=ft.border_radius.all(10),
-                            )
-                        else:
-                            # 画像を読み込み、16:9の枠内に収まるように中央配置した背景画像を作成
-                            with Image.open(entry_thumbnail_img_src) as img:
-                                entry_img_width, entry_img_height = img.size
-                                entry_perfect_img_size = self.compute_perfect_size(page, entry_img_width, entry_img_height, key)
-                                # 灰色の背景画像作成
-                                # リサイズはなし
-                                entry_background = Image.new("RGB", (entry_perfect_img_size["width"], entry_perfect_img_size["height"]), (128, 128, 128))
-                                entry_background.paste(img, (entry_perfect_img_size["offset_x"], entry_perfect_img_size["offset_y"]))
-                                # サムネイル画像配置枠
-                                entry_frame_width = entry_perfect_img_size["frame_width"]
-                                entry_frame_height = entry_perfect_img_size["frame_height"]
-                                # .temp内の一時ファイルに保存
-                                with tempfile.NamedTemporaryFile(delete=False, dir=self.temp_dir, suffix=".jpg") as entry_temp_file:
-                                    entry_temp_path = entry_temp_file.name
-                                    entry_background.save(entry_temp_path, format="JPEG", quality=95) # JPG形式で保存
-                            # 元のファイルをバックアップ
-                            entry_backup_path = entry_thumbnail_img_src + ".bak"
-                            os.rename(entry_thumbnail_img_src, entry_backup_path)
-                            # 一時ファイルを元のファイルに置き換え
-                            os.rename(entry_temp_path, entry_thumbnail_img_src)
-                            # バックアップ削除(上書きが成功した場合)
-                            os.remove(entry_backup_path)
-                            entry_video_thumbnail_img = ft.Image(
-                                src=entry_thumbnail_img_src,
-                                width=entry_frame_width,
-                                height=entry_frame_height,
-                                fit=ft.ImageFit.CONTAIN,
-                                border_radius=ft.border_radius.all(10),
-                            )
-                        # RadioGroupを作成
-                        # 保存形式を個々に選択できるようにする(MovieとMusic)
-                        entry_rg = ft.RadioGroup(
-                            value=settings.content_type,
-                            content=ft.Row([
-                                ft.Radio(value="movie", label="Movie"),
-                                ft.Radio(value="music", label="Music"),
-                            ]),
-                        )
-                        # lambda式の「遅延束縛」を回避するためにデフォルト引数としてkeyをバインドする
-                        entry_delete_icon = ft.IconButton(
-                            icon=ft.Icons.DELETE_FOREVER_ROUNDED,
-                            on_click=lambda e, key=key : self.remove_card(e, key, page, url),
-                            tooltip="削除",
-                        )
-                        entry_download_icon = ft.IconButton(
-                            icon=ft.Icons.CLOUD_DOWNLOAD_ROUNDED,
-                            on_click=lambda e, key=key: self.download_video_by_key(e, key, page),
-                            tooltip="ダウンロード",
-                        )
-                        entry_progress = ft.ProgressBar(
-                            visible=False,
-                            value=None,
-                        )
-                        entry_progress_container = ft.Container(
-                            content=entry_progress,
-                            expand=True, # 親であるCardの幅いっぱいに広がるように
-                            clip_behavior=ft.ClipBehavior.ANTI_ALIAS,
-                            border_radius=ft.border_radius.all(8),
-                        )
-                        entry_about_info = ft.Column(
-                            controls=[
-                                entry_video_title,
-                                ft.Row(
-                                    controls=[
-                                        entry_video_uploader,
-                                        ft.Row(
-                                            controls=[
-                                                entry_rg,
-                                                ft.Column(
-                                                    controls=[
-                                                        entry_video_date,
-                                                        ft.Text(
-                                                            value=f"{data.get('numbers', 'Unknown')}個"
-                                                        ),
-                                                    ],
-                                                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                                                ),
-                                            ],
-                                            alignment=ft.MainAxisAlignment.END,
-                                        ),
-                                    ],
-                                    alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
-                                ),
-                            ],
-                            expand=True,
-                        )
-                        entry_info = ft.Row(
-                            controls=[
-                                entry_video_thumbnail_img,
-                                entry_about_info,
-                                ft.Column(
-                                    controls=[
-                                        entry_download_icon,
-                                        entry_delete_icon,
-                                    ],
-                                    alignment=ft.alignment.center,
-                                ),
-                            ],
-                            alignment=ft.alignment.center,
-                        )
-                        entry_video_card = ft.Card(
-                            key=key,
-                            content=ft.Container(
-                                content=ft.Column(
-                                    controls=[
-                                        entry_info,
-                                        entry_progress_container,
-                                    ],
-                                    spacing=10,
-                                ),
-                                padding=4,
-                            ),
-                            margin=0,
-                        )
-                        self.cards[key] = entry_video_card
-                        self.downloader.cards[key] = entry_video_card # こうすることで、DownloadクラスからCardの要素の操作ができる
-                        self.added_urls.append(url)
-                        self.card_container.controls.append(entry_video_card)
-                        page.update()
-                    else:
-                        if not is_playlist:
-                            video_title = ft.TextField(
-                                label="タイトル",
-                                value=data.get("title", "Unknown Title"),
-                                adaptive=True,
-                            )
-                            video_date = ft.Text(
-                                value=data.get("upload_date", "Unknown"),
-                            )
-                            video_uploader = ft.TextField(
-                                label="投稿者",
-                                value=data.get("uploader", "Unknown"),
-                                adaptive=True,
-                            )
-                            thumbnail_img_src = data.get("thumbnail_path", None)
-                            if not thumbnail_img_src:
-                                # サムネイルがない場合は、compute_perfect_sizeでプレースホルダー画像を生成
-                                placeholder = self.compute_perfect_size(page, 0, 0, key)
-                                video_thumbnail_img = ft.Image(
-                                    src=placeholder["src"],
-                                    width=placeholder["width"],
-                                    height=placeholder["height"],
-                                    fit=ft.ImageFit.CONTAIN,
-                                    border_radius=ft.border_radius.all(10),
-                                )
-                            else:
-                                # 画像を読み込み、16:9の枠内に収まるように中央配置した背景画像を作成
-                                with Image.open(thumbnail_img_src) as img:
-                                    img_width, img_height = img.size
-                                    perfect_img_size = self.compute_perfect_size(page, img_width, img_height, key)
-                                    # 灰色の背景画像作成
-                                    # リサイズはなし
-                                    background = Image.new("RGB", (perfect_img_size["width"], perfect_img_size["height"]), (128, 128, 128))
-                                    background.paste(img, (perfect_img_size["offset_x"], perfect_img_size["offset_y"]))
-                                    # サムネイル画像配置枠
-                                    frame_width = perfect_img_size["frame_width"]
-                                    frame_height = perfect_img_size["frame_height"]
-                                    # .temp内の一時ファイルに保存
-                                    with tempfile.NamedTemporaryFile(delete=False, dir=self.temp_dir, suffix=".jpg") as temp_file:
-                                        temp_path = temp_file.name
-                                        background.save(temp_path, format="JPEG", quality=95) # JPG形式で保存
-                                # 元のファイルをバックアップ
-                                backup_path = thumbnail_img_src + ".bak"
-                                os.rename(thumbnail_img_src, backup_path)
-                                # 一時ファイルを元のファイルに置き換え
-                                os.rename(temp_path, thumbnail_img_src)
-                                # バックアップ削除(上書きが成功した場合)
-                                os.remove(backup_path)
-                                video_thumbnail_img = ft.Image(
-                                    src=thumbnail_img_src,
-                                    width=frame_width,
-                                    height=frame_height,
-                                    fit=ft.ImageFit.CONTAIN,
-                                    border_radius=ft.border_radius.all(10),
-                                )
-                            # RadioGroupを作成
-                            # 保存形式を個々に選択できるようにする(MovieとMusic)
-                            rg = ft.RadioGroup(
-                                value=settings.content_type,
-                                content=ft.Row([
-                                    ft.Radio(value="movie", label="Movie"),
-                                    ft.Radio(value="music", label="Music"),
-                                ]),
-                            )
-                            # lambda式の「遅延束縛」を回避するためにデフォルト引数としてkeyをバインドする
-                            delete_icon = ft.IconButton(
-                                icon=ft.Icons.DELETE_FOREVER_ROUNDED,
-                                on_click=lambda e, key=key : self.remove_card(e, key, page, url),
-                                tooltip="削除",
-                            )
-                            download_icon = ft.IconButton(
-                                icon=ft.Icons.CLOUD_DOWNLOAD_ROUNDED,
-                                on_click=lambda e, key=key: self.download_video_by_key(e, key, page),
-                                tooltip="ダウンロード",
-                            )
-                            progress = ft.ProgressBar(
-                                visible=False,
-                                value=None,
-                            )
-                            progress_container = ft.Container(
-                                content=progress,
-                                expand=True, # 親であるCardの幅いっぱいに広がるように
-                                clip_behavior=ft.ClipBehavior.ANTI_ALIAS,
-                                border_radius=ft.border_radius.all(8),
-                            )
-                            about_info = ft.Column(
-                                controls=[
-                                    video_title,
-                                    ft.Row(
-                                        controls=[
-                                            video_uploader,
-                                            ft.Row(
-                                                controls=[
-                                                    rg,
-                                                    video_date,
-                                                ],
-                                                alignment=ft.MainAxisAlignment.END,
-                                            ),
-                                        ],
-                                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
-                                    ),
-                                ],
-                                expand=True,
-                            )
-                            info = ft.Row(
-                                controls=[
-                                    video_thumbnail_img,
-                                    about_info,
-                                    ft.Column(
-                                        controls=[
-                                            download_icon,
-                                            delete_icon,
-                                        ],
-                                        alignment=ft.alignment.center,
-                                    ),
-                                ],
-                                alignment=ft.alignment.center,
-                            )
-                            video_card = ft.Card(
-                                key=key,
-                                content=ft.Container(
-                                    content=ft.Column(
-                                        controls=[
-                                            info,
-                                            progress_container,
-                                        ],
-                                        spacing=10,
-                                    ),
-                                    padding=4,
-                                ),
-                                margin=0,
-                            )
-                            self.cards[key] = video_card
-                            self.downloader.cards[key] = video_card # こうすることで、DownloadクラスからCardの要素の操作ができる
-                            self.added_urls.append(url)
-                            self.card_container.controls.append(video_card)
-                            page.update()
-                        else:
-                            # ここはプレイリストのリンクが入力されて、メタデータが正常に入手できなかった場合
-                            playlist_title = ft.TextField(
-                                label="プレイリスト名",
-                                value="Unknown",
-                                adaptive=True,
-                            )
-                            playlist_date = ft.Text(
-                                value="Unknown",
-                            )
-                            playlist_uploader = ft.TextField(
-                                label="投稿者",
-                                value="Unknown",
-                                adaptive=True,
-                            )
-                            placeholder_playlist = self.compute_perfect_size(page, 0, 0, key)
-                            playlist_thumb_img = ft.Image(
-                                src=placeholder_playlist["src"],
-                                width=placeholder_playlist["width"],
-                                height=placeholder_playlist["height"],
-                                fit=ft.ImageFit.CONTAIN,
-                                border_radius=ft.border_radius.all(10),
-                            )
-                            playlist_rg = ft.RadioGroup(
-                                value=settings.content_type,
-                                content=ft.Row([
-                                    ft.Radio(value="movie", label="Movie"),
-                                    ft.Radio(value="music", label="Music"),
-                                ]),
-                            )
-                            # lambda式の「遅延束縛」を回避するためにデフォルト引数としてkeyをバインドする
-                            playlist_delete_icon = ft.IconButton(
-                                icon=ft.Icons.DELETE_FOREVER_ROUNDED,
-                                on_click=lambda e, key=key: self.remove_card(e, key, page, url),
-                                tooltip="削除",
-                            )
-                            playlist_download_icon = ft.IconButton(
-                                icon=ft.Icons.CLOUD_DOWNLOAD_ROUNDED,
-                                on_click=lambda e, key=key: self.download_video_by_key(e, key, page),
-                                tooltip="ダウンロード",
-                            )
-                            playlist_progress = ft.ProgressBar(
-                                visible=False,
-                                value=None,
-                            )
-                            playlist_progress_container = ft.Container(
-                                content=playlist_progress,
-                                expand=True,
-                                clip_behavior=ft.ClipBehavior.ANTI_ALIAS,
-                                border_radius=ft.border_radius.all(8),
-                            )
-                            playlist_about_info = ft.Column(
-                                controls=[
-                                    playlist_title,
-                                    ft.Row(
-                                        controls=[
-                                            playlist_uploader,
-                                            ft.Row(
-                                                controls=[
-                                                    playlist_rg,
-                                                    playlist_date,
-                                                ],
-                                                alignment=ft.MainAxisAlignment.END,
-                                            ),
-                                        ],
-                                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
-                                    ),
-                                ],
-                                expand=True,
-                            )
-                            playlist_info = ft.Row(
-                                controls=[
-                                    playlist_thumb_img,
-                                    playlist_about_info,
-                                    ft.Column(
-                                        controls=[
-                                            playlist_download_icon,
-                                            playlist_delete_icon,
-                                        ],
-                                        alignment=ft.alignment.center,
-                                    ),
-                                ],
-                                alignment=ft.alignment.center,
-                            )
-                            playlist_card = ft.Card(
-                                key=key,
-                                content=ft.Container(
-                                    content=ft.Column(
-                                        controls=[
-                                            playlist_info,
-                                            playlist_progress_container,
-                                        ],
-                                        spacing=10,
-                                    ),
-                                    padding=4,
-                                ),
-                                margin=0,
-                            )
-                            self.cards[key] = playlist_card
-                            self.downloader.cards[key] = playlist_card # こうすることで、DownloadクラスからCardの要素の操作ができる
-                            self.added_urls.append(url)
-                            self.card_container.controls.append(playlist_card)
-                            page.update()
-            except Exception as ex:
-                self.logger.error(
-                    f"Error adding video card: {ex}",
-                    exc_info=True
-                )
-                open_dlg(err_dlg, page)
-            time.sleep(0.5) # 連続処理の負荷を軽減
+        with self.condition_pre:
+            self.pre_total_urls += len(urls) # 追加するURLの数を追加
+            for url in urls:
+                self.preview_queue.put((self.next_preview_seq, url))
+                self.next_preview_seq += 1
+            self._update_import_progress()
+        mark_dirty(page)
     
     def handle_url_submit(self, e, tf, page):
         """
@@ -1594,21 +4365,18 @@ class YDownloader:
             if not urls:
                 return
             tf.value = "" # add_video_cardは実行に時間がかかるため、先にクリアしておく
-            page.update()
+            mark_dirty(page)
             # 各URLについて、前後の空白を削除する。
             # もし空白だけの場合は空文字列になるため、除外される。
-            # また、既に追加済みのURLリスト（self.pre_url_list, self.added_urls）と重複していないかもチェック
+            # また、既に取り込み待ちまたは追加済みのURL(self.url_index)と同じ動画でないかもチェック
             valid_urls = []
             for url in urls:
                 trimmed_url = url.strip()  # 前後の空白を削除
-                # trimmed_urlが空でなく、かつ重複していない場合にのみリストへ追加
-                if trimmed_url and trimmed_url not in self.pre_url_list and trimmed_url not in self.added_urls and trimmed_url not in valid_urls:
+                # trimmed_urlが空でなく、かつ重複していない場合にのみリストへ追加(索引への記録も同時に行う)
+                if trimmed_url and self.url_index.add(trimmed_url):
                     valid_urls.append(trimmed_url)
             if valid_urls: # 追加するURLがある場合の処理
-                with self.condition_pre:
-                    self.pre_total_urls += len(valid_urls) # 追加するURLの数を追加
-                    self.pre_url_list.extend(valid_urls) # URLをリスト末尾に追加
-                    self.condition_pre.notify() # 待機中のスレッドを起こす
+                self.enqueue_preview_urls(valid_urls, page)
         except Exception as ex:
             self.logger.error(
                 f"Error in handle_url_submit: {ex}",
@@ -1617,86 +4385,151 @@ class YDownloader:
             # sys.exit(1) # プログラムの終了
             raise ex
     
+    # ウィンドウサイズの変更を反映するまでの待ち時間と、変更が続く場合の最長の待ち時間(秒)
+    RESIZE_DEBOUNCE = 0.15
+    RESIZE_MAX_WAIT = 0.5
+    
     def handle_window_resize(self, e, page):
         """
         ウィンドウサイズが変更された時に実行される関数
+        ウィンドウの端をドラッグしている間はイベントが連続して発生するため、self.resize_debouncerでまとめてから反映する
         """
-        # 画面幅が変更された時の処理
-        updated_width = int(page.window.width / 4)
-        updated_height = int(updated_width * 9 / 16)
-        for key, card in self.cards.items():
-            info = card.content.content.controls[0]
-            thumbnail_img = info.controls[0]
-            thumbnail_img.width = updated_width
-            thumbnail_img.height = updated_height
-            page.update()
+        self.resize_debouncer.trigger(page)
+    
+    def apply_window_resize(self, page):
+        """
+        ウィンドウサイズの変更をカードに反映する(表示枠のサイズの計算とログは1回のみ)
+        表示中のカードのみに反映され(サムネイル画像もrefresh_thumbnailで縮小し直す)、残りは表示する時に反映される
+        """
+        updated_width, updated_height = self.get_frame_size(page)
+        if self.card_list.set_frame_size(updated_width, updated_height):
             self.logger.info(f"ウィンドウサイズが変更されました。 width: {updated_width}, height: {updated_height}")
     
-    def download_video_by_key(self, e, key, page):
+    def handle_window_event(self, e, page):
+        """
+        ウィンドウのイベントが発生した時に実行される関数
+        ウィンドウを閉じる時は、予約されているリサイズの反映を取り消し、まとめて送る予定の画面の更新を送ってから閉じる
+        """
+        if e.type != ft.WindowEventType.CLOSE:
+            return
+        try:
+            self.resize_debouncer.cancel()
+            UpdateCoalescer.for_page(page).flush()
+        except Exception as ex:
+            self.logger.warning(f"ウィンドウを閉じる前の処理に失敗しました: {ex}")
+        finally:
+            page.window.destroy()
+    
+    def download_video_by_key(self, e, key, page, force=False, confirm_archived=True):
         """
         ダウンロードボタンが押されたカードの動画をダウンロードするコールバック関数
+        カードの入力内容を確定させてからスケジューラーのキューに追加する(ダウンロード完了は待たない)
+        
+        :param force: Trueの場合、ダウンロード済みの動画もダウンロードする
+        :param confirm_archived: Trueの場合、ダウンロード済みでスキップした時に、再度ダウンロードするか確認するダイアログを表示する
         """
         try:
-            # ページ上から最新のCardを取得(保存していた参照ではなく、現在のコントロールツリーから)
-            # dictであるcardsから参照
-            target_card = self.cards[key]
-            target_column = target_card.content.content
-            target_info = target_column.controls[0]
-            target_progress_bar = target_column.controls[1].content
-            target_about_info = target_info.controls[1]
-            target_title = target_about_info.controls[0]
-            target_uploader = target_about_info.controls[1].controls[0]
-            target_content_type = target_about_info.controls[1].controls[1].controls[0]
-            json_path = os.path.join(self.temp_dir, f"{key}.json")
-            # JSONファイルを読み込んで、更新
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if not all(k in data for k in ("title", "uploader", "url")):
+            if self.scheduler.is_pending(key):
+                self.logger.info(f"key: {key} は既にダウンロード待ちです。")
+                return
+            # カードの入力内容はCardModelに保持されている(表示範囲外のカードも含む)
+            model = self.cards[key]
+            # ジョブを読み込んで、カードの入力内容で更新
+            data = self.job_store.get_job(key)
+            if not data or not data.get("url", None):
                 self.logger.error(
-                    "JSONファイルにtitleまたはuploaderまたはurlのキーがありません。",
+                    "ジョブにurlが記録されていません。",
                     exc_info=True
                 )
                 # sys.exit(1) # プログラムの終了
-                raise ValueError("JSONファイルにtitleまたはuploaderまたはurlのキーが存在しません。")
-            data["title"] = sanitize_filename(target_title.value)
-            self.logger.debug(data["title"])
-            data["uploader"] = target_uploader.value
-            self.logger.debug(data["uploader"])
-            data["content_type"] = target_content_type.value
-            self.logger.debug(data["content_type"])
-            # 更新したデータをJSONファイルに書き戻す
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            self.logger.info(f"{key}.jsonを更新しました")
-            # ダウンロードボタンとデリートボタンを押せなくする
-            download_button = target_info.controls[2].controls[0]
-            delete_button = target_info.controls[2].controls[1]
-            download_button.disabled = True  # ダウンロードボタンを無効化
-            delete_button.disabled = True # デリートボタンを無効化
-            target_title.disabled = True # タイトル入力欄を無効化
-            target_content_type.disabled = True # ダウンロードタイプ選択無効化
-            target_uploader.disabled = True # 投稿者テキストフィールド無効化
-            # プログレスバーを見えるようにする
-            target_progress_bar.visible = True # これでプログレスバーが見えるようになる(page.updateが必要)
-            page.update() # ページ更新
-            # ダウンロード処理開始
-            self.downloader._check_content_type(key=key, page=page)
+                raise ValueError("ジョブにurlが記録されていません。")
+            title = sanitize_filename(model.title)
+            self.logger.debug(title)
+            self.logger.debug(model.uploader)
+            self.logger.debug(model.content_type)
+            self.job_store.update_job(
+                key,
+                title=title,
+                uploader=model.uploader,
+                content_type=model.content_type,
+                status="queued",
+            )
+            self.logger.info(f"key: {key} のジョブを更新しました")
+            # ボタンと入力欄を無効化して、プログレスバーを見えるようにする(表示中であればカードにも反映される)
+            model.update(downloading=True, progress_visible=True)
+            # ダウンロード処理はスケジューラーのワーカースレッドで実行する
+            self.scheduler.submit(
+                key,
+                data["url"],
+                lambda: self.run_download_job(key, page, force=force, confirm_archived=confirm_archived),
+            )
+        except Exception as ex:
+            self.logger.error(
+                ex,
+                exc_info=True
+            )
+            open_dlg(err_happen_dlg, page)
+    
+    def run_download_job(self, key, page, force=False, confirm_archived=True):
+        """
+        スケジューラーのワーカースレッドで実行されるダウンロード処理
+        """
+        try:
+            self.job_store.set_status(key, "downloading")
+            result = self.downloader._check_content_type(key=key, page=page, force=force)
+            if result == "Archived":
+                self.job_store.set_status(key, "archived")
+                if confirm_archived:
+                    self.open_force_download_dlg(key, page)
+                return
+            self.job_store.set_status(key, "completed" if result is True else "failed")
         except Exception as ex:
+            self.job_store.set_status(key, "failed")
             self.logger.error(
                 ex,
                 exc_info=True
             )
             open_dlg(err_happen_dlg, page)
+        finally:
+            # 次回以降のダウンロードは、その時点の設定で行う
+            self.downloader.resumed_keys.discard(key)
+    
+    def open_force_download_dlg(self, key, page):
+        """ダウンロード済みのためスキップしたカードについて、再度ダウンロードするか確認するダイアログを表示する"""
+        def force_download(e):
+            close_dlg(e, force_download_dlg, page)
+            self.download_video_by_key(e, key, page, force=True)
+        
+        force_download_dlg = ft.AlertDialog(
+            title=ft.Text("確認"),
+            modal=True,
+            content=ft.Text("既にダウンロード済みです。もう一度ダウンロードしますか?"),
+            actions=[
+                ft.TextButton(
+                    "ダウンロードする",
+                    on_click=force_download,
+                    tooltip="ダウンロード済みでも、もう一度ダウンロードします"
+                ),
+                ft.TextButton(
+                    "閉じる",
+                    on_click=lambda e: close_dlg(e, force_download_dlg, page),
+                    tooltip="ダイアログを閉じます"
+                ),
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        open_dlg(force_download_dlg, page)
     
     def remove_card(self, e, key, page, url):
         try:
             if key in self.cards:
-                page.controls.remove(self.cards[key])
-                page.update()
-                del self.cards[key]
+                # 外部コマンドでダウンロード中の場合は、プロセスを中断する(ファイルの書き込みが続かないように)
+                self.downloader.process_runner.cancel(key)
+                self.card_list.remove(key)
                 self.logger.info(f"self.cardsからkey: {key} を削除しました。")
-                self.added_urls.remove(url)
-                self.logger.info(f"self.added_urlsからurl: {url} を削除しました。")
+                self.job_store.delete_job(key)
+                self.url_index.discard(url)
+                self.logger.info(f"self.url_indexからurl: {url} を削除しました。")
             else:
                 self.logger.error(
                     "keyの値が不正です",
@@ -1711,90 +4544,134 @@ class YDownloader:
             )
             open_dlg(delete_err_dlg, page)
     
-    def import_text_files_result(self, e: ft.FilePickerResultEvent, tf, page):
-        """読み込むURLが記入されたテキストファイルを読み込んで、検索欄に追加"""
+    # ファイルからの取り込みで、1回にプレビュー用のキューに追加するURLの数と、取り込み待ちのURLの上限
+    IMPORT_BATCH_SIZE = 100
+    IMPORT_PENDING_LIMIT = 500
+    
+    def import_text_files_result(self, e: ft.FilePickerResultEvent, page):
+        """
+        読み込むURLが記入されたテキストファイル(gzip、bzip2、xzで圧縮されたものも可)を取り込む
+        ファイルは別スレッドで少しずつ読み込み、検索欄を経由せずにプレビュー用のキューに追加する
+        """
         try:
-            if e.files:
-                file_paths = e.files
             if not e.files:
                 self.logger.warning(
                     "ファイルが選択されませんでした。",
                     exc_info=True
                 )
                 return
-            all_urls = [] # テキストファイルから読み取った全てのURLを格納するリスト
-            for file_path in file_paths:
-                with open(file_path, "r", encoding="utf-8") as file:
-                    # ファイルの内容を行ごとに読み込み
-                    urls = file.read().split("\n")
-                    all_urls.extend(urls)
-            # ここで習得したURLリスト(all_urls)の前後の空白を削除し、重複を取り除く
-            valid_urls = []
-            for url in all_urls:
-                trimmed_url = url.strip()  # 前後の空白を削除
-                # 空文字でなく、既に追加されていないURLのみを追加
-                if trimmed_url and trimmed_url not in self.pre_url_list and trimmed_url not in self.added_urls and trimmed_url not in valid_urls:
-                    valid_urls.append(trimmed_url)
-            # 追加するURLが存在する場合、tf.valueにそれをセット(tf.valueの値をクリアしないように)
-            if valid_urls:
-                # 既存の内容がある場合は改行で区切って追加
-                if tf.value:
-                    tf.value += "\n" + "\n".join(valid_urls)
-                else:
-                    tf.value = "\n".join(valid_urls)
-                page.update()
-            else:
-                self.logger.warning(
-                    "選択されたファイルの内容が不正です",
-                    exc_info=True
-                )
-                return
+            paths = [file.path for file in e.files]
+            threading.Thread(
+                target=self.stream_import_files,
+                args=(paths, page),
+                name="url-importer",
+                daemon=True,
+            ).start()
         except Exception as ex:
             self.logger.error(
                 ex,
                 exc_info=True
             )
-            # sys.exit(1) # プログラムの終了
-            raise ex
+            open_dlg(import_err_dlg, page)
+    
+    def stream_import_files(self, paths, page):
+        """
+        ファイルからURLを1行ずつ読み込み、重複(self.url_index)を除いてIMPORT_BATCH_SIZE件ずつプレビュー用のキューに追加する
+        取り込み待ちのURLがIMPORT_PENDING_LIMIT件以上ある間は、動画情報の取得が進むまで読み込みを止める
+        """
+        imported = 0
+        duplicates = 0
+        for path in paths:
+            batch = []
+            try:
+                with UrlListFile(path) as url_file:
+                    with self.condition_pre:
+                        self.import_file = url_file
+                    for url in url_file:
+                        if not self.url_index.add(url):
+                            duplicates += 1
+                            continue
+                        batch.append(url)
+                        if len(batch) >= self.IMPORT_BATCH_SIZE:
+                            self._enqueue_import_batch(batch, page)
+                            imported += len(batch)
+                            batch = []
+                    if batch:
+                        self._enqueue_import_batch(batch, page)
+                        imported += len(batch)
+                        batch = []
+                    self.logger.info(f"{path}から{url_file.lines}行を読み込みました。")
+            except Exception as ex:
+                # 途中まで読み込んだURLは取り込んだままにして、キューに追加していないURLのみ索引から削除する
+                for url in batch:
+                    self.url_index.discard(url)
+                self.logger.error(
+                    f"ファイルの取り込みに失敗しました。path: {path}, Exception: {ex}",
+                    exc_info=True
+                )
+                open_dlg(import_err_dlg, page)
+            finally:
+                with self.condition_pre:
+                    self.import_file = None
+                    self._update_import_progress()
+                mark_dirty(page)
+        if imported == 0:
+            self.logger.warning(
+                "選択されたファイルに取り込むURLがありませんでした",
+                exc_info=True
+            )
+        self.logger.info(f"ファイルから{imported}件のURLを取り込みました。(重複: {duplicates}件)")
+    
+    def _enqueue_import_batch(self, urls, page):
+        """取り込み待ちのURLがIMPORT_PENDING_LIMIT件未満になるまで待ってから、プレビュー用のキューに追加する"""
+        with self.condition_pre:
+            self.condition_pre.wait_for(lambda: self.pre_total_urls - self.pre_current_urls < self.IMPORT_PENDING_LIMIT)
+        self.enqueue_preview_urls(urls, page)
     
     def all_download(self, e, page):
+        """
+        全てのカードをスケジューラーのキューに追加する
+        キューへの追加のみを行い、全てのダウンロードが完了した時点で全ダウンロードボタンと全削除ボタンを再度有効化する
+        """
         try:
             # 全ダウンロードボタンと全削除ボタンを使えなくする
             self.all_download_icon.disabled = True 
             self.all_delete_icon.disabled = True
-            page.update()
-            with ThreadPoolExecutor() as executor: # 同時並行的に処理
-                futures = [executor.submit(self.download_video_by_key, None, key, page) for key in self.cards.keys()]
-                self.logger.debug("全てのカードをそれぞれの形式でダウンロードする")
-                # エラーをキャッチするために結果を取得
-                for future in futures:
-                    future.result()
+            mark_dirty(page)
+            self.logger.debug("全てのカードをそれぞれの形式でダウンロードする")
+            for key in list(self.cards.keys()):
+                if not self.scheduler.is_pending(key):
+                    # ダウンロード済みのものは確認せずにスキップする
+                    self.download_video_by_key(e, key, page, confirm_archived=False)
         except Exception as ex:
             self.logger.error(
                 ex,
                 exc_info=True
             )
-            error_occurred = True  # エラー発生フラグ
-        else:
-            error_occurred = False
-        finally:
-            # 全ての処理が完了した後に発火
-            self.all_download_icon.disabled = False
-            self.all_delete_icon.disabled = False
-            page.update()
-        if error_occurred:
             open_dlg(err_happen_dlg, page)
+        # 全ての処理が完了した後に発火
+        self.scheduler.when_idle(lambda: self._enable_all_buttons(page))
+    
+    def _enable_all_buttons(self, page):
+        """全ダウンロードボタンと全削除ボタンを有効化する"""
+        self.all_download_icon.disabled = False
+        self.all_delete_icon.disabled = False
+        mark_dirty(page)
     
     def all_remove(self, e, page):
         try:
             # print("全てのカードを削除する") # デバッグ用
-            for key, value in self.cards.items():
-                page.controls.remove(value)
-                del value
-                page.update()
-                self.logger.info(f"self.cardsからkey: {key} を削除しました。")
-            self.added_urls = []
-            self.logger.info("self.added_urlsを初期化しました")
+            # カードはまとめて取り除き、1回の更新で送る
+            models = list(self.cards.values())
+            self.card_list.clear()
+            for model in models:
+                # 外部コマンドでダウンロード中の場合は、プロセスを中断する
+                self.downloader.process_runner.cancel(model.key)
+                self.logger.info(f"self.cardsからkey: {model.key} を削除しました。")
+                self.job_store.delete_job(model.key)
+                # 取り込み待ちのURLは索引に残す
+                self.url_index.discard(model.url)
+            self.logger.info("self.url_indexから追加済みのURLを削除しました")
         except Exception as ex:
             self.logger.error(
                 ex,
@@ -1814,6 +4691,7 @@ class YDownloader:
     
     def logs_view(self, page: ft.Page) -> ft.View:
         def go_back_for_logs(e):
+            log_viewer.stop()
             page.views.pop()
             page.update()
         
@@ -1837,30 +4715,9 @@ class YDownloader:
         get_directry_dialog = ft.FilePicker(on_result=get_directry_result)
         page.overlay.append(get_directry_dialog)
         
-        def read_logfile():
-            try:
-                with open(log_file, "r", encoding="utf-8") as f:
-                    return f.read()
-            except Exception as ex:
-                self.logger.error(
-                    f"ログファイルの読み取りに失敗しました: {ex}",
-                    exc_info=True
-                )
-                return f"ログファイルの読み取りに失敗しました: {ex}"
-        
-        log_content = read_logfile()
-        log_column = ft.Column(
-            controls=[
-                ft.Text(
-                    value=log_content,
-                    selectable=True,
-                )
-            ],
-        )
-        
-        # def scroll_to_end(e, page: ft.Page):
-        #     log_column.scroll_to(offset=-1, duration=1000) # Columnを最後までスクロール
-        #     page.update()
+        # ログは末尾から1ページずつ読み込み、追記された分は自動で表示する
+        log_viewer = LogViewer(page, log_file)
+        log_viewer.start()
         
         logs_page = ft.View(
             route="/settings/logs",
@@ -1883,9 +4740,8 @@ class YDownloader:
                     adaptive=True,
                     center_title=True
                 ),
-                log_column,
+                log_viewer.control,
             ],
-            scroll=ft.ScrollMode.ADAPTIVE
         )
         return logs_page
     
@@ -1969,6 +4825,16 @@ class YDownloader:
                 set_theme_mode = "LIGHT" if theme_dropdown.value == "Light" else "DARK"
                 settings.update_setting("page_theme", set_theme_mode)
                 settings.update_setting("download_dir", save_dir.text)
+                settings.update_setting("concurrent_fragment_downloads", max(1, int(fragment_downloads_number.value or 1)))
+                settings.update_setting("http_chunk_size", int(http_chunk_size_number.value or 0))
+                settings.update_setting("buffersize", int(buffersize_number.value or 0))
+                # 値の確認はupdate_setting()で行う
+                site_overrides = json.loads(site_overrides_field.value or "{}")
+                settings.update_setting("site_download_overrides", site_overrides)
+                settings.update_setting("max_total_bandwidth_kbps", int(total_bandwidth_number.value or 0))
+                settings.update_setting("max_job_bandwidth_kbps", int(job_bandwidth_number.value or 0))
+                # ダウンロード中のものにもすぐに反映する
+                self.downloader.bandwidth.set_limits(settings.max_total_bandwidth_kbps, settings.max_job_bandwidth_kbps)
                 open_dlg(settings_save_dlg, page)
             except Exception as ex:
                 self.logger.error(f"設定の更新に失敗しました: {ex}")
@@ -1996,6 +4862,60 @@ class YDownloader:
             tooltip="リトライ回数",
         )
         
+        fragment_downloads_number = ft.TextField(
+            label="フラグメントの同時ダウンロード数",
+            value=str(settings.concurrent_fragment_downloads),
+            text_align=ft.TextAlign.CENTER,
+            expand=True,
+            on_change=validate_number,
+            tooltip="HLS/DASHの断片を並列にダウンロードする数",
+        )
+        
+        http_chunk_size_number = ft.TextField(
+            label="チャンクサイズ(バイト)",
+            value=str(settings.http_chunk_size),
+            text_align=ft.TextAlign.CENTER,
+            expand=True,
+            on_change=validate_number,
+            tooltip="HTTPのダウンロードを分割するサイズ(0の場合は分割しない)",
+        )
+        
+        buffersize_number = ft.TextField(
+            label="バッファサイズ(バイト)",
+            value=str(settings.buffersize),
+            text_align=ft.TextAlign.CENTER,
+            expand=True,
+            on_change=validate_number,
+            tooltip="ダウンロード時のバッファサイズ(0の場合はyt-dlpのデフォルト)",
+        )
+        
+        total_bandwidth_number = ft.TextField(
+            label="全体の帯域の上限(KiB/s)",
+            value=str(settings.max_total_bandwidth_kbps),
+            text_align=ft.TextAlign.CENTER,
+            expand=True,
+            on_change=validate_number,
+            tooltip="全てのダウンロードの合計の帯域の上限(0の場合は制限しない)",
+        )
+        
+        job_bandwidth_number = ft.TextField(
+            label="1件ごとの帯域の上限(KiB/s)",
+            value=str(settings.max_job_bandwidth_kbps),
+            text_align=ft.TextAlign.CENTER,
+            expand=True,
+            on_change=validate_number,
+            tooltip="ダウンロード1件ごとの帯域の上限(0の場合は制限しない)",
+        )
+        
+        site_overrides_field = ft.TextField(
+            label="サイトごとのダウンロード設定(JSON)",
+            value=json.dumps(settings.site_download_overrides, ensure_ascii=False, indent=2),
+            multiline=True,
+            min_lines=2,
+            expand=True,
+            tooltip='例: {"youtube.com": {"http_chunk_size": 10485760}}',
+        )
+        
         def minus_click(e):
             retry_chance_number.value = str(int(retry_chance_number.value) - 1)
             page.update()
@@ -2050,6 +4970,25 @@ class YDownloader:
                     ],
                     alignment=ft.MainAxisAlignment.SPACE_BETWEEN
                 ),
+                ft.Row(
+                    controls=[
+                        fragment_downloads_number,
+                        http_chunk_size_number,
+                        buffersize_number,
+                    ],
+                    alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+                ),
+                ft.Container(
+                    content=site_overrides_field,
+                    alignment=ft.alignment.center,
+                ),
+                ft.Row(
+                    controls=[
+                        total_bandwidth_number,
+                        job_bandwidth_number,
+                    ],
+                    alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+                ),
                 ft.Container(
                     content=save_dir,
                     alignment=ft.alignment.center,
@@ -2070,7 +5009,7 @@ class YDownloader:
         page.title = "YDownloader"
         
         # global宣言が必要
-        global content_type_err_dlg, network_err_dlg, playlist_error_dlg, retry_error_dlg, link_err_dlg, err_dlg, err_happen_dlg, delete_err_dlg, save_err_dlg, copy_err_dlg, dl_err_dlg, settings_save_dlg
+        global content_type_err_dlg, network_err_dlg, playlist_error_dlg, retry_error_dlg, link_err_dlg, err_dlg, err_happen_dlg, delete_err_dlg, save_err_dlg, copy_err_dlg, dl_err_dlg, settings_save_dlg, import_err_dlg
         content_type_err_dlg = ft.AlertDialog(
             title=ft.Text("エラー"),
             modal=True,
@@ -2175,6 +5114,19 @@ class YDownloader:
             ],
             actions_alignment=ft.MainAxisAlignment.END,
         )
+        import_err_dlg = ft.AlertDialog(
+            title=ft.Text("エラー"),
+            modal=True,
+            content=ft.Text("ファイルの取り込みの途中でエラーが発生しました。"),
+            actions=[
+                ft.TextButton(
+                    "閉じる",
+                    on_click=lambda e: close_dlg(e, import_err_dlg, page),
+                    tooltip="ダイアログを閉じます"
+                )
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
         save_err_dlg = ft.AlertDialog(
             title=ft.Text("エラー"),
             modal=True,
@@ -2230,6 +5182,9 @@ class YDownloader:
         
         # ウィンドウのリサイズイベントを監視する(リサイズが完了したタイミングで実行されるようにする)
         page.on_resized = lambda e: self.handle_window_resize(e, page)
+        # ウィンドウを閉じる前に、予約されている処理を片付ける(handle_window_eventでウィンドウを閉じる)
+        page.window.prevent_close = True
+        page.window.on_event = lambda e: self.handle_window_event(e, page)
         # プログレスバーの作成(読み込みの進捗段階を表示する)
         progress_bar = ft.ProgressBar(
             value=(self.pre_current_urls / self.pre_total_urls) if self.pre_total_urls > 0 else 0
@@ -2286,10 +5241,14 @@ class YDownloader:
             alignment=ft.alignment.top_right,
         )
         
-        # 動的にCardを追加するためのコンテナ
-        self.card_container = ft.Column(
-            controls=[],
-            expand=True,
+        # 動的にCardを追加するための一覧(画面に表示されている範囲のカードのみを作成する)
+        self.card_list = VirtualCardList(
+            page,
+            on_download=lambda e, key: self.download_video_by_key(e, key, page),
+            on_delete=lambda e, key, url: self.remove_card(e, key, page, url),
+            frame_size=self.get_frame_size(page),
+            models=self.cards,
+            on_stale_thumbnail=self.refresh_thumbnail,
         )
         
         tf = ft.TextField(
@@ -2310,7 +5269,7 @@ class YDownloader:
             tooltip="検索"
         )
         # import_text_filesを呼び出す前にファイルピッカーを作成して、page.overlayに追加
-        file_picker_dialog = ft.FilePicker(on_result=lambda e: self.import_text_files_result(e, tf, page))
+        file_picker_dialog = ft.FilePicker(on_result=lambda e: self.import_text_files_result(e, page))
         page.overlay.append(file_picker_dialog)
         # テキストファイル取り込みボタン
         ib = ft.IconButton(
@@ -2318,7 +5277,7 @@ class YDownloader:
             on_click=lambda _: file_picker_dialog.pick_files(
                 allow_multiple=True,
                 file_type=ft.FilePickerFileType.CUSTOM,
-                allowed_extensions=["txt"] # txtファイルのみ選択可能にする
+                allowed_extensions=["txt", "gz", "bz2", "xz"] # txtファイルと圧縮したtxtファイルのみ選択可能にする
             ),
             tooltip="テキストファイル取り込み",
         )
@@ -2373,39 +5332,227 @@ class YDownloader:
                         alignment=ft.MainAxisAlignment.END,
                     ), padding=10,
                 ),
-                # ここにvideo_cardを動的に追加する
-                self.card_container, 
+                # ここにvideo_cardを動的に追加する(カードの一覧のみをスクロールする)
+                self.card_list.control,
             ],
-            scroll=ft.ScrollMode.ADAPTIVE,
         )
         
         page.views.append(main_view)
         page.update()
+        # 最初の画面を表示してから、遅延読み込みにしたyt-dlpなどをバックグラウンドで読み込む
+        preload_heavy_modules()
         
-        # URL監視スレッドの起動
-        processing_thread = threading.Thread(
-            target=self.add_video_card,
-            args=(page,),
-            daemon=True,
-        )
-        processing_thread.start()
+        # 動画情報取得用のワーカースレッドの起動
+        self.start_preview_workers(page)
+        # 前回の起動で完了しなかったダウンロードを再開する
+        self.restore_unfinished_jobs(page)
 
 
-try:
-    setup_logging()
-    # externalディレクトリのパスを取得
-    EXTERNAL_PATH = get_external_path(app_name="YDownloader")
-    if not os.path.exists(EXTERNAL_PATH):
-        logger = logging.getLogger()
-        logger.error(
-            "externalフォルダーが存在しません。インストールし直してください。",
-            exc_info=True
+class HeadlessRunner:
+    """
+    Fletを起動せずに、URLの一覧をまとめてダウンロードするバッチ処理(python main.py --headless)
+    URLはファイル(「-」または省略時は標準入力)から1行ずつ読み込む(空行と#で始まる行は無視する)
+    動画情報の取得はYDownloader.preview_video_info、ダウンロードはDownload._check_content_typeをpageなしで再利用し、
+    各ジョブの状態の変化をJSON Lines形式で出力する。
+    
+    :param settings: DefaultSettingsLoader
+    :param downloader: Download
+    :param output: JSON Linesの出力先(デフォルトはsys.stdout)
+    """
+    
+    # 成功とみなす最終状態(終了コードの判定に使用する)
+    SUCCESS_STATUSES = ("completed", "archived")
+    
+    def __init__(self, settings, downloader, output=None):
+        self.logger = logging.getLogger()
+        self.logger.debug("HeadlessRunnerの__init__開始")
+        self.settings = settings
+        self.downloader = downloader
+        self.job_store = downloader.job_store
+        self.output = output or sys.stdout
+        self.output_lock = threading.Lock()
+        self.results = {}
+        self.results_lock = threading.Lock()
+        # 動画情報の取得処理はGUIと同じものを使う(pageはNone、GUI用のワーカーなどは作成しない)
+        self.app = YDownloader(settings, downloader, headless=True)
+    
+    def parse_args(self, argv):
+        """コマンドライン引数を解析する"""
+        parser = argparse.ArgumentParser(
+            prog="YDownloader --headless",
+            description="GUIを起動せずに、URLの一覧をまとめてダウンロードします。",
         )
-        # sys.exit(1) # プログラムの終了
-        raise FileNotFoundError("externalフォルダーが存在しません。")
-    settings = DefaultSettingsLoader()
-    downloader = Download(settings)
-    app = YDownloader(settings, downloader)
-    ft.app(target=app.main)
-except Exception as ex:
-    raise ex
\ No newline at end of file
+        parser.add_argument("--headless", action="store_true", help="ヘッドレスモードで実行します。")
+        parser.add_argument(
+            "files",
+            nargs="*",
+            help="URLを1行ずつ記載したファイル(「-」または省略時は標準入力から読み込みます)",
+        )
+        parser.add_argument(
+            "-j", "--jobs",
+            type=int,
+            default=self.settings.max_concurrent_downloads,
+            help="同時にダウンロードする数(デフォルトは設定のmax_concurrent_downloads)",
+        )
+        parser.add_argument(
+            "--type",
+            choices=("movie", "music"),
+            default=None,
+            help="ダウンロードするコンテンツタイプ(デフォルトは設定のcontent_type)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="ダウンロード済みの動画もダウンロードします。",
+        )
+        return parser.parse_args(argv)
+    
+    @staticmethod
+    def read_urls(files):
+        """ファイル(「-」は標準入力、圧縮ファイルも可)からURLを1行ずつ返すジェネレーター"""
+        for file in files or ["-"]:
+            if file == "-":
+                for line in sys.stdin:
+                    url = line.strip()
+                    if url and not url.startswith("#"):
+                        yield url
+            else:
+                with UrlListFile(file) as url_file:
+                    yield from url_file
+    
+    def emit(self, status, url, key=None, **fields):
+        """ジョブの状態を1行のJSONとして出力する"""
+        record = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "status": status,
+            "url": url,
+            "key": key,
+        }
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False)
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+    
+    def _finish(self, url, key, status, **fields):
+        """ジョブの最終状態を記録して出力する"""
+        with self.results_lock:
+            self.results[url] = status
+        self.emit(status, url, key=key, **fields)
+    
+    def run_job(self, url, content_type=None, force=False):
+        """
+        1つのURLについて、動画情報の取得からダウンロードまでを行う
+        ※DownloadSchedulerのワーカースレッドで実行する
+        """
+        try:
+            key = self.app.preview_video_info(url, None)
+        except Exception as ex:
+            self.logger.error(
+                f"動画情報の取得中にエラーが発生しました。url: {url}, Exception: {ex}",
+                exc_info=True
+            )
+            key = None
+        if key == "NetWorkError":
+            self._finish(url, None, "network_error")
+            return
+        if not key:
+            self._finish(url, None, "invalid")
+            return
+        if content_type:
+            self.job_store.update_job(key, content_type=content_type)
+        job = self.job_store.get_job(key) or {}
+        title = job.get("title", None)
+        self.emit("downloading", url, key=key, title=title)
+        self.job_store.set_status(key, "downloading")
+        try:
+            result = self.downloader._check_content_type(key=key, page=None, force=force)
+        except Exception as ex:
+            self.logger.error(
+                f"ダウンロード中にエラーが発生しました。url: {url}, Exception: {ex}",
+                exc_info=True
+            )
+            result = False
+        if result == "Archived":
+            status = "archived"
+        elif result == "NetWorkError":
+            status = "network_error"
+        elif result is True:
+            status = "completed"
+        else:
+            status = "failed"
+        # ネットワークエラーはジョブストア上は失敗として扱う
+        self.job_store.set_status(key, status if status in self.SUCCESS_STATUSES else "failed")
+        self._finish(url, key, status, title=title)
+    
+    def run(self, argv):
+        """
+        バッチ処理を実行する
+        
+        :param argv: コマンドライン引数(sys.argv[1:])
+        :return: 終了コード(全て成功した場合は0、失敗があった場合は1)
+        """
+        args = self.parse_args(argv)
+        # 全体の同時実行数は--jobs、ホストごとの上限は設定に従う
+        scheduler = DownloadScheduler(
+            max_workers=max(1, args.jobs),
+            per_host_limit=self.settings.max_downloads_per_host,
+        )
+        done = threading.Event()
+        try:
+            for url in self.read_urls(args.files):
+                # 同じ動画を指すURL(youtu.be/Xとwatch?v=Xなど)は1件のみダウンロードする
+                submitted = self.app.url_index.add(url) and scheduler.submit(
+                    url,
+                    url,
+                    lambda url=url: self.run_job(url, content_type=args.type, force=args.force),
+                )
+                self.emit("queued" if submitted else "duplicate", url)
+        except (OSError, EOFError, lzma.LZMAError) as ex:
+            # 圧縮ファイルが壊れている場合もここで記録する
+            self.logger.error(
+                f"URLの読み込みに失敗しました: {ex}",
+                exc_info=True
+            )
+            self.emit("error", None, message=str(ex))
+        scheduler.when_idle(done.set)
+        done.wait()
+        counts = {}
+        for status in self.results.values():
+            counts[status] = counts.get(status, 0) + 1
+        self.emit("finished", None, counts=counts)
+        return 0 if all(status in self.SUCCESS_STATUSES for status in self.results.values()) else 1
+
+
+if __name__ == "__main__":
+    try:
+        setup_logging()
+        # externalディレクトリのパスを取得
+        EXTERNAL_PATH = get_external_path(app_name="YDownloader")
+        if not os.path.exists(EXTERNAL_PATH):
+            logger = logging.getLogger()
+            logger.error(
+                "externalフォルダーが存在しません。インストールし直してください。",
+                exc_info=True
+            )
+            # sys.exit(1) # プログラムの終了
+            raise FileNotFoundError("externalフォルダーが存在しません。")
+        headless = "--headless" in sys.argv[1:]
+        if headless:
+            # 標準出力はJSON Linesの出力専用にして、yt-dlpやprintの出力は標準エラー出力に流す
+            json_output = sys.stdout
+            sys.stdout = sys.stderr
+        settings = DefaultSettingsLoader()
+        if headless:
+            # ヘッドレスモードのジョブはGUIの次回起動時に再開しないように、実行ごとの一時ディレクトリ内のデータベースで管理する
+            job_store = JobStore(os.path.join(settings.TEMP_DIR, "headless_jobs.sqlite3"))
+        else:
+            # カードごとのジョブ情報はユーザーデータディレクトリ内のデータベースで管理する(再起動後の再開用)
+            job_store = JobStore(os.path.join(get_data_path(), "jobs.sqlite3"))
+        downloader = Download(settings, job_store)
+        if headless:
+            sys.exit(HeadlessRunner(settings, downloader, output=json_output).run(sys.argv[1:]))
+        app = YDownloader(settings, downloader)
+        ft.app(target=app.main)
+    except Exception as ex:
+        raise ex
\ No newline at end of file